@@ -18,11 +18,11 @@ const Message = ({ message }) => {
           <p className="text-xs opacity-70">{message.timestamp}</p>
           {message.route && (
             <span className={`text-xs px-2 py-1 rounded ${
-              message.route === 'financial_agent_yfinance' 
+              message.route.startsWith('financial_agent') 
                 ? 'bg-blue-100 text-blue-700'
                 : 'bg-purple-100 text-purple-700'
             }`}>
-              {message.route === 'financial_agent_yfinance' ? '📈 Live Data' : '📄 Documents'}
+              {message.route.startsWith('financial_agent') ? '📈 Live Data' : '📄 Documents'}
             </span>
           )}
         </div>
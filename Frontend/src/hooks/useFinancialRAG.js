@@ -3,6 +3,8 @@ import { useState, useEffect } from 'react'
 
 // API configuration - uses environment variable or fallback
 const API_BASE_URL = import.meta.env.VITE_API_URL || 'https://intern-9a5x.onrender.com'
+const INGEST_POLL_LIMIT = 1800 // Give up polling an ingest job after about 30 minutes
+const INGEST_TERMINAL_STATUSES = ['succeeded', 'failed', 'abandoned']
 
 console.log('API Base URL:', API_BASE_URL) // For debugging
 
@@ -17,6 +19,8 @@ export const useFinancialRAG = () => {
   const [isUploading, setIsUploading] = useState(false)
   const [isLoadingDocuments, setIsLoadingDocuments] = useState(false)
   const [showUpload, setShowUpload] = useState(false)
+  // Conversation thread on the server; follow-up questions reuse its context and data
+  const [threadId, setThreadId] = useState(null)
 
   // Load documents on mount
   useEffect(() => {
@@ -54,33 +58,78 @@ export const useFinancialRAG = () => {
     setCurrentMessage('')
     setIsLoading(true)
 
+    const botMessageId = Date.now() + 1
+    let route = null
+    let started = false
+
+    // Append streamed text to the bot message, creating it on the first token
+    const appendToBotMessage = (text) => {
+      if (!started) {
+        started = true
+        setIsLoading(false)
+        setMessages(prev => [...prev, {
+          id: botMessageId,
+          type: 'bot',
+          content: text,
+          route,
+          timestamp: new Date().toLocaleTimeString()
+        }])
+      } else {
+        setMessages(prev => prev.map(message =>
+          message.id === botMessageId ? { ...message, content: message.content + text } : message
+        ))
+      }
+    }
+
     try {
-      const response = await fetch(`${API_BASE_URL}/query`, {
+      const response = await fetch(`${API_BASE_URL}/query/stream`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'Accept': 'text/event-stream',
         },
         body: JSON.stringify({
           question: currentMessage,
           symbol: symbol,
-          document_ids: selectedDocuments.length > 0 ? selectedDocuments : null
+          document_ids: selectedDocuments.length > 0 ? selectedDocuments : null,
+          thread_id: threadId,
+          start_thread: threadId === null
         }),
       })
-
-      const data = await response.json()
-      
-      const botMessage = {
-        id: Date.now() + 1,
-        type: 'bot',
-        content: data.answer,
-        route: data.route_taken,
-        timestamp: new Date().toLocaleTimeString()
+      if (!response.ok || !response.body) {
+        throw new Error(`Query failed with status ${response.status}`)
       }
 
-      setMessages(prev => [...prev, botMessage])
+      // Server-Sent Events over a POST body: read the stream and split on blank lines
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
+      while (true) {
+        const { value, done } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        const events = buffer.split('\n\n')
+        buffer = events.pop()
+        for (const rawEvent of events) {
+          const dataLine = rawEvent.split('\n').find(line => line.startsWith('data: '))
+          if (!dataLine) continue
+          const event = JSON.parse(dataLine.slice(6))
+          if (event.type === 'metadata') {
+            route = event.route_taken
+            setThreadId(event.thread_id)
+          } else if (event.type === 'token') {
+            appendToBotMessage(event.text)
+          } else if (event.type === 'error') {
+            throw new Error(event.error)
+          }
+        }
+      }
+      if (!started) {
+        appendToBotMessage('')
+      }
     } catch (error) {
       const errorMessage = {
-        id: Date.now() + 1,
+        id: Date.now() + 2,
         type: 'error',
         content: 'Sorry, something went wrong. Please try again.',
         timestamp: new Date().toLocaleTimeString()
@@ -91,6 +140,25 @@ export const useFinancialRAG = () => {
     }
   }
 
+  // Poll a background ingest job until it finishes, updating the progress message
+  const waitForIngestJob = async (statusUrl, progressMessageId) => {
+    for (let poll = 0; poll < INGEST_POLL_LIMIT; poll++) {
+      await new Promise(resolve => setTimeout(resolve, 1000))
+      const response = await fetch(`${API_BASE_URL}${statusUrl}`)
+      if (!response.ok) {
+        throw new Error(`Could not check processing status (HTTP ${response.status})`)
+      }
+      const job = await response.json()
+      if (INGEST_TERMINAL_STATUSES.includes(job.status)) return job
+
+      const { pages_parsed = 0, total_pages, vectors_upserted = 0 } = job.progress || {}
+      setMessages(prev => prev.map(msg => msg.id === progressMessageId
+        ? { ...msg, content: `⚙️ Processing: ${pages_parsed}${total_pages ? `/${total_pages}` : ''} pages parsed, ${vectors_upserted} chunks indexed` }
+        : msg))
+    }
+    throw new Error('Processing is taking too long; check the job status later')
+  }
+
   // Document upload
   const uploadDocument = async (event) => {
     const file = event.target.files[0]
@@ -118,6 +186,20 @@ export const useFinancialRAG = () => {
 
       const data = await response.json()
       
+      if (data.success && data.status_url) {
+        const progressMessageId = Date.now() + 0.5
+        setMessages(prev => [...prev, {
+          id: progressMessageId,
+          type: 'system',
+          content: '⚙️ Processing document...',
+          timestamp: new Date().toLocaleTimeString()
+        }])
+        const job = await waitForIngestJob(data.status_url, progressMessageId)
+        if (job.status !== 'succeeded') {
+          throw new Error(job.error || 'Processing failed')
+        }
+      }
+      
       if (data.success) {
         const successMessage = {
           id: Date.now() + 1,
@@ -2,20 +2,31 @@ import os
 import logging
 import asyncio
 import time
-from typing import List, Optional, Dict, Any
+import hashlib
+from typing import List, Optional, Dict, Any, AsyncIterator, Iterable, Callable, Tuple
+import numpy as np
 from dotenv import load_dotenv
 from tenacity import retry, stop_after_attempt, wait_random_exponential
 import google.generativeai as genai
 from pinecone import Pinecone
 
 # Document processing imports
-from PyPDF2 import PdfReader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-import uuid
 from datetime import datetime
 
 from google.api_core.exceptions import ResourceExhausted
 
+from rate_limiter import get_rate_controller
+import pdf_extraction
+from embedding_cache import get_embedding_cache
+from document_catalog import get_document_catalog
+from answer_cache import get_answer_cache
+from ingest_queue import new_document_id
+from sparse_index import get_sparse_index, reciprocal_rank_fusion
+from context_assembly import get_context_assembler
+from rerank import get_reranker, resolve_mode, RERANK_CANDIDATES
+from vector_store import AsyncVectorIndex, get_async_index, VECTOR_STORE_BACKEND, VECTOR_STORE_MAX_WORKERS
+
 # ------------------------- Load Environment -------------------------
 load_dotenv()
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
@@ -24,7 +35,30 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "models/gemini-2.5-flash")  # Using flash model for better quota
 GEMINI_EMBEDDING_MODEL = os.getenv("GEMINI_EMBEDDING_MODEL", "models/embedding-001")  # Back to 768-dim embedding model
 
-if not all([PINECONE_API_KEY, PINECONE_INDEX_NAME, GEMINI_API_KEY]):
+# Ingest tuning: chunks per embedding request and requests in flight
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "50"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))  # Batches buffered between pipeline stages
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+UPSERT_BATCH_SIZE = 100
+DELETE_BATCH_SIZE = 1000
+FETCH_BATCH_SIZE = 100
+
+# Hybrid retrieval: dense and BM25 candidates fused with reciprocal-rank fusion
+HYBRID_RETRIEVAL_ENABLED = os.getenv("HYBRID_RETRIEVAL_ENABLED", "true").lower() == "true"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "30"))  # Candidates taken from each retriever
+DELETE_MAX_CONCURRENCY = int(os.getenv("DELETE_MAX_CONCURRENCY", "4"))
+
+NO_MATCHES_MESSAGE = "No relevant information found in the transcripts."
+QUOTA_EXCEEDED_MESSAGE = (
+    "You have exceeded your Gemini API quota. "
+    "Please wait for your quota to refresh or upgrade your plan. "
+    "See: https://ai.google.dev/gemini-api/docs/rate-limits"
+)
+
+if not GEMINI_API_KEY or (VECTOR_STORE_BACKEND == "pinecone" and not all([PINECONE_API_KEY, PINECONE_INDEX_NAME])):
     raise EnvironmentError("Missing required environment variables.")
 
 logging.basicConfig(level=logging.INFO)
@@ -42,7 +76,8 @@ def get_pinecone_index():
     if index is None:
         logger.info("Initializing Pinecone connection...")
         pc = Pinecone(api_key=PINECONE_API_KEY)
-        index = pc.Index(PINECONE_INDEX_NAME)
+        # One handle with a connection pool sized for the async layer's workers
+        index = pc.Index(PINECONE_INDEX_NAME, pool_threads=VECTOR_STORE_MAX_WORKERS)
         
         # Verify index dimensions only once
         if not _index_verified:
@@ -58,6 +93,18 @@ def get_pinecone_index():
     
     return index
 
+def get_vector_index():
+    """Get the configured vector index backend: hosted Pinecone or the local embedded index"""
+    if VECTOR_STORE_BACKEND == "local":
+        # NumPy backend is only imported when selected
+        from local_vector_store import get_local_vector_store
+        return get_local_vector_store()
+    return get_pinecone_index()
+
+async def get_async_vector_index() -> AsyncVectorIndex:
+    """Get the shared non-blocking vector index"""
+    return await get_async_index(get_vector_index)
+
 # Initialize Gemini globally to avoid repeated configuration
 _gemini_configured = False
 
@@ -77,10 +124,12 @@ class DocumentAgent:
         configure_gemini()
         self.generation_model = genai.GenerativeModel(model_name=GEMINI_MODEL_NAME)
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=100,
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
             length_function=len
         )
+        self._sparse_backfills = set()  # Documents whose BM25 backfill was started
+        self._background_tasks = set()
 
     async def answer(
         self,
@@ -88,45 +137,206 @@ class DocumentAgent:
         document_ids: Optional[List[str]] = None,
         symbol: Optional[str] = None,
         top_k: int = 5,
+        rerank: Optional[str] = None,
     ) -> str:
         try:
             logger.info("Starting RAG answer generation.")
-            query_embedding = await self._get_embedding(question)
-            
-            # Add small delay to avoid rate limiting
-            await asyncio.sleep(1)
-            
-            filter_query = self._build_filter(document_ids, symbol)
-            index = get_pinecone_index()
-            results = index.query(
-                vector=query_embedding,
-                top_k=top_k,
-                include_metadata=True,
-                filter=filter_query or None,
-            )
-            if not results.matches:
-                logger.warning("No matches found in Pinecone.")
-                return "No relevant information found in the transcripts."
-            context = self._construct_context(results.matches)
-            
-            # Try to generate answer with LLM, fallback to raw context if quota exceeded
-            try:
-                answer = await self._generate_answer(question, context)
-                return answer
-            except ResourceExhausted:
-                logger.warning("LLM quota exceeded, returning raw context")
-                return f"Based on the available transcripts:\n\n{context}\n\n(Note: AI processing unavailable due to quota limits)"
+            context = await self.retrieve_context(question, document_ids, symbol, top_k, rerank)
+            return await self.answer_from_context(question, context)
         except ResourceExhausted as e:
             logger.error(f"Gemini API quota exceeded: {e}")
-            return (
-                "You have exceeded your Gemini API quota. "
-                "Please wait for your quota to refresh or upgrade your plan. "
-                "See: https://ai.google.dev/gemini-api/docs/rate-limits"
-            )
+            return QUOTA_EXCEEDED_MESSAGE
         except Exception as e:
             logger.exception(f"Error in DocumentAgent.answer: {e}")
             return f"An error occurred while processing your request: {str(e)}"
 
+    async def answer_stream(
+        self,
+        question: str,
+        document_ids: Optional[List[str]] = None,
+        symbol: Optional[str] = None,
+        top_k: int = 5,
+        rerank: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """Same as ``answer`` but yields the answer text as Gemini generates it"""
+        try:
+            logger.info("Starting streaming RAG answer generation.")
+            context = await self.retrieve_context(question, document_ids, symbol, top_k, rerank)
+            async for text in self.stream_from_context(question, context):
+                yield text
+        except ResourceExhausted as e:
+            logger.error(f"Gemini API quota exceeded: {e}")
+            yield QUOTA_EXCEEDED_MESSAGE
+        except Exception as e:
+            logger.exception(f"Error in DocumentAgent.answer_stream: {e}")
+            yield f"An error occurred while processing your request: {str(e)}"
+
+    async def answer_from_context(self, question: str, context: Optional[str], history: Optional[str] = None) -> str:
+        """Generate the answer for already-retrieved context (None when nothing matched)"""
+        if context is None:
+            return NO_MATCHES_MESSAGE
+        # Try to generate answer with LLM, fallback to raw context if quota exceeded
+        try:
+            return await self._generate_answer(question, context, history)
+        except ResourceExhausted:
+            logger.warning("LLM quota exceeded, returning raw context")
+            return self._quota_fallback(context)
+
+    async def stream_from_context(self, question: str, context: Optional[str], history: Optional[str] = None) -> AsyncIterator[str]:
+        """Streaming variant of ``answer_from_context``"""
+        if context is None:
+            yield NO_MATCHES_MESSAGE
+            return
+        streamed_any = False
+        try:
+            async for text in get_rate_controller().stream(self._stream_generation, self._build_prompt(question, context, history)):
+                streamed_any = True
+                yield text
+        except ResourceExhausted:
+            logger.warning("LLM quota exceeded, returning raw context")
+            # Only fall back to raw context if nothing was sent yet
+            if not streamed_any:
+                yield self._quota_fallback(context)
+
+    async def retrieve_context(
+        self,
+        question: str,
+        document_ids: Optional[List[str]],
+        symbol: Optional[str],
+        top_k: int,
+        rerank: Optional[str] = None
+    ) -> Optional[str]:
+        """Embed the question and build the context from the top matches; None if nothing matched"""
+        query_embedding = await self._get_embedding(question)
+        return (await self.retrieve_contexts([query_embedding], document_ids, symbol, top_k, [question], rerank))[0]
+
+    async def retrieve_contexts(
+        self,
+        query_embeddings: List[List[float]],
+        document_ids: Optional[List[str]],
+        symbol: Optional[str],
+        top_k: int,
+        questions: Optional[List[str]] = None,
+        rerank: Optional[str] = None
+    ) -> List[Optional[str]]:
+        """
+        Contexts for several query embeddings against the same documents, retrieved as one batch
+        
+        When the question texts are given and hybrid retrieval is enabled, dense
+        matches are fused with BM25 matches by reciprocal rank. A ``rerank`` mode
+        other than "none" (default RERANK_MODE) over-fetches RERANK_CANDIDATES
+        and keeps the ``top_k`` best after reranking.
+        """
+        mode = resolve_mode(rerank)
+        candidates = max(top_k, RERANK_CANDIDATES) if mode != "none" else top_k
+        filter_query = self._build_filter(document_ids, symbol)
+        index = await get_async_vector_index()
+        hybrid = HYBRID_RETRIEVAL_ENABLED and questions is not None
+        results = await index.query_many(
+            vectors=query_embeddings,
+            top_k=max(candidates, HYBRID_CANDIDATES) if hybrid else candidates,
+            include_metadata=True,
+            include_values=mode != "none",
+            filter=filter_query or None,
+        )
+        match_lists = [result.matches for result in results]
+        if hybrid:
+            match_lists = await self._fuse_sparse(index, match_lists, questions, document_ids, candidates)
+        if mode != "none":
+            match_lists = await asyncio.to_thread(
+                self._rerank, questions or [""] * len(match_lists), query_embeddings, match_lists, top_k, mode
+            )
+        
+        contexts = []
+        for matches in match_lists:
+            if not matches:
+                logger.warning("No matches found in Pinecone.")
+            contexts.append(self._construct_context(matches) if matches else None)
+        return contexts
+
+    async def _fuse_sparse(
+        self,
+        index: AsyncVectorIndex,
+        dense_matches: List[List[Any]],
+        questions: List[str],
+        document_ids: Optional[List[str]],
+        top_k: int
+    ) -> List[List[Any]]:
+        """Reciprocal-rank fusion of dense matches with BM25 hits; BM25-only hits are fetched for their text"""
+        sparse = get_sparse_index()
+        if document_ids:
+            self._schedule_sparse_backfill(document_ids)
+        sparse_hits = await asyncio.to_thread(sparse.search_many, questions, HYBRID_CANDIDATES, document_ids or None)
+        
+        known = {match.id: match for matches in dense_matches for match in matches}
+        fused_ids = [
+            reciprocal_rank_fusion([[match.id for match in matches], [vector_id for vector_id, _ in hits]], top_k=top_k)
+            for matches, hits in zip(dense_matches, sparse_hits)
+        ]
+        
+        missing = sorted({vector_id for ids in fused_ids for vector_id in ids if vector_id not in known})
+        for start in range(0, len(missing), FETCH_BATCH_SIZE):
+            fetched = await index.fetch(ids=missing[start:start + FETCH_BATCH_SIZE])
+            known.update(fetched.vectors)
+        return [[known[vector_id] for vector_id in ids if vector_id in known] for ids in fused_ids]
+
+    @staticmethod
+    def _rerank(
+        questions: List[str],
+        query_embeddings: List[List[float]],
+        match_lists: List[List[Any]],
+        top_k: int,
+        mode: str
+    ) -> List[List[Any]]:
+        reranker = get_reranker()
+        return [
+            reranker.rerank(question, embedding, matches, top_k, mode)
+            for question, embedding, matches in zip(questions, query_embeddings, match_lists)
+        ]
+
+    def _schedule_sparse_backfill(self, document_ids: List[str]) -> None:
+        """Index documents ingested before the BM25 index existed, once each, in the background"""
+        sparse = get_sparse_index()
+        catalog = get_document_catalog()
+        for document_id in document_ids:
+            if document_id in self._sparse_backfills or sparse.has_document(document_id):
+                continue
+            record = catalog.get(document_id)
+            if record is None or record["status"] != "ready":
+                continue
+            self._sparse_backfills.add(document_id)
+            task = asyncio.create_task(self._backfill_sparse_index(document_id, record))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+
+    async def _index_missing_sparse(self, document_id: str, texts: Dict[int, str]) -> None:
+        """Add chunks (by chunk index) to the BM25 index unless it already holds their IDs"""
+        sparse = get_sparse_index()
+        ids = {f"{document_id}_chunk_{i}": text for i, text in texts.items()}
+        missing = await asyncio.to_thread(sparse.missing, ids)
+        if missing:
+            await asyncio.to_thread(sparse.add, [(vector_id, ids[vector_id], document_id) for vector_id in missing])
+
+    async def _backfill_sparse_index(self, document_id: str, record: Dict[str, Any]) -> None:
+        try:
+            index = await get_async_vector_index()
+            vector_ids = await self._document_vector_ids(index, document_id, record)
+            sparse = get_sparse_index()
+            for start in range(0, len(vector_ids), FETCH_BATCH_SIZE):
+                fetched = await index.fetch(ids=vector_ids[start:start + FETCH_BATCH_SIZE])
+                await asyncio.to_thread(sparse.add, [
+                    (vector_id, (vector.metadata or {}).get("text", ""), document_id)
+                    for vector_id, vector in fetched.vectors.items()
+                ])
+            await asyncio.to_thread(sparse.save)
+            logger.info(f"Backfilled BM25 index with {len(vector_ids)} chunks of {document_id}")
+        except Exception as e:
+            logger.warning(f"BM25 backfill for {document_id} failed: {e}")
+            self._sparse_backfills.discard(document_id)
+
+    def _quota_fallback(self, context: str) -> str:
+        return f"Based on the available transcripts:\n\n{context}\n\n(Note: AI processing unavailable due to quota limits)"
+
     def _build_filter(self, document_ids: Optional[List[str]], symbol: Optional[str]) -> dict:
         """Build filter for Pinecone query. Only uses document_ids, ignores symbol."""
         filters = {}
@@ -136,12 +346,27 @@ class DocumentAgent:
         return filters
 
     def _construct_context(self, matches: List) -> str:
-        return "\n\n".join(match.metadata.get("text", "") for match in matches)
+        return get_context_assembler().assemble(matches)
+
+    async def get_query_embedding(self, text: str) -> List[float]:
+        """Embedding of a question, shared with retrieval through the embedding cache"""
+        return await self._get_embedding(text)
 
-    @retry(stop=stop_after_attempt(2), wait=wait_random_exponential(min=2, max=10))  # Reduced retries and longer waits
     async def _get_embedding(self, text: str) -> List[float]:
+        """Query embedding, served from the embedding cache when possible"""
+        cache = get_embedding_cache()
+        key = cache.make_key(text, GEMINI_EMBEDDING_MODEL, "retrieval_query")
+        embedding = await asyncio.to_thread(cache.get, key)
+        if embedding is None:
+            embedding = await self._embed_query(text)
+            await asyncio.to_thread(cache.put, key, embedding)
+        return embedding
+
+    @retry(stop=stop_after_attempt(2), wait=wait_random_exponential(min=2, max=10))  # Reduced retries and longer waits
+    async def _embed_query(self, text: str) -> List[float]:
         logger.info("Generating embedding for the query.")
-        response = await asyncio.to_thread(
+        response = await get_rate_controller().run(
+            asyncio.to_thread,
             genai.embed_content,
             model=GEMINI_EMBEDDING_MODEL,
             content=text,
@@ -149,25 +374,78 @@ class DocumentAgent:
         )
         return response["embedding"]
 
-    @retry(stop=stop_after_attempt(2), wait=wait_random_exponential(min=2, max=10))  # Reduced retries and longer waits
-    async def _generate_answer(self, question: str, context: str) -> str:
-        logger.info("Generating response from Gemini.")
-        prompt = (
+    async def get_query_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Query embeddings for many questions; cache misses are embedded in a single request"""
+        cache = get_embedding_cache()
+        keys = [cache.make_key(text, GEMINI_EMBEDDING_MODEL, "retrieval_query") for text in texts]
+        cached = await asyncio.to_thread(cache.get_many, keys)
+        missing = list(dict.fromkeys(text for text, key in zip(texts, keys) if key not in cached))
+        for start in range(0, len(missing), EMBEDDING_BATCH_SIZE):
+            batch = missing[start:start + EMBEDDING_BATCH_SIZE]
+            fresh = list(zip(
+                (cache.make_key(text, GEMINI_EMBEDDING_MODEL, "retrieval_query") for text in batch),
+                await self._embed_queries(batch)
+            ))
+            await asyncio.to_thread(cache.put_many, fresh)
+            cached.update(fresh)
+        return [cached[key] for key in keys]
+
+    @retry(stop=stop_after_attempt(2), wait=wait_random_exponential(min=2, max=10))
+    async def _embed_queries(self, texts: List[str]) -> List[List[float]]:
+        logger.info(f"Generating embeddings for {len(texts)} queries.")
+        response = await get_rate_controller().run(
+            asyncio.to_thread,
+            genai.embed_content,
+            model=GEMINI_EMBEDDING_MODEL,
+            content=texts,
+            task_type="retrieval_query"
+        )
+        embeddings = response["embedding"]
+        if len(embeddings) != len(texts):
+            raise ValueError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+        return embeddings
+
+    def _build_prompt(self, question: str, context: str, history: Optional[str] = None) -> str:
+        conversation = f"Earlier in this conversation:\n{history}\n\n" if history else ""
+        return (
             "You are a financial assistant. Answer the question using ONLY the provided transcript context.\n\n"
             "Context:\n"
             f"{context}\n\n"
+            f"{conversation}"
             f"Question: {question}\n\n"
             "If the answer is not in the context, say: "
             "'The answer is not available in the provided transcripts.'"
         )
-        response = await asyncio.to_thread(self.generation_model.generate_content, prompt)
+
+    @retry(stop=stop_after_attempt(2), wait=wait_random_exponential(min=2, max=10))  # Reduced retries and longer waits
+    async def _generate_answer(self, question: str, context: str, history: Optional[str] = None) -> str:
+        logger.info("Generating response from Gemini.")
+        response = await get_rate_controller().run(
+            asyncio.to_thread, self.generation_model.generate_content, self._build_prompt(question, context, history)
+        )
         return response.text.strip()
 
+    async def _stream_generation(self, prompt: str) -> AsyncIterator[str]:
+        """Stream a Gemini generation; each blocking read of the response stream runs off the event loop"""
+        logger.info("Streaming response from Gemini.")
+        response = await asyncio.to_thread(self.generation_model.generate_content, prompt, stream=True)
+        chunks = iter(response)
+        while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+            try:
+                text = chunk.text
+            except ValueError:
+                continue  # Chunks carrying only finish metadata have no text parts
+            if text:
+                yield text
+
     async def upload_document(
         self,
         file_path: str,
         document_id: Optional[str] = None,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        filename: Optional[str] = None,
+        progress: Optional[Callable[..., None]] = None,
+        start_chunk: int = 0
     ) -> Dict[str, Any]:
         """
         Upload and process a document for RAG
@@ -176,6 +454,10 @@ class DocumentAgent:
             file_path: Path to the document file (PDF)
             document_id: Optional custom document ID
             metadata: Optional additional metadata
+            filename: Original filename for the document catalog (defaults to the file's name)
+            progress: Optional callback receiving ``pages_parsed``, ``chunks_embedded``,
+                ``vectors_upserted`` and ``checkpoint`` updates
+            start_chunk: Resume point; chunks before it were already upserted by an earlier attempt
             
         Returns:
             Dict with upload results and statistics
@@ -185,41 +467,57 @@ class DocumentAgent:
             
             # Generate document ID if not provided
             if not document_id:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = os.path.basename(file_path).replace('.pdf', '')
-                document_id = f"{filename}_{timestamp}_{str(uuid.uuid4())[:8]}"
+                document_id = new_document_id(file_path)
             
-            # Extract text from PDF
-            text_content = await self._extract_text_from_pdf(file_path)
-            if not text_content.strip():
-                return {
-                    "success": False,
-                    "error": "No text could be extracted from the PDF",
-                    "document_id": document_id
-                }
+            page_count = await asyncio.to_thread(pdf_extraction.count_pages, file_path)
+            catalog = get_document_catalog()
+            # Re-ingesting a catalogued document only embeds the chunks that changed
+            record = catalog.get(document_id)
+            previous = await self._previous_chunks(document_id, record)
+            catalog.register(
+                document_id,
+                filename=filename or os.path.basename(file_path),
+                status="ingesting",
+                byte_size=os.path.getsize(file_path),
+                page_count=page_count,
+                embedding_model=GEMINI_EMBEDDING_MODEL
+            )
+            if progress:
+                progress(total_pages=page_count, pages_parsed=0)
+            if start_chunk:
+                logger.info(f"Resuming ingest of {document_id} from chunk {start_chunk}")
+            
+            # Extract, split, embed and upsert as overlapping stages
+            try:
+                upload_results = await self._run_ingest_pipeline(
+                    chunks=self._iter_chunks(self._iter_pdf_pages(file_path, progress)),
+                    document_id=document_id,
+                    metadata=metadata or {},
+                    start_chunk=start_chunk,
+                    progress=progress,
+                    previous=previous,
+                    previous_chunk_count=(record or {}).get("chunk_count") or 0
+                )
+            except Exception:
+                catalog.update(document_id, status="failed")
+                raise
             
-            # Split text into chunks
-            chunks = self.text_splitter.split_text(text_content)
-            if not chunks:
+            if not upload_results["total_chunks"]:
+                catalog.update(document_id, status="failed")
                 return {
                     "success": False,
-                    "error": "No chunks created from document text",
+                    "error": "No text could be extracted from the PDF",
                     "document_id": document_id
                 }
             
-            logger.info(f"Created {len(chunks)} chunks from document")
-            
-            # Generate embeddings and upload to Pinecone
-            upload_results = await self._upload_chunks_to_pinecone(
-                chunks=chunks,
-                document_id=document_id,
-                metadata=metadata or {}
-            )
+            catalog.update(document_id, status="ready", chunk_count=upload_results["total_chunks"])
+            # Answers cached against a previous version of this document are stale now
+            get_answer_cache().invalidate_document(document_id)
             
             return {
                 "success": True,
                 "document_id": document_id,
-                "chunks_uploaded": len(chunks),
+                "chunks_uploaded": upload_results["total_chunks"],
                 "file_path": file_path,
                 "upload_results": upload_results,
                 "timestamp": datetime.now().isoformat()
@@ -237,18 +535,7 @@ class DocumentAgent:
         """Extract text from PDF file"""
         try:
             logger.info(f"Extracting text from PDF: {file_path}")
-            
-            def extract_pdf_text():
-                reader = PdfReader(file_path)
-                text = ""
-                for page in reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-                return text
-            
-            # Run PDF extraction in thread to avoid blocking
-            text = await asyncio.to_thread(extract_pdf_text)
+            text = await pdf_extraction.extract_text(file_path)
             logger.info(f"Extracted {len(text)} characters from PDF")
             return text
             
@@ -256,92 +543,365 @@ class DocumentAgent:
             logger.error(f"Error extracting text from PDF: {e}")
             raise
 
+    async def _iter_pdf_pages(self, file_path: str, progress: Optional[Callable[..., None]] = None) -> AsyncIterator[str]:
+        """Lazily extract PDF pages in page order, in parallel for large files"""
+        logger.info(f"Streaming pages from PDF: {file_path}")
+        pages_parsed = 0
+        async for page_text in pdf_extraction.iter_pdf_pages(file_path):
+            pages_parsed += 1
+            if progress:
+                progress(pages_parsed=pages_parsed)
+            yield page_text
+
+    async def _iter_chunks(self, pages: AsyncIterator[str]) -> AsyncIterator[str]:
+        """
+        Split pages into chunks as they arrive
+        
+        The raw text behind the last chunk of every split is carried into the
+        next buffer so chunk boundaries match splitting the whole document at once.
+        """
+        buffer = ""
+        async for page_text in pages:
+            buffer += page_text + "\n"
+            if len(buffer) < CHUNK_SIZE * 4:
+                continue
+            chunks = self.text_splitter.split_text(buffer)
+            for chunk in chunks[:-1]:
+                yield chunk
+            buffer = buffer[buffer.rfind(chunks[-1]):] if chunks else ""
+        for chunk in self.text_splitter.split_text(buffer):
+            yield chunk
+
     async def _upload_chunks_to_pinecone(
         self,
-        chunks: List[str],
+        chunks: Iterable[str],
         document_id: str,
         metadata: Dict[str, Any]
     ) -> Dict[str, Any]:
-        """Upload text chunks to Pinecone with embeddings"""
+        """Upload already-split text chunks to Pinecone with embeddings"""
+        async def chunk_source():
+            for chunk in chunks:
+                yield chunk
+        
+        return await self._run_ingest_pipeline(chunk_source(), document_id, metadata)
+
+    async def _run_ingest_pipeline(
+        self,
+        chunks: AsyncIterator[str],
+        document_id: str,
+        metadata: Dict[str, Any],
+        start_chunk: int = 0,
+        progress: Optional[Callable[..., None]] = None,
+        previous: Optional[Tuple[Dict[int, str], Dict[str, np.ndarray]]] = None,
+        previous_chunk_count: int = 0
+    ) -> Dict[str, Any]:
+        """
+        Embed and upsert chunks as they are produced
+        
+        Chunks are grouped into embedding batches, embedded by a bounded pool of
+        workers and upserted in Pinecone-sized batches. Bounded queues between
+        the stages apply backpressure, so memory stays flat however large the
+        document is.
+        
+        Chunks before ``start_chunk`` are skipped. ``progress`` receives a
+        ``checkpoint``: every chunk below it has been upserted, so a crashed or
+        partially failed ingest can resume there. Chunks that failed to embed
+        hold the checkpoint back until a retry embeds them.
+        
+        ``previous`` is the indexed version of the document from
+        ``_previous_chunks``. Chunks whose hash is unchanged at the same index
+        are left alone, chunks that moved reuse their old vector, only new text
+        is embedded. ``previous_chunk_count`` is the catalogued chunk count of
+        the indexed version; chunks past the new end are deleted whether or not
+        that version could be reused.
+        """
         try:
-            logger.info(f"Uploading {len(chunks)} chunks to Pinecone")
+            start_time = time.perf_counter()
+            upload_timestamp = datetime.now().isoformat()
+            batch_queue: asyncio.Queue = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+            vector_queue: asyncio.Queue = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+            stats = {
+                "total_chunks": 0,
+                "successful_chunks": 0,
+                "failed_chunks": 0,
+                "total_vectors_uploaded": 0,
+                "batches_processed": 0,
+                "first_upsert_seconds": None,
+                "chunks_unchanged": 0,
+                "vectors_reused": 0,
+                "embeddings_saved": 0,
+                "vectors_deleted": 0,
+            }
+            previous_hashes, previous_vectors = previous or ({}, {})
+            failed_indices = set()
+            # Chunks settled (upserted or unchanged) above the contiguous checkpoint
+            settled, checkpoint = set(), start_chunk
             
-            vectors = []
-            successful_chunks = 0
-            failed_chunks = 0
+            def settle(indices: Iterable[int]) -> None:
+                nonlocal checkpoint
+                settled.update(indices)
+                while checkpoint in settled:
+                    settled.discard(checkpoint)
+                    checkpoint += 1
             
-            for i, chunk in enumerate(chunks):
-                try:
-                    # Generate embedding for chunk
-                    embedding = await self._get_embedding_for_document(chunk)
-                    
-                    # Create vector with metadata (no symbol dependency)
-                    vector_metadata = {
-                        "text": chunk,
-                        "document_id": document_id,
-                        "chunk_index": i,
-                        "chunk_count": len(chunks),
-                        "upload_timestamp": datetime.now().isoformat(),
-                        **metadata  # Include any additional metadata
-                    }
-                    
-                    vectors.append({
-                        "id": f"{document_id}_chunk_{i}",
-                        "values": embedding,
-                        "metadata": vector_metadata
-                    })
+            def report() -> None:
+                if progress:
+                    progress(
+                        chunks_embedded=stats["successful_chunks"],
+                        vectors_upserted=stats["total_vectors_uploaded"],
+                        checkpoint=checkpoint
+                    )
+            
+            async def split_stage():
+                offset, batch = start_chunk, []
+                skipped = 0
+                async for chunk in chunks:
+                    if skipped < start_chunk:
+                        skipped += 1
+                        continue
+                    batch.append(chunk)
+                    if len(batch) == EMBEDDING_BATCH_SIZE:
+                        await batch_queue.put((offset, batch))
+                        offset, batch = offset + len(batch), []
+                if batch:
+                    await batch_queue.put((offset, batch))
+                    offset += len(batch)
+                stats["total_chunks"] = offset
+                for _ in range(EMBEDDING_MAX_CONCURRENCY):
+                    await batch_queue.put(None)
+            
+            async def embed_stage():
+                while (item := await batch_queue.get()) is not None:
+                    offset, batch = item
+                    hashes = [self._chunk_hash(text) for text in batch]
+                    embeddings: List[Optional[List[float]]] = [None] * len(batch)
+                    unchanged, to_embed = [], []
+                    for position, chunk_hash in enumerate(hashes):
+                        if previous_hashes.get(offset + position) == chunk_hash:
+                            unchanged.append(offset + position)
+                        elif chunk_hash in previous_vectors:
+                            embeddings[position] = previous_vectors[chunk_hash].tolist()
+                            stats["vectors_reused"] += 1
+                        else:
+                            to_embed.append(position)
+                    stats["chunks_unchanged"] += len(unchanged)
+                    stats["embeddings_saved"] += len(batch) - len(to_embed)
+                    if unchanged and HYBRID_RETRIEVAL_ENABLED:
+                        # Unchanged chunks keep their vectors but may predate the BM25 index
+                        await self._index_missing_sparse(document_id, {i: batch[i - offset] for i in unchanged})
+                    settle(unchanged)
                     
-                    successful_chunks += 1
+                    if to_embed:
+                        fresh = await self._embed_chunk_batch([batch[position] for position in to_embed], offset)
+                        for position, embedding in zip(to_embed, fresh):
+                            embeddings[position] = embedding
                     
-                    # Add delay to avoid rate limiting
-                    if i > 0 and i % 5 == 0:  # Every 5 chunks
-                        await asyncio.sleep(1)
-                        
-                except Exception as e:
-                    logger.warning(f"Failed to process chunk {i}: {e}")
-                    failed_chunks += 1
-                    continue
+                    vectors = []
+                    for position in to_embed:
+                        if embeddings[position] is None:
+                            stats["failed_chunks"] += 1
+                            failed_indices.add(offset + position)
+                    for position, embedding in enumerate(embeddings):
+                        if embedding is None:
+                            continue
+                        i = offset + position
+                        vectors.append({
+                            "id": f"{document_id}_chunk_{i}",
+                            "values": embedding,
+                            "metadata": {
+                                "text": batch[position],
+                                "document_id": document_id,
+                                "chunk_index": i,
+                                "chunk_hash": hashes[position],
+                                "upload_timestamp": upload_timestamp,
+                                **metadata  # Include any additional metadata
+                            }
+                        })
+                    stats["successful_chunks"] += len(vectors) + len(unchanged)
+                    report()
+                    if vectors:
+                        await vector_queue.put(vectors)
             
-            # Upload vectors to Pinecone in batches
-            if vectors:
-                batch_size = 100
-                upload_results = []
-                index = get_pinecone_index()
+            async def upsert_stage():
+                index = await get_async_vector_index()
+                pending = []
+                
+                async def flush(batch):
+                    await index.upsert(vectors=batch)
+                    if HYBRID_RETRIEVAL_ENABLED:
+                        await asyncio.to_thread(get_sparse_index().add, [
+                            (vector["id"], vector["metadata"]["text"], document_id) for vector in batch
+                        ])
+                    stats["batches_processed"] += 1
+                    stats["total_vectors_uploaded"] += len(batch)
+                    if stats["first_upsert_seconds"] is None:
+                        stats["first_upsert_seconds"] = round(time.perf_counter() - start_time, 3)
+                    settle(vector["metadata"]["chunk_index"] for vector in batch)
+                    report()
+                    logger.info(f"Uploaded batch {stats['batches_processed']} ({len(batch)} vectors)")
                 
-                for i in range(0, len(vectors), batch_size):
-                    batch = vectors[i:i + batch_size]
-                    try:
-                        result = await asyncio.to_thread(index.upsert, vectors=batch)
-                        upload_results.append(result)
-                        logger.info(f"Uploaded batch {i//batch_size + 1} ({len(batch)} vectors)")
-                        
-                        # Small delay between batches
-                        if i + batch_size < len(vectors):
-                            await asyncio.sleep(0.5)
-                            
-                    except Exception as e:
-                        logger.error(f"Failed to upload batch {i//batch_size + 1}: {e}")
-                        raise
+                while (vectors := await vector_queue.get()) is not None:
+                    pending.extend(vectors)
+                    while len(pending) >= UPSERT_BATCH_SIZE:
+                        await flush(pending[:UPSERT_BATCH_SIZE])
+                        pending = pending[UPSERT_BATCH_SIZE:]
+                if pending:
+                    await flush(pending)
             
-            logger.info(f"Document upload completed. Successful: {successful_chunks}, Failed: {failed_chunks}")
+            async def close_vector_queue(embedders):
+                await asyncio.gather(*embedders)
+                await vector_queue.put(None)
+            
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(split_stage())
+                embedders = [tg.create_task(embed_stage()) for _ in range(EMBEDDING_MAX_CONCURRENCY)]
+                tg.create_task(close_vector_queue(embedders))
+                tg.create_task(upsert_stage())
+            
+            # Chunks past the new end, or whose new text failed to embed, no longer match the document
+            previous_count = max(previous_chunk_count, max(previous_hashes, default=-1) + 1)
+            stale = [
+                f"{document_id}_chunk_{i}" for i in range(previous_count)
+                if i >= stats["total_chunks"] or i in failed_indices
+            ]
+            if stale:
+                index = await get_async_vector_index()
+                for start in range(0, len(stale), DELETE_BATCH_SIZE):
+                    await index.delete(ids=stale[start:start + DELETE_BATCH_SIZE])
+                stats["vectors_deleted"] = len(stale)
+            if HYBRID_RETRIEVAL_ENABLED:
+                sparse = get_sparse_index()
+                await asyncio.to_thread(sparse.remove, stale)
+                await asyncio.to_thread(sparse.save)
+            
+            elapsed = time.perf_counter() - start_time
+            chunks_per_second = stats["successful_chunks"] / elapsed if elapsed > 0 else 0.0
+            logger.info(
+                f"Document upload completed. Successful: {stats['successful_chunks']}, "
+                f"Failed: {stats['failed_chunks']}, Throughput: {chunks_per_second:.1f} chunks/sec"
+            )
+            if previous_hashes:
+                logger.info(
+                    f"Incremental re-ingest of {document_id}: {stats['chunks_unchanged']} unchanged, "
+                    f"{stats['vectors_reused']} reused, {stats['embeddings_saved']} embeddings saved, "
+                    f"{stats['vectors_deleted']} stale vectors deleted"
+                )
             
             # Create a clean, serializable response
             return {
-                "successful_chunks": successful_chunks,
-                "failed_chunks": failed_chunks,
-                "total_vectors_uploaded": len(vectors),
-                "batches_processed": len(upload_results),
+                **stats,
+                "total_seconds": round(elapsed, 3),
+                "chunks_per_second": round(chunks_per_second, 2),
                 "upload_summary": "Document successfully uploaded to Pinecone"
             }
             
+        except ExceptionGroup as eg:
+            logger.error(f"Error uploading chunks to Pinecone: {eg.exceptions[0]}")
+            raise eg.exceptions[0]
+
+    @staticmethod
+    def _chunk_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+    async def _previous_chunks(
+        self,
+        document_id: str,
+        record: Optional[Dict[str, Any]]
+    ) -> Optional[Tuple[Dict[int, str], Dict[str, np.ndarray]]]:
+        """
+        Snapshot of an already indexed document for incremental re-ingest
+        
+        Returns ``chunk_index -> chunk_hash`` and ``chunk_hash -> vector`` for
+        its hashed chunks, or None if there is nothing reusable (new document,
+        different embedding model, or chunks indexed before hashing).
+        """
+        if record is None or not record.get("chunk_count") or record.get("embedding_model") != GEMINI_EMBEDDING_MODEL:
+            return None
+        try:
+            index = await get_async_vector_index()
+            vector_ids = await self._document_vector_ids(index, document_id, record)
+            results = await asyncio.gather(*(
+                index.fetch(ids=vector_ids[i:i + FETCH_BATCH_SIZE])
+                for i in range(0, len(vector_ids), FETCH_BATCH_SIZE)
+            ))
         except Exception as e:
-            logger.error(f"Error uploading chunks to Pinecone: {e}")
-            raise
+            logger.warning(f"Could not read the indexed chunks of {document_id}, re-embedding all of them: {e}")
+            return None
+        
+        hashes, vectors = {}, {}
+        for result in results:
+            for vector in result.vectors.values():
+                vector_metadata = vector.metadata or {}
+                chunk_hash = vector_metadata.get("chunk_hash")
+                if chunk_hash is None or "chunk_index" not in vector_metadata:
+                    continue
+                hashes[int(vector_metadata["chunk_index"])] = chunk_hash
+                vectors.setdefault(chunk_hash, np.asarray(vector.values, dtype=np.float32))
+        return (hashes, vectors) if hashes else None
+
+    async def _embed_chunk_batch(self, texts: List[str], offset: int = 0) -> List[Optional[List[float]]]:
+        """
+        Embed a batch of chunks, falling back to per-chunk requests if the batch fails
+        
+        Returns one embedding per input text, with None for chunks that still failed.
+        """
+        try:
+            return await self._get_embeddings_for_documents(texts)
+        except Exception as e:
+            logger.warning(f"Batch embedding failed for chunks {offset}-{offset + len(texts) - 1}, retrying per chunk: {e}")
+        
+        embeddings = []
+        for position, text in enumerate(texts):
+            try:
+                embeddings.append(await self._get_embedding_for_document(text))
+            except Exception as e:
+                logger.warning(f"Failed to process chunk {offset + position}: {e}")
+                embeddings.append(None)
+        return embeddings
+
+    async def _get_embeddings_for_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embeddings for many document chunks; only cache misses are sent, in a single request"""
+        cache = get_embedding_cache()
+        keys = [cache.make_key(text, GEMINI_EMBEDDING_MODEL, "retrieval_document") for text in texts]
+        cached = await asyncio.to_thread(cache.get_many, keys)
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        if missing:
+            embeddings = await self._embed_documents([texts[i] for i in missing])
+            fresh = [(keys[i], embedding) for i, embedding in zip(missing, embeddings)]
+            await asyncio.to_thread(cache.put_many, fresh)
+            cached.update(fresh)
+        return [cached[key] for key in keys]
 
-    @retry(stop=stop_after_attempt(2), wait=wait_random_exponential(min=2, max=10))
     async def _get_embedding_for_document(self, text: str) -> List[float]:
+        """Document chunk embedding, served from the embedding cache when possible"""
+        cache = get_embedding_cache()
+        key = cache.make_key(text, GEMINI_EMBEDDING_MODEL, "retrieval_document")
+        embedding = await asyncio.to_thread(cache.get, key)
+        if embedding is None:
+            embedding = await self._embed_document(text)
+            await asyncio.to_thread(cache.put, key, embedding)
+        return embedding
+
+    @retry(stop=stop_after_attempt(2), wait=wait_random_exponential(min=2, max=10))
+    async def _embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for many document chunks in a single request, at background priority"""
+        response = await get_rate_controller().run_background(
+            asyncio.to_thread,
+            genai.embed_content,
+            model=GEMINI_EMBEDDING_MODEL,
+            content=texts,
+            task_type="retrieval_document"
+        )
+        embeddings = response["embedding"]
+        if len(embeddings) != len(texts):
+            raise ValueError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+        return embeddings
+
+    @retry(stop=stop_after_attempt(2), wait=wait_random_exponential(min=2, max=10))
+    async def _embed_document(self, text: str) -> List[float]:
         """Generate embedding for document chunk"""
-        response = await asyncio.to_thread(
+        response = await get_rate_controller().run_background(
+            asyncio.to_thread,
             genai.embed_content,
             model=GEMINI_EMBEDDING_MODEL,
             content=text,
@@ -349,35 +909,35 @@ class DocumentAgent:
         )
         return response["embedding"]
 
-    async def list_documents(self) -> Dict[str, Any]:
-        """List all uploaded documents"""
+    async def list_documents(
+        self,
+        limit: int = 100,
+        offset: int = 0,
+        query: Optional[str] = None,
+        status: Optional[str] = None,
+        embedding_model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """List uploaded documents from the document catalog"""
         try:
-            index = get_pinecone_index()
+            catalog = get_document_catalog()
+            if not catalog.get_meta("bootstrapped"):
+                await self._bootstrap_catalog()
             
-            # Get a sample of vectors to find unique documents
-            # Use a small non-zero vector instead of all zeros
-            query_result = index.query(
-                vector=[0.01] * 768,  # Small non-zero value
-                top_k=10000,  # Large number to get many results
-                include_metadata=True
+            rows, total = catalog.list(
+                limit=limit,
+                offset=offset,
+                query=query,
+                status=status,
+                embedding_model=embedding_model
             )
-            
-            # Extract unique documents
-            documents = {}
-            for match in query_result.matches:
-                metadata = match.metadata
-                doc_id = metadata.get("document_id")
-                if doc_id and doc_id not in documents:
-                    documents[doc_id] = {
-                        "document_id": doc_id,
-                        "upload_timestamp": metadata.get("upload_timestamp"),
-                        "chunk_count": metadata.get("chunk_count", 0)
-                    }
+            documents = [{**row, "upload_timestamp": row["created_at"]} for row in rows]
             
             return {
                 "success": True,
-                "documents": list(documents.values()),
-                "total_documents": len(documents)
+                "documents": documents,
+                "total_documents": total,
+                "limit": limit,
+                "offset": offset
             }
             
         except Exception as e:
@@ -388,38 +948,98 @@ class DocumentAgent:
                 "documents": []
             }
 
-    async def delete_document(self, document_id: str) -> Dict[str, Any]:
-        """Delete a document and all its chunks from Pinecone"""
+    async def _bootstrap_catalog(self) -> None:
+        """
+        One-time import of documents uploaded before the catalog existed
+        
+        Uses the legacy vector-index scan, so it is limited to the first
+        10,000 chunks it can see.
+        """
+        logger.info("Bootstrapping document catalog from the vector index")
+        index = await get_async_vector_index()
+        query_result = await index.query(
+            vector=[0.01] * 768,  # Small non-zero value
+            top_k=10000,
+            include_metadata=True
+        )
+        
+        documents = {}
+        for match in query_result.matches:
+            metadata = match.metadata
+            doc_id = metadata.get("document_id")
+            if not doc_id:
+                continue
+            document = documents.setdefault(doc_id, {
+                "created_at": metadata.get("upload_timestamp"),
+                "chunk_count": int(metadata.get("chunk_count", 0))
+            })
+            # Streamed uploads don't record the total, so derive it from the chunk indices seen
+            document["chunk_count"] = max(document["chunk_count"], int(metadata.get("chunk_index", -1)) + 1)
+        
+        catalog = get_document_catalog()
+        for doc_id, document in documents.items():
+            if catalog.get(doc_id) is None:
+                catalog.register(doc_id, status="ready", **document)
+        catalog.set_meta("bootstrapped", datetime.now().isoformat())
+        logger.info(f"Imported {len(documents)} existing documents into the catalog")
+
+    async def delete_document(
+        self,
+        document_id: str,
+        progress: Optional[Callable[..., None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Delete a document and all its chunks from the vector index
+        
+        Chunk IDs are deterministic (``{document_id}_chunk_{i}``), so they are
+        derived from the catalogued chunk count, or listed by prefix for
+        documents the catalog doesn't know, and deleted in parallel batches.
+        
+        Args:
+            document_id: Document to delete
+            progress: Optional callback receiving ``deleted_vectors``/``total_vectors`` updates
+        """
         try:
             logger.info(f"Deleting document: {document_id}")
-            index = get_pinecone_index()
+            index = await get_async_vector_index()
+            catalog = get_document_catalog()
+            record = catalog.get(document_id)
             
-            # Find all vectors for this document
-            query_result = index.query(
-                vector=[0.01] * 768,  # Small non-zero value
-                top_k=10000,
-                include_metadata=True,
-                filter={"document_id": document_id}
-            )
-            
-            if not query_result.matches:
+            vector_ids = await self._document_vector_ids(index, document_id, record)
+            if not vector_ids:
+                if record is not None:
+                    catalog.delete(document_id)
                 return {
                     "success": False,
                     "error": f"No document found with ID: {document_id}"
                 }
             
-            # Extract vector IDs to delete
-            vector_ids = [match.id for match in query_result.matches]
+            if record is not None:
+                catalog.update(document_id, status="deleting")
             
-            # Delete vectors in batches
-            batch_size = 1000
+            semaphore = asyncio.Semaphore(DELETE_MAX_CONCURRENCY)
             deleted_count = 0
             
-            for i in range(0, len(vector_ids), batch_size):
-                batch_ids = vector_ids[i:i + batch_size]
-                await asyncio.to_thread(index.delete, ids=batch_ids)
+            async def delete_batch(batch_ids: List[str]):
+                nonlocal deleted_count
+                async with semaphore:
+                    await index.delete(ids=batch_ids)
                 deleted_count += len(batch_ids)
-                logger.info(f"Deleted batch {i//batch_size + 1} ({len(batch_ids)} vectors)")
+                if progress:
+                    progress(deleted_vectors=deleted_count, total_vectors=len(vector_ids))
+            
+            await asyncio.gather(*(
+                delete_batch(vector_ids[i:i + DELETE_BATCH_SIZE])
+                for i in range(0, len(vector_ids), DELETE_BATCH_SIZE)
+            ))
+            logger.info(f"Deleted {deleted_count} vectors for document {document_id}")
+            if HYBRID_RETRIEVAL_ENABLED:
+                sparse = get_sparse_index()
+                await asyncio.to_thread(sparse.remove, vector_ids)
+                await asyncio.to_thread(sparse.save)
+            
+            catalog.delete(document_id)
+            get_answer_cache().invalidate_document(document_id)
             
             return {
                 "success": True,
@@ -434,4 +1054,27 @@ class DocumentAgent:
                 "success": False,
                 "error": str(e),
                 "document_id": document_id
-            }
\ No newline at end of file
+            }
+
+    async def _document_vector_ids(
+        self,
+        index: AsyncVectorIndex,
+        document_id: str,
+        record: Optional[Dict[str, Any]]
+    ) -> List[str]:
+        """Vector IDs belonging to a document"""
+        if record is not None and record.get("chunk_count"):
+            return [f"{document_id}_chunk_{i}" for i in range(record["chunk_count"])]
+        
+        try:
+            return await index.list_ids(prefix=f"{document_id}_chunk_")
+        except Exception as e:
+            # Pod-based Pinecone indexes can't list by prefix; fall back to a filtered scan
+            logger.warning(f"Listing vectors by prefix failed, falling back to a filtered query: {e}")
+            query_result = await index.query(
+                vector=[0.01] * 768,  # Small non-zero value
+                top_k=10000,
+                include_metadata=False,
+                filter={"document_id": document_id}
+            )
+            return [match.id for match in query_result.matches]
@@ -1,6 +1,10 @@
 import os
+import asyncio
+import logging
+import pandas as pd
 import yfinance as yf
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 import json
 from dotenv import load_dotenv
 
@@ -9,6 +13,12 @@ load_dotenv()
 
 from langchain_google_genai import ChatGoogleGenerativeAI  # ✅ Gemini LLM
 
+from rate_limiter import get_rate_controller
+from market_data_cache import get_market_data_cache
+from prompt_compaction import compact_statement
+
+logger = logging.getLogger(__name__)
+
 # Set your Gemini API Key - FIXED: Use GEMINI_API_KEY to match your .env file
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
@@ -17,25 +27,67 @@ print(f"DEBUG: GEMINI_API_KEY loaded: {'Yes' if GEMINI_API_KEY else 'No'}")
 if GEMINI_API_KEY:
     print(f"DEBUG: API Key starts with: {GEMINI_API_KEY[:10]}...")
 
+# Tool calls are blocking network I/O; they run on a bounded thread pool so the event loop stays free
+FINANCIAL_TOOL_MAX_WORKERS = int(os.getenv("FINANCIAL_TOOL_MAX_WORKERS", "8"))
+FINANCIAL_TOOL_TIMEOUT_SECONDS = float(os.getenv("FINANCIAL_TOOL_TIMEOUT_SECONDS", "20"))
+PORTFOLIO_MAX_SYMBOLS = int(os.getenv("PORTFOLIO_MAX_SYMBOLS", "50"))
+PORTFOLIO_TIMEOUT_SECONDS = float(os.getenv("PORTFOLIO_TIMEOUT_SECONDS", "45"))
+
+_tool_pool: Optional[ThreadPoolExecutor] = None
+
+def get_tool_pool() -> ThreadPoolExecutor:
+    """Get the shared thread pool for yfinance tool calls"""
+    global _tool_pool
+    if _tool_pool is None:
+        _tool_pool = ThreadPoolExecutor(max_workers=FINANCIAL_TOOL_MAX_WORKERS, thread_name_prefix="financial-tool")
+    return _tool_pool
+
+def shutdown_tool_pool() -> None:
+    global _tool_pool
+    if _tool_pool is not None:
+        _tool_pool.shutdown(wait=False, cancel_futures=True)
+        _tool_pool = None
+
+# --- Cached yfinance access ---
+def _download_dataset(symbol: str, dataset: str):
+    ticker = yf.Ticker(symbol)
+    if dataset == "info":
+        return ticker.info
+    if dataset == "income":
+        return ticker.financials
+    if dataset == "balance":
+        return ticker.balance_sheet
+    if dataset == "cashflow":
+        return ticker.cashflow
+    raise ValueError(f"Unknown dataset: {dataset}")
+
+def get_dataset(symbol: str, dataset: str):
+    """
+    Fetch a yfinance dataset ("info", "income", "balance" or "cashflow") through the TTL cache.
+    Concurrent requests for the same symbol and dataset share one download.
+    """
+    symbol = symbol.upper()
+    return get_market_data_cache().get_or_fetch(symbol, dataset, lambda: _download_dataset(symbol, dataset))
+
 # --- TOOL: Fetch Specific Financial Report ---
-def fetch_financial_report(symbol: str, report_type: str) -> str:
+def fetch_financial_report(symbol: str, report_type: str, question: Optional[str] = None) -> str:
     """
     Fetches the requested financial report (income statement, balance sheet, or cashflow) for a given stock symbol.
+    The statement is compacted to the line items most relevant to the question.
     """
     try:
-        ticker = yf.Ticker(symbol)
         report_type = report_type.lower()
         if report_type in ["income statement", "income", "profit"]:
-            df = ticker.financials
+            df = get_dataset(symbol, "income")
         elif report_type in ["balance sheet", "balance"]:
-            df = ticker.balance_sheet
+            df = get_dataset(symbol, "balance")
         elif report_type in ["cashflow", "cash flow"]:
-            df = ticker.cashflow
+            df = get_dataset(symbol, "cashflow")
         else:
             return "Invalid report type. Please specify 'income statement', 'balance sheet', or 'cashflow'."
         if df.empty:
             return f"No {report_type} data found for {symbol}."
-        return df.to_string()
+        return compact_statement(df, question=question)
     except Exception as e:
         return f"Error fetching financial report: {e}"
 
@@ -45,8 +97,7 @@ def fetch_company_info(symbol: str) -> str:
     Fetches general company info and key financial metrics.
     """
     try:
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
+        info = get_dataset(symbol, "info")
         if not info:
             return "No company info found for this symbol."
         fields = [
@@ -63,13 +114,12 @@ def list_available_reports(symbol: str) -> str:
     Lists which financial reports (income statement, balance sheet, cashflow) are available for the given stock symbol.
     """
     try:
-        ticker = yf.Ticker(symbol)
         available = []
-        if not ticker.financials.empty:
+        if not get_dataset(symbol, "income").empty:
             available.append("income statement")
-        if not ticker.balance_sheet.empty:
+        if not get_dataset(symbol, "balance").empty:
             available.append("balance sheet")
-        if not ticker.cashflow.empty:
+        if not get_dataset(symbol, "cashflow").empty:
             available.append("cashflow")
         if not available:
             return f"No financial reports found for {symbol}."
@@ -77,6 +127,71 @@ def list_available_reports(symbol: str) -> str:
     except Exception as e:
         return f"Error listing available reports: {e}"
 
+# --- Portfolio comparison ---
+PORTFOLIO_INFO_FIELDS = ["shortName", "sector", "marketCap", "trailingPE", "profitMargins", "dividendYield"]
+PORTFOLIO_INCOME_ROWS = ["Total Revenue", "Net Income"]
+PORTFOLIO_BALANCE_ROWS = ["Total Assets", "Total Debt", "Stockholders Equity"]
+
+def get_price_history(symbols: List[str]) -> pd.DataFrame:
+    """
+    One year of daily closes, one column per symbol.
+    Symbols missing from the cache are fetched together in a single bulk yf.download call.
+    """
+    cache = get_market_data_cache()
+    closes = cache.get_many(symbols, "prices")
+    missing = [symbol for symbol in symbols if symbol not in closes]
+    if missing:
+        data = yf.download(missing, period="1y", auto_adjust=True, progress=False, threads=True)
+        frame = data["Close"] if not data.empty else pd.DataFrame()
+        if isinstance(frame, pd.Series):
+            frame = frame.to_frame(missing[0])
+        for symbol in missing:
+            if symbol in frame:
+                series = frame[symbol].dropna()
+                cache.put(symbol, "prices", series)
+                closes[symbol] = series
+    return pd.DataFrame(closes)
+
+def _latest_values(statements: Dict[str, Any], rows: List[str], symbols: List[str]) -> pd.DataFrame:
+    """Most recent period of each statement, as a symbols x rows frame"""
+    latest = {
+        symbol: df.iloc[:, 0][~df.index.duplicated()]
+        for symbol, df in statements.items()
+        if isinstance(df, pd.DataFrame) and not df.empty
+    }
+    return pd.DataFrame(latest).reindex(index=rows).T.reindex(index=symbols)
+
+def build_comparison_table(
+    symbols: List[str],
+    infos: Dict[str, Any],
+    incomes: Dict[str, Any],
+    balances: Dict[str, Any],
+    closes: pd.DataFrame
+) -> pd.DataFrame:
+    """One row per symbol with valuation, profitability, balance sheet and price metrics"""
+    info = pd.DataFrame.from_dict(
+        {symbol: value for symbol, value in infos.items() if isinstance(value, dict)}, orient="index"
+    ).reindex(index=symbols, columns=PORTFOLIO_INFO_FIELDS)
+    income = _latest_values(incomes, PORTFOLIO_INCOME_ROWS, symbols).astype(float)
+    balance = _latest_values(balances, PORTFOLIO_BALANCE_ROWS, symbols).astype(float)
+    closes = closes.reindex(columns=symbols).astype(float)
+
+    billions = 1e9
+    table = pd.DataFrame(index=symbols)
+    table["Name"] = info["shortName"]
+    table["Sector"] = info["sector"]
+    table["Market Cap ($B)"] = pd.to_numeric(info["marketCap"], errors="coerce") / billions
+    table["P/E"] = pd.to_numeric(info["trailingPE"], errors="coerce")
+    table["Profit Margin (%)"] = pd.to_numeric(info["profitMargins"], errors="coerce") * 100
+    table["Dividend Yield (%)"] = pd.to_numeric(info["dividendYield"], errors="coerce")
+    table["Revenue ($B)"] = income["Total Revenue"] / billions
+    table["Net Income ($B)"] = income["Net Income"] / billions
+    table["Total Assets ($B)"] = balance["Total Assets"] / billions
+    table["Debt/Equity"] = balance["Total Debt"] / balance["Stockholders Equity"]
+    table["1Y Return (%)"] = (closes.ffill().iloc[-1] / closes.bfill().iloc[0] - 1) * 100 if len(closes) else float("nan")
+    table["Volatility (%)"] = closes.pct_change(fill_method=None).std() * (252 ** 0.5) * 100 if len(closes) else float("nan")
+    return table.round(2)
+
 # --- Gemini LLM Configuration ---
 try:
     llm = ChatGoogleGenerativeAI(
@@ -111,68 +226,213 @@ class FinancialAgent:
                 return f"Error executing {tool_name}: {e}"
         else:
             return f"Tool {tool_name} not found. Available tools: {list(self.tools.keys())}"
+
+    async def _run_tool(self, tool_name: str, timeout: float = FINANCIAL_TOOL_TIMEOUT_SECONDS, **kwargs) -> str:
+        """
+        Execute a tool on the tool thread pool with a timeout.
+        Cancelling the caller abandons the call; the download itself still finishes in its thread and warms the cache.
+        """
+        future = asyncio.get_running_loop().run_in_executor(
+            get_tool_pool(), lambda: self._execute_tool(tool_name, **kwargs)
+        )
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{tool_name} timed out after {timeout}s")
+            return f"Error executing {tool_name}: timed out after {timeout:g}s"
+
+    def _plan_tools(self, question_lower: str, report_type: Optional[str]) -> List[Tuple[str, Dict[str, str]]]:
+        """Pick the tool calls a question needs; every dataset it mentions is fetched"""
+        # Default to company info for general questions
+        return self._requested_tools(question_lower, report_type) or [("fetch_company_info", {})]
+
+    def _requested_tools(self, question_lower: str, report_type: Optional[str]) -> List[Tuple[str, Dict[str, str]]]:
+        """Tool calls for the datasets a question asks for; empty if it names none"""
+        if "available" in question_lower or "list" in question_lower:
+            return [("list_available_reports", {})]
+
+        calls: List[Tuple[str, Dict[str, str]]] = []
+        wants_overview = any(term in question_lower for term in ["overview", "analysis", "analyze", "health", "fundamentals"])
+        if wants_overview or any(term in question_lower for term in ["company", "info", "general"]):
+            calls.append(("fetch_company_info", {}))
+
+        report_types = []
+        if report_type:
+            report_types.append(report_type)
+        if "income" in question_lower or "profit" in question_lower:
+            report_types.append("income statement")
+        if "balance" in question_lower:
+            report_types.append("balance sheet")
+        if "cashflow" in question_lower or "cash flow" in question_lower:
+            report_types.append("cashflow")
+        if wants_overview:
+            report_types += ["income statement", "balance sheet"]
+        if not report_types and any(term in question_lower for term in ["financial", "statement", "report"]):
+            # Default to income statement if no specific report type is mentioned
+            report_types.append("income statement")
+
+        for name in dict.fromkeys(report_types):
+            calls.append(("fetch_financial_report", {"report_type": name, "question": question_lower}))
+        return calls
+
+    def plan_datasets(self, question: str, report_type: Optional[str] = None) -> List[str]:
+        """Names of the datasets a single-symbol question asks for, e.g. ["fetch_company_info", "balance sheet"]"""
+        calls = self._requested_tools(question.strip().lower(), report_type.lower() if report_type else None)
+        return [kwargs.get("report_type", tool_name) for tool_name, kwargs in calls]
+
+    async def _gather_data(self, symbol: str, calls: List[Tuple[str, Dict[str, str]]]) -> str:
+        """Run the planned tool calls concurrently; latency is that of the slowest fetch"""
+        results = await asyncio.gather(*(
+            self._run_tool(tool_name, symbol=symbol, **kwargs) for tool_name, kwargs in calls
+        ))
+        if len(results) == 1:
+            return results[0]
+        sections = []
+        for (tool_name, kwargs), result in zip(calls, results):
+            title = kwargs.get("report_type", "company info" if tool_name == "fetch_company_info" else tool_name)
+            sections.append(f"### {title.title()}\n{result}")
+        return "\n\n".join(sections)
     
-    async def answer(self, question: str, symbol: str, report_type: Optional[str] = None):
+    async def _fetch_portfolio(self, symbols: List[str]) -> Tuple[Dict[str, Dict[str, Any]], pd.DataFrame]:
         """
-        Handles financial queries using LLM + tools.
-        If report_type is provided, it's explicitly mentioned in the prompt.
+        Fetch info, income statement and balance sheet for every symbol plus bulk price history, all concurrently.
+        Fetches still running at the deadline are dropped and show up as missing values.
         """
+        loop = asyncio.get_running_loop()
+        pool = get_tool_pool()
+        requests = {
+            (symbol, dataset): loop.run_in_executor(pool, get_dataset, symbol, dataset)
+            for symbol in symbols for dataset in ("info", "income", "balance")
+        }
+        prices = loop.run_in_executor(pool, get_price_history, symbols)
+        done, pending = await asyncio.wait([*requests.values(), prices], timeout=PORTFOLIO_TIMEOUT_SECONDS)
+        for future in pending:
+            future.cancel()
+        if pending:
+            logger.warning(f"{len(pending)} portfolio fetches timed out after {PORTFOLIO_TIMEOUT_SECONDS}s")
+
+        data: Dict[str, Dict[str, Any]] = {"info": {}, "income": {}, "balance": {}}
+        for (symbol, dataset), future in requests.items():
+            if future in done and future.exception() is None:
+                data[dataset][symbol] = future.result()
+            elif future in done:
+                logger.warning(f"Could not fetch {dataset} for {symbol}: {future.exception()}")
+        closes = prices.result() if prices in done and prices.exception() is None else pd.DataFrame()
+        return data, closes
+
+    async def _prepare_portfolio(self, symbols: List[str]) -> str:
+        """Fetch the comparison table for several symbols (or the reason the query is rejected)"""
+        if len(symbols) > PORTFOLIO_MAX_SYMBOLS:
+            return f"Too many symbols: at most {PORTFOLIO_MAX_SYMBOLS} can be compared in one query."
+
+        data, closes = await self._fetch_portfolio(symbols)
+        table = build_comparison_table(symbols, data["info"], data["income"], data["balance"], closes)
+        return table.to_string(na_rep="N/A")
+
+    @staticmethod
+    def _portfolio_prompt(question: str, symbols: List[str], table: str, history: Optional[str] = None) -> str:
         question = question.strip().capitalize()
-        symbol = symbol.upper()
-        
-        # Create a comprehensive prompt that includes tool descriptions
-        tools_description = """
-Available tools:
-1. fetch_financial_report(symbol, report_type) - Fetch financial statements (income statement, balance sheet, or cashflow)
-2. fetch_company_info(symbol) - Fetch general company information and key metrics
-3. list_available_reports(symbol) - List which financial reports are available for a stock symbol
-
-You should analyze the user's question and determine which tools to use. Provide a clear and informative response.
+        conversation = f"\nEarlier in this conversation:\n{history}\n" if history else ""
+        return f"""
+Based on the following comparison table for {", ".join(symbols)}, please provide a clear and informative answer to the user's question: "{question}"
+
+Figures are from each company's latest annual statements; returns and volatility cover the past year.
+
+{table}
+{conversation}
+Please format your response in a user-friendly way, compare the companies directly and highlight key insights.
 """
-        
+
+    async def _prepare(self, question: str, symbol: str, report_type: Optional[str]) -> str:
+        """Fetch the data a single-symbol question needs"""
         if report_type:
             report_type = report_type.lower()
-            prompt = f"{tools_description}\n\nUser question: {question} for {symbol} ({report_type})\n\nPlease provide a comprehensive answer using the appropriate tools."
-        else:
-            prompt = f"{tools_description}\n\nUser question: {question} for {symbol}\n\nPlease provide a comprehensive answer using the appropriate tools."
-        
-        # For now, let's determine which tool to use based on the question content
-        question_lower = question.lower()
-        
-        if "available" in question_lower or "list" in question_lower:
-            result = self._execute_tool("list_available_reports", symbol=symbol)
-        elif "company" in question_lower or "info" in question_lower or "general" in question_lower:
-            result = self._execute_tool("fetch_company_info", symbol=symbol)
-        elif report_type or any(term in question_lower for term in ["income", "balance", "cashflow", "financial", "statement", "report"]):
-            if report_type:
-                result = self._execute_tool("fetch_financial_report", symbol=symbol, report_type=report_type)
-            else:
-                # Default to income statement if no specific report type is mentioned
-                result = self._execute_tool("fetch_financial_report", symbol=symbol, report_type="income statement")
-        else:
-            # Default to company info for general questions
-            result = self._execute_tool("fetch_company_info", symbol=symbol)
-        
-        # Use the LLM to provide a more natural response
-        final_prompt = f"""
+
+        # Determine which tools to use based on the question content, then fetch their data in parallel
+        calls = self._plan_tools(question.strip().lower(), report_type)
+        return await self._gather_data(symbol, calls)
+
+    @staticmethod
+    def _data_prompt(question: str, symbol: str, data: str, history: Optional[str] = None) -> str:
+        question = question.strip().capitalize()
+        conversation = f"\nEarlier in this conversation:\n{history}\n" if history else ""
+        return f"""
 Based on the following data for {symbol}, please provide a clear and informative answer to the user's question: "{question}"
 
 Data:
-{result}
-
+{data}
+{conversation}
 Please format your response in a user-friendly way and highlight key insights.
 """
-        
+
+    async def fetch_data(self, question: str, symbols: List[str], report_type: Optional[str] = None) -> str:
+        """The data a question about one or several symbols needs, without the LLM call"""
+        symbols = list(dict.fromkeys(symbol.strip().upper() for symbol in symbols if symbol and symbol.strip()))
+        if len(symbols) > 1:
+            return await self._prepare_portfolio(symbols)
+        return await self._prepare(question, symbols[0], report_type)
+
+    def _data_request(self, question: str, symbols: List[str], data: str, history: Optional[str]) -> Tuple[str, str, str]:
+        """Prompt, LLM-unavailable reply and LLM-failure fallback for already-fetched data"""
+        if len(symbols) > 1:
+            prompt = self._portfolio_prompt(question, symbols, data, history)
+            return prompt, f"LLM not available. Comparison table:\n{data}", f"Comparison table:\n{data}"
+        symbol = symbols[0]
+        prompt = self._data_prompt(question, symbol, data, history)
+        return prompt, f"LLM not available. Raw data for {symbol}:\n{data}", f"Data for {symbol}:\n{data}"
+
+    async def answer_from_data(self, question: str, symbols: List[str], data: str, history: Optional[str] = None) -> str:
+        """Answer from data returned by ``fetch_data`` (fetched now or earlier in a conversation)"""
+        return await self._complete(*self._data_request(question, symbols, data, history))
+
+    async def stream_from_data(
+        self,
+        question: str,
+        symbols: List[str],
+        data: str,
+        history: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Streaming variant of ``answer_from_data``"""
+        async for text in self._stream(*self._data_request(question, symbols, data, history)):
+            yield text
+
+    async def answer_from_prompt(self, prompt: str, fallback: str) -> str:
+        """Run a prompt built elsewhere (e.g. merged with document context); ``fallback`` is the raw data to return without the LLM"""
+        return await self._complete(prompt, f"LLM not available. {fallback}", fallback)
+
+    async def stream_from_prompt(self, prompt: str, fallback: str) -> AsyncIterator[str]:
+        """Streaming variant of ``answer_from_prompt``"""
+        async for text in self._stream(prompt, f"LLM not available. {fallback}", fallback):
+            yield text
+
+    async def _complete(self, prompt: str, unavailable: str, fallback: str) -> str:
         try:
             if self.llm is None:
-                return f"LLM not available. Raw data for {symbol}:\n{result}"
+                return unavailable
             
-            response = await self.llm.ainvoke(final_prompt)
+            response = await get_rate_controller().run(self.llm.ainvoke, prompt)
             return response.content if hasattr(response, 'content') else str(response)
         except Exception as e:
             # Fallback to raw data if LLM fails
             print(f"DEBUG: LLM error: {e}")
-            return f"Data for {symbol}:\n{result}"
+            return fallback
+
+    async def _stream(self, prompt: str, unavailable: str, fallback: str) -> AsyncIterator[str]:
+        if self.llm is None:
+            yield unavailable
+            return
+        streamed_any = False
+        try:
+            async for chunk in get_rate_controller().stream(self.llm.astream, prompt):
+                text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                if text:
+                    streamed_any = True
+                    yield text
+        except Exception as e:
+            print(f"DEBUG: LLM error: {e}")
+            # Raw data only makes sense if the answer hasn't started yet
+            if not streamed_any:
+                yield fallback
 
 # Create a global instance for backward compatibility
 financial_agent_executor = FinancialAgent()
\ No newline at end of file
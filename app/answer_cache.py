@@ -0,0 +1,171 @@
+"""
+Semantic answer cache for the orchestrator
+Answers are stored with the question's embedding under a normalized scope
+(sorted document IDs, or symbol and report type); a later question in the same
+scope whose embedding is close enough reuses the answer. All entries live in
+one normalized float32 matrix, so a lookup is a single matrix-vector product.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2048"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # Cosine similarity
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+# Market-data routes never embed otherwise, so caching them costs an embedding call per question
+ANSWER_CACHE_FINANCIAL = os.getenv("ANSWER_CACHE_FINANCIAL", "false").lower() == "true"
+
+
+def document_scope(document_ids: Iterable[str], top_k: Optional[int] = None, rerank: Optional[str] = None) -> str:
+    """Scope of answers over these documents; retrieval settings are part of it when given"""
+    scope = "documents:" + ",".join(sorted(set(document_ids)))
+    if top_k is not None:
+        scope += f":top_k={top_k}:rerank={rerank or ''}"
+    return scope
+
+
+def symbol_scope(symbols: Iterable[str], report_type: Optional[str] = None) -> str:
+    return "symbols:" + ",".join(sorted({symbol.strip().upper() for symbol in symbols})) + f":{(report_type or '').lower()}"
+
+
+class SemanticAnswerCache:
+    """
+    Fixed-capacity cache of (scope, question embedding) -> answer
+
+    Slots are reused oldest-first once the cache is full. Expired and
+    invalidated entries stay in the matrix but are masked out of lookups.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl: float = ANSWER_CACHE_TTL_SECONDS
+    ):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None  # Allocated on first put, once the dimension is known
+        self._scopes = np.full(max_entries, -1, dtype=np.int64)  # Interned scope IDs, -1 for empty slots
+        self._expires_at = np.zeros(max_entries)
+        self._stored_at = np.zeros(max_entries)
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * max_entries
+        self._scope_ids: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved_ms = 0.0
+
+    def _scope_id(self, scope: str, create: bool = False) -> Optional[int]:
+        scope_id = self._scope_ids.get(scope)
+        if scope_id is None and create:
+            scope_id = self._scope_ids[scope] = len(self._scope_ids)
+        return scope_id
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, scope: str, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """Best fresh entry in ``scope`` at or above the similarity threshold, or None"""
+        with self._lock:
+            scope_id = self._scope_id(scope)
+            if scope_id is None or self._matrix is None or len(embedding) != self._matrix.shape[1]:
+                self.misses += 1
+                return None
+            scores = self._matrix @ self._normalize(embedding)
+            valid = (self._scopes == scope_id) & (self._expires_at > time.time())
+            scores = np.where(valid, scores, -np.inf)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            entry = self._entries[best]
+            self.hits += 1
+            self.latency_saved_ms += entry["latency_ms"]
+            return {**entry, "similarity": float(scores[best])}
+
+    def put(
+        self,
+        scope: str,
+        embedding: List[float],
+        answer: str,
+        route: str,
+        latency_ms: float,
+        document_ids: Optional[Iterable[str]] = None,
+        ttl: Optional[float] = None
+    ) -> None:
+        vector = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+            elif len(vector) != self._matrix.shape[1]:
+                return
+            free = np.flatnonzero((self._scopes < 0) | (self._expires_at <= now))
+            slot = int(free[0]) if len(free) else int(np.argmin(self._stored_at))
+            self._matrix[slot] = vector
+            self._scopes[slot] = self._scope_id(scope, create=True)
+            self._expires_at[slot] = now + (self.ttl if ttl is None else ttl)
+            self._stored_at[slot] = now
+            self._entries[slot] = {
+                "answer": answer,
+                "route": route,
+                "latency_ms": latency_ms,
+                "document_ids": set(document_ids or ()),
+            }
+
+    def invalidate_document(self, document_id: str) -> int:
+        """Drop every answer that drew on ``document_id``; returns the number dropped"""
+        with self._lock:
+            slots = [
+                slot for slot, entry in enumerate(self._entries)
+                if entry is not None and document_id in entry["document_ids"] and self._scopes[slot] >= 0
+            ]
+            for slot in slots:
+                self._scopes[slot] = -1
+                self._entries[slot] = None
+        if slots:
+            logger.info(f"Answer cache: invalidated {len(slots)} answers for document {document_id}")
+        return len(slots)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._scopes[:] = -1
+            self._entries = [None] * self.max_entries
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": ANSWER_CACHE_ENABLED,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "latency_saved_ms": round(self.latency_saved_ms, 1),
+                "entries": int(((self._scopes >= 0) & (self._expires_at > time.time())).sum()),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl,
+            }
+
+
+_answer_cache: Optional[SemanticAnswerCache] = None
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Get the process-wide answer cache"""
+    global _answer_cache
+    if _answer_cache is None:
+        _answer_cache = SemanticAnswerCache()
+    return _answer_cache
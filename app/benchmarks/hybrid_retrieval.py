@@ -0,0 +1,144 @@
+"""
+Retrieval-quality and latency benchmark for hybrid (dense + BM25) retrieval
+Scores dense-only, BM25-only and reciprocal-rank-fused rankings on the bundled
+evaluation set (benchmarks/fixtures/retrieval_eval.json) with recall@k and MRR,
+then times BM25 search on a synthetic corpus against a latency budget.
+
+Dense rankings use Gemini embeddings with --live and a GEMINI_API_KEY; without
+it they use a character-trigram hashing embedding as an offline stand-in, so
+the offline dense numbers only indicate the shape of the comparison.
+
+Usage: python benchmarks/hybrid_retrieval.py [--live] [--k 5] [--scale 100000] [--budget-ms 50]
+"""
+
+import sys
+import json
+import time
+import zlib
+import argparse
+import statistics
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sparse_index import BM25Index, reciprocal_rank_fusion
+
+EVAL_SET = Path(__file__).parent / "fixtures" / "retrieval_eval.json"
+CANDIDATES = 30  # Matches the HYBRID_CANDIDATES default
+
+
+def trigram_embedding(text: str, dim: int = 768) -> np.ndarray:
+    text = f"  {text.lower()} "
+    vector = np.zeros(dim, dtype=np.float32)
+    for i in range(len(text) - 2):
+        vector[zlib.crc32(text[i:i + 3].encode()) % dim] += 1.0
+    return vector
+
+
+def gemini_embeddings(texts: List[str], task_type: str) -> np.ndarray:
+    import os
+    import google.generativeai as genai
+    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+    model = os.getenv("GEMINI_EMBEDDING_MODEL", "models/embedding-001")
+    vectors = []
+    for start in range(0, len(texts), 50):
+        response = genai.embed_content(model=model, content=texts[start:start + 50], task_type=task_type)
+        vectors.extend(response["embedding"])
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def score(rankings: List[List[str]], relevant: List[List[str]], k: int) -> Dict[str, float]:
+    recall = [len(set(ranking[:k]) & set(rel)) / len(rel) for ranking, rel in zip(rankings, relevant)]
+    reciprocal = []
+    for ranking, rel in zip(rankings, relevant):
+        ranks = [ranking.index(item) + 1 for item in rel if item in ranking]
+        reciprocal.append(1.0 / min(ranks) if ranks else 0.0)
+    return {"recall": statistics.mean(recall), "mrr": statistics.mean(reciprocal)}
+
+
+def evaluate(live: bool, k: int) -> None:
+    data = json.loads(EVAL_SET.read_text())
+    chunks, queries = data["chunks"], data["queries"]
+    ids = [chunk["id"] for chunk in chunks]
+    questions = [query["question"] for query in queries]
+
+    if live:
+        doc_vectors = gemini_embeddings([chunk["text"] for chunk in chunks], "retrieval_document")
+        query_vectors = gemini_embeddings(questions, "retrieval_query")
+    else:
+        doc_vectors = np.stack([trigram_embedding(chunk["text"]) for chunk in chunks])
+        query_vectors = np.stack([trigram_embedding(question) for question in questions])
+    similarities = normalize(query_vectors) @ normalize(doc_vectors).T
+    dense = [[ids[i] for i in np.argsort(-row)[:CANDIDATES]] for row in similarities]
+
+    bm25 = BM25Index(path=None)
+    bm25.add((chunk["id"], chunk["text"], chunk["document_id"]) for chunk in chunks)
+    sparse = [[vector_id for vector_id, _ in hits] for hits in bm25.search_many(questions, CANDIDATES)]
+    hybrid = [reciprocal_rank_fusion([d, s]) for d, s in zip(dense, sparse)]
+
+    print(f"Eval set: {len(chunks)} chunks, {len(queries)} queries ({'Gemini' if live else 'trigram-hash proxy'} dense embeddings)")
+    print(f"{'retriever':<10}{'subset':<12}{f'recall@{k}':>10}{'MRR':>8}")
+    for kind in ["all", "exact", "paraphrase"]:
+        selected = [i for i, query in enumerate(queries) if kind == "all" or query.get("kind") == kind]
+        relevant = [queries[i]["relevant"] for i in selected]
+        for label, rankings in [("dense", dense), ("bm25", sparse), ("hybrid", hybrid)]:
+            metrics = score([rankings[i] for i in selected], relevant, k)
+            print(f"{label:<10}{kind:<12}{metrics['recall']:>10.3f}{metrics['mrr']:>8.3f}")
+
+
+def latency(scale: int, budget_ms: float, seed: int = 3) -> None:
+    rng = np.random.default_rng(seed)
+    vocabulary = [f"term{i}" for i in range(50000)]
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1)  # Zipf-like term frequencies
+    weights /= weights.sum()
+
+    bm25 = BM25Index(path=None)
+    start = time.perf_counter()
+    batch = 10000
+    for offset in range(0, scale, batch):
+        words = rng.choice(len(vocabulary), size=(min(batch, scale - offset), 120), p=weights)
+        bm25.add(
+            (f"doc{(offset + i) // 500}_chunk_{offset + i}", " ".join(vocabulary[w] for w in row), f"doc{(offset + i) // 500}")
+            for i, row in enumerate(words)
+        )
+    bm25.merge()
+    build_seconds = time.perf_counter() - start
+
+    query_words = rng.choice(len(vocabulary), size=(200, 5), p=weights)
+    durations = []
+    for row in query_words:
+        query = " ".join(vocabulary[w] for w in row)
+        started = time.perf_counter()
+        bm25.search(query, CANDIDATES)
+        durations.append((time.perf_counter() - started) * 1000)
+    durations.sort()
+    p50, p95 = durations[len(durations) // 2], durations[int(len(durations) * 0.95)]
+    stats = bm25.stats()
+    print(f"\nBM25 at {scale:,} chunks: built in {build_seconds:.1f}s, {stats['postings']:,} postings, {stats['terms']:,} terms")
+    print(f"search p50 {p50:.1f} ms, p95 {p95:.1f} ms (budget {budget_ms:.0f} ms: {'OK' if p95 <= budget_ms else 'OVER'})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--live", action="store_true", help="Use Gemini embeddings for the dense side")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--scale", type=int, default=100000, help="Synthetic chunks for the latency test (0 to skip)")
+    parser.add_argument("--budget-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    evaluate(args.live, args.k)
+    if args.scale:
+        latency(args.scale, args.budget_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Quality and latency benchmark for the RAG rerank stage
+Over-fetches candidates with the hybrid first stage (dense + BM25, fused by
+reciprocal rank) on benchmarks/fixtures/retrieval_eval.json, then compares the
+first-stage top k with the "lexical" and "mmr" rerankers on recall@k, MRR and
+redundancy (mean pairwise cosine similarity of the top k passages). Reranking
+is then timed on synthetic 768-dimensional candidate sets against a latency budget.
+
+Dense rankings use Gemini embeddings with --live and a GEMINI_API_KEY;
+otherwise the character-trigram stand-in from hybrid_retrieval.py.
+
+Usage: python benchmarks/rerank_quality.py [--live] [--k 5] [--candidates 50] [--budget-ms 10]
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from types import SimpleNamespace
+from typing import List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from hybrid_retrieval import EVAL_SET, trigram_embedding, gemini_embeddings, normalize, score
+from rerank import Reranker
+from sparse_index import BM25Index, reciprocal_rank_fusion
+
+
+def redundancy(rankings: List[List[str]], unit_vectors: dict, k: int) -> float:
+    values = []
+    for ranking in rankings:
+        vectors = np.stack([unit_vectors[item] for item in ranking[:k]])
+        similarity = vectors @ vectors.T
+        values.append((similarity.sum() - np.trace(similarity)) / max(1, len(vectors) * (len(vectors) - 1)))
+    return float(np.mean(values))
+
+
+def evaluate(live: bool, k: int, candidates: int) -> None:
+    data = json.loads(EVAL_SET.read_text())
+    chunks, queries = data["chunks"], data["queries"]
+    ids = [chunk["id"] for chunk in chunks]
+    by_id = {chunk["id"]: chunk for chunk in chunks}
+    questions = [query["question"] for query in queries]
+
+    if live:
+        doc_vectors = gemini_embeddings([chunk["text"] for chunk in chunks], "retrieval_document")
+        query_vectors = gemini_embeddings(questions, "retrieval_query")
+    else:
+        doc_vectors = np.stack([trigram_embedding(chunk["text"]) for chunk in chunks])
+        query_vectors = np.stack([trigram_embedding(question) for question in questions])
+    vector_of = dict(zip(ids, doc_vectors))
+    unit_vectors = dict(zip(ids, normalize(doc_vectors)))
+    similarities = normalize(query_vectors) @ normalize(doc_vectors).T
+    dense = [[ids[i] for i in np.argsort(-row)[:candidates]] for row in similarities]
+
+    bm25 = BM25Index(path=None)
+    bm25.add((chunk["id"], chunk["text"], chunk["document_id"]) for chunk in chunks)
+    sparse = [[vector_id for vector_id, _ in hits] for hits in bm25.search_many(questions, 30)]
+    first_stage = [reciprocal_rank_fusion([d, s], top_k=candidates) for d, s in zip(dense, sparse)]
+
+    reranker = Reranker()
+    rankings = {"first-stage": [ranking[:k] for ranking in first_stage], "lexical": [], "mmr": []}
+    for mode in ("lexical", "mmr"):
+        for question, query_vector, ranking in zip(questions, query_vectors, first_stage):
+            matches = [
+                SimpleNamespace(id=item, metadata={"text": by_id[item]["text"]}, values=vector_of[item])
+                for item in ranking
+            ]
+            kept = reranker.rerank(question, query_vector, matches, k, mode)
+            rankings[mode].append([match.id for match in kept])
+
+    print(f"Eval set: {len(chunks)} chunks, {len(queries)} queries, {candidates} candidates "
+          f"({'Gemini' if live else 'trigram-hash proxy'} dense embeddings)")
+    print(f"{'ranking':<13}{'subset':<12}{f'recall@{k}':>10}{'MRR':>8}{'redundancy':>12}")
+    for kind in ["all", "exact", "paraphrase"]:
+        selected = [i for i, query in enumerate(queries) if kind == "all" or query.get("kind") == kind]
+        relevant = [queries[i]["relevant"] for i in selected]
+        for label, ranked in rankings.items():
+            subset = [ranked[i] for i in selected]
+            metrics = score(subset, relevant, k)
+            print(f"{label:<13}{kind:<12}{metrics['recall']:>10.3f}{metrics['mrr']:>8.3f}"
+                  f"{redundancy(subset, unit_vectors, k):>12.3f}")
+
+
+def latency(k: int, candidates: int, budget_ms: float, seed: int = 5) -> None:
+    rng = np.random.default_rng(seed)
+    texts = [chunk["text"] for chunk in json.loads(EVAL_SET.read_text())["chunks"]]
+    reranker = Reranker()
+    print(f"\nRerank latency, {candidates} candidates x 768 dims:")
+    for mode in ("lexical", "mmr"):
+        durations = []
+        for _ in range(200):
+            picked = rng.choice(len(texts), size=candidates)
+            # Chunks are ~1000 characters in production; repeat the short fixture passages to match
+            matches = [
+                SimpleNamespace(id=str(i), metadata={"text": " ".join([texts[i]] * 5)}, values=rng.standard_normal(768))
+                for i in picked
+            ]
+            question = texts[picked[0]][:80]
+            started = time.perf_counter()
+            reranker.rerank(question, rng.standard_normal(768), matches, k, mode)
+            durations.append((time.perf_counter() - started) * 1000)
+        durations.sort()
+        p50, p95 = durations[len(durations) // 2], durations[int(len(durations) * 0.95)]
+        print(f"{mode:<9} p50 {p50:.2f} ms, p95 {p95:.2f} ms (budget {budget_ms:.0f} ms: {'OK' if p95 <= budget_ms else 'OVER'})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--live", action="store_true", help="Use Gemini embeddings for the dense side")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--candidates", type=int, default=50)
+    parser.add_argument("--budget-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    evaluate(args.live, args.k, args.candidates)
+    latency(args.k, args.candidates, args.budget_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Prompt-size benchmark for financial statement compaction
+Builds the FinancialAgent final prompt from a full statement rendered with
+df.to_string() (the old format) and with compact_statement, and reports
+prompt tokens and serialization time for each. With --live and a
+GEMINI_API_KEY it also times real LLM calls and uses Gemini's token counter.
+
+Usage: python benchmarks/statement_compaction.py [--rows 40] [--live] [--repeats 3]
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from prompt_compaction import compact_statement, estimate_tokens
+
+# Line items in the order yfinance reports an annual income statement
+INCOME_ROWS = [
+    "Tax Effect Of Unusual Items", "Tax Rate For Calcs", "Normalized EBITDA", "Net Income From Continuing Operation Net Minority Interest",
+    "Reconciled Depreciation", "Reconciled Cost Of Revenue", "EBITDA", "EBIT", "Net Interest Income", "Interest Expense",
+    "Interest Income", "Normalized Income", "Net Income From Continuing And Discontinued Operation", "Total Expenses",
+    "Total Operating Income As Reported", "Diluted Average Shares", "Basic Average Shares", "Diluted EPS", "Basic EPS",
+    "Diluted NI Availto Com Stockholders", "Net Income Common Stockholders", "Net Income", "Net Income Including Noncontrolling Interests",
+    "Net Income Continuous Operations", "Tax Provision", "Pretax Income", "Other Income Expense", "Other Non Operating Income Expenses",
+    "Net Non Operating Interest Income Expense", "Interest Expense Non Operating", "Interest Income Non Operating", "Operating Income",
+    "Operating Expense", "Research And Development", "Selling General And Administration", "Gross Profit", "Cost Of Revenue",
+    "Total Revenue", "Operating Revenue", "Special Income Charges",
+]
+
+QUESTION = "How has revenue and net income changed over the last few years?"
+
+
+def make_statement(rows: int, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    names = (INCOME_ROWS * (rows // len(INCOME_ROWS) + 1))[:rows]
+    names = [name if i < len(INCOME_ROWS) else f"{name} {i}" for i, name in enumerate(names)]
+    columns = pd.to_datetime(["2024-09-30", "2023-09-30", "2022-09-30", "2021-09-30", "2020-09-30"])
+    values = rng.uniform(1e8, 4e11, size=(rows, len(columns))) + rng.random((rows, len(columns)))
+    for i, name in enumerate(names):
+        if "EPS" in name:
+            values[i] = rng.uniform(1, 7, len(columns)).round(2)
+        elif "Rate" in name:
+            values[i] = rng.uniform(0.1, 0.25, len(columns))
+    values[:, -1] = np.where(rng.random(rows) < 0.8, np.nan, values[:, -1])  # Oldest period is mostly empty
+    return pd.DataFrame(values, index=names, columns=columns)
+
+
+def final_prompt(symbol: str, question: str, data: str) -> str:
+    return f"""
+Based on the following data for {symbol}, please provide a clear and informative answer to the user's question: "{question}"
+
+Data:
+{data}
+
+Please format your response in a user-friendly way and highlight key insights.
+"""
+
+
+def time_call(func, repeats: int) -> float:
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+async def live_latency(prompt: str, repeats: int):
+    from agents.financial_agent import llm
+    if llm is None:
+        return None, None
+    tokens = llm.get_num_tokens(prompt)
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        await llm.ainvoke(prompt)
+        durations.append(time.perf_counter() - start)
+    return tokens, statistics.median(durations)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=40)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--live", action="store_true", help="Call Gemini to measure real tokens and latency")
+    args = parser.parse_args()
+
+    df = make_statement(args.rows)
+    before = final_prompt("AAPL", QUESTION, df.to_string())
+    after = final_prompt("AAPL", QUESTION, compact_statement(df, question=QUESTION))
+
+    print(f"Statement: {df.shape[0]} line items x {df.shape[1]} periods")
+    print(f"{'format':<12}{'chars':>8}{'est. tokens':>13}{'serialize ms':>14}")
+    for label, prompt, func in [
+        ("to_string", before, df.to_string),
+        ("compact", after, lambda: compact_statement(df, question=QUESTION)),
+    ]:
+        serialize_ms = time_call(func, args.repeats) * 1000
+        print(f"{label:<12}{len(prompt):>8}{estimate_tokens(prompt):>13}{serialize_ms:>14.2f}")
+    print(f"Prompt reduction: {1 - len(after) / len(before):.0%}")
+
+    if args.live:
+        for label, prompt in [("to_string", before), ("compact", after)]:
+            tokens, latency = await live_latency(prompt, args.repeats)
+            if tokens is None:
+                print("LLM not available; set GEMINI_API_KEY for live numbers")
+                break
+            print(f"{label:<12} gemini tokens {tokens:>6}  median latency {latency:.2f}s")
+
+    print("\nCompacted data block:\n" + compact_statement(df, question=QUESTION))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+"""
+Concurrency benchmark for the async vector-store layer
+Compares blocking index.query calls made inside coroutines (the old pattern)
+with the same calls routed through AsyncVectorIndex, against a local fake
+index that simulates network latency. No API keys needed.
+
+Usage: python benchmarks/vector_query_concurrency.py [--queries 64] [--latency-ms 50]
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from vector_store import AsyncVectorIndex
+
+
+class FakeIndex:
+    """Pinecone-shaped index whose calls block for a fixed latency"""
+
+    def __init__(self, latency_s: float):
+        self.latency_s = latency_s
+
+    def query(self, vector, top_k=5, include_metadata=True, filter=None):
+        time.sleep(self.latency_s)
+        return SimpleNamespace(matches=[
+            SimpleNamespace(id=f"doc_chunk_{i}", score=1.0 - i / top_k, metadata={"text": "..."})
+            for i in range(top_k)
+        ])
+
+
+async def blocking_queries(index: FakeIndex, n: int) -> float:
+    async def one():
+        index.query(vector=[0.01] * 768, top_k=5)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n)))
+    return time.perf_counter() - start
+
+
+async def async_layer_queries(index: AsyncVectorIndex, n: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(index.query(vector=[0.01] * 768, top_k=5) for _ in range(n)))
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=64)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+
+    fake = FakeIndex(args.latency_ms / 1000)
+    async_index = AsyncVectorIndex(fake, max_workers=args.workers)
+
+    print(f"{args.queries} concurrent queries, {args.latency_ms:.0f} ms simulated latency, {args.workers} workers")
+    for label, elapsed in (
+        ("blocking in event loop", await blocking_queries(fake, args.queries)),
+        ("async vector layer", await async_layer_queries(async_index, args.queries)),
+    ):
+        print(f"  {label:<24} {elapsed * 1000:8.1f} ms total  {args.queries / elapsed:8.1f} queries/sec")
+
+    async_index.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -22,6 +22,10 @@ class Config:
     PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "financial-rag-768")
     PINECONE_ENVIRONMENT = os.getenv("PINECONE_ENVIRONMENT", "us-east-1")
     
+    # Vector store backend: "pinecone" (hosted) or "local" (embedded NumPy index)
+    VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower()
+    LOCAL_VECTOR_STORE_PATH = os.getenv("LOCAL_VECTOR_STORE_PATH", "data/vector_index")
+    
     # Gemini AI Configuration
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-2.5-flash")
@@ -31,9 +35,10 @@ class Config:
     def validate(cls):
         """Validate that all required environment variables are present"""
         required_vars = {
-            "PINECONE_API_KEY": cls.PINECONE_API_KEY,
             "GEMINI_API_KEY": cls.GEMINI_API_KEY
         }
+        if cls.VECTOR_STORE_BACKEND == "pinecone":
+            required_vars["PINECONE_API_KEY"] = cls.PINECONE_API_KEY
         
         missing_vars = [var for var, value in required_vars.items() if not value]
         
@@ -49,6 +54,7 @@ class Config:
     def log_config(cls):
         """Log configuration status (without exposing sensitive data)"""
         logger.info("Configuration loaded:")
+        logger.info(f"  VECTOR_STORE_BACKEND: {cls.VECTOR_STORE_BACKEND}")
         logger.info(f"  PINECONE_INDEX_NAME: {cls.PINECONE_INDEX_NAME}")
         logger.info(f"  PINECONE_ENVIRONMENT: {cls.PINECONE_ENVIRONMENT}")
         logger.info(f"  GEMINI_MODEL_NAME: {cls.GEMINI_MODEL_NAME}")
@@ -0,0 +1,158 @@
+"""
+Context assembly for RAG prompts
+Turns retrieved chunks (best first) into the context block sent to Gemini:
+near-duplicates are dropped by MinHash similarity, chunks are admitted in relevance order
+until the token budget is spent, and the survivors are put back in document
+order with adjacent chunks merged so the splitter's overlap is sent only once.
+"""
+
+import os
+import re
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from prompt_compaction import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+CONTEXT_DUPLICATE_SIMILARITY = float(os.getenv("CONTEXT_DUPLICATE_SIMILARITY", "0.8"))  # Estimated shingle Jaccard
+
+SHINGLE_WORDS = 3
+MINHASH_PERMUTATIONS = 64
+MAX_OVERLAP_CHARS = 400  # Comfortably above the splitter's chunk_overlap
+MIN_OVERLAP_CHARS = 20
+
+_WORD = re.compile(r"\w+")
+_PRIME = np.uint64(4294967311)  # Smallest prime above 2**32, so (a * x + b) fits in 64 bits
+_rng = np.random.default_rng(1)
+_A = _rng.integers(1, 2**32, MINHASH_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, 2**32, MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature of the text's word shingles; the share of equal slots estimates Jaccard similarity"""
+    words = _WORD.findall(text.lower())
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=4).digest(), "little") for shingle in shingles],
+        dtype=np.uint64
+    )
+    return ((hashes[:, None] * _A + _B) % _PRIME).min(axis=0)
+
+
+def _join_overlapping(first: str, second: str) -> str:
+    """Concatenate consecutive chunks, dropping the text they share at the seam"""
+    tail = first[-MAX_OVERLAP_CHARS:]
+    for start in range(len(tail) - MIN_OVERLAP_CHARS + 1):
+        if second.startswith(tail[start:]):
+            return first + second[len(tail) - start:]
+    return f"{first}\n{second}"
+
+
+class ContextAssembler:
+    """Builds budgeted, deduplicated context blocks and counts what it saved"""
+
+    def __init__(self, token_budget: int = CONTEXT_TOKEN_BUDGET, duplicate_similarity: float = CONTEXT_DUPLICATE_SIMILARITY):
+        self.token_budget = token_budget
+        self.duplicate_similarity = duplicate_similarity
+        self._lock = threading.Lock()
+        self.contexts = 0
+        self.chunks_in = 0
+        self.duplicates_dropped = 0
+        self.over_budget_dropped = 0
+        self.chunks_merged = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def assemble(self, matches: List[Any], token_budget: Optional[int] = None) -> str:
+        """Context for ``matches`` (most relevant first), each with ``text``, ``document_id`` and ``chunk_index`` metadata"""
+        budget = self.token_budget if token_budget is None else token_budget
+        kept: List[Tuple[int, Dict[str, Any]]] = []  # (relevance rank, metadata)
+        signatures: List[np.ndarray] = []
+        duplicates = over_budget = 0
+        spent = 0
+        for rank, match in enumerate(matches):
+            metadata = match.metadata or {}
+            text = metadata.get("text", "")
+            if not text:
+                continue
+            signature = minhash(text)
+            if any(np.mean(signature == other) >= self.duplicate_similarity for other in signatures):
+                duplicates += 1
+                continue
+            cost = estimate_tokens(text)
+            if kept and spent + cost > budget:
+                over_budget += 1
+                continue
+            if not kept and cost > budget:
+                metadata = {**metadata, "text": text[:budget * 4]}  # A lone oversized chunk is truncated, not dropped
+                cost = budget
+            kept.append((rank, metadata))
+            signatures.append(signature)
+            spent += cost
+
+        # Documents in order of their best match; chunks in document order, consecutive ones merged
+        first_rank: Dict[Any, int] = {}
+        for rank, metadata in kept:
+            first_rank.setdefault(metadata.get("document_id"), rank)
+        kept.sort(key=lambda item: (
+            first_rank[item[1].get("document_id")],
+            item[1].get("chunk_index", float("inf")),
+            item[0]
+        ))
+        passages: List[str] = []
+        previous: Optional[Dict[str, Any]] = None
+        merged = 0
+        for _, metadata in kept:
+            index = metadata.get("chunk_index")
+            if (
+                previous is not None and index is not None
+                and previous.get("document_id") == metadata.get("document_id")
+                and previous.get("chunk_index") is not None and int(index) == int(previous["chunk_index"]) + 1
+            ):
+                passages[-1] = _join_overlapping(passages[-1], metadata["text"])
+                merged += 1
+            else:
+                passages.append(metadata["text"])
+            previous = metadata
+        context = "\n\n".join(passages)
+
+        with self._lock:
+            self.contexts += 1
+            self.chunks_in += len(matches)
+            self.duplicates_dropped += duplicates
+            self.over_budget_dropped += over_budget
+            self.chunks_merged += merged
+            self.tokens_in += sum(estimate_tokens((match.metadata or {}).get("text", "")) for match in matches)
+            self.tokens_out += estimate_tokens(context)
+        return context
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "contexts": self.contexts,
+                "chunks_in": self.chunks_in,
+                "duplicates_dropped": self.duplicates_dropped,
+                "over_budget_dropped": self.over_budget_dropped,
+                "chunks_merged": self.chunks_merged,
+                "tokens_in": self.tokens_in,
+                "tokens_out": self.tokens_out,
+                "token_reduction": round(1 - self.tokens_out / self.tokens_in, 4) if self.tokens_in else 0.0,
+                "token_budget": self.token_budget,
+            }
+
+
+_context_assembler: Optional[ContextAssembler] = None
+
+
+def get_context_assembler() -> ContextAssembler:
+    """Get the process-wide context assembler"""
+    global _context_assembler
+    if _context_assembler is None:
+        _context_assembler = ContextAssembler()
+    return _context_assembler
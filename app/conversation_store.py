@@ -0,0 +1,346 @@
+"""
+Conversation memory for the orchestrator graph
+A LangGraph checkpoint saver backed by SQLite, so conversation threads survive
+restarts. Storage is bounded: each thread keeps only its latest
+CONVERSATION_MAX_CHECKPOINTS checkpoints, threads idle for longer than
+CONVERSATION_IDLE_TTL_SECONDS are dropped, and beyond CONVERSATION_MAX_THREADS
+the least recently used threads are evicted.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_DB_PATH = os.getenv("CONVERSATION_DB_PATH", "data/conversations.sqlite")
+CONVERSATION_MAX_THREADS = int(os.getenv("CONVERSATION_MAX_THREADS", "1000"))
+CONVERSATION_MAX_CHECKPOINTS = int(os.getenv("CONVERSATION_MAX_CHECKPOINTS", "10"))  # Per thread
+CONVERSATION_IDLE_TTL_SECONDS = float(os.getenv("CONVERSATION_IDLE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+EVICTION_INTERVAL_SECONDS = 60
+
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver[int]):
+    """
+    Bounded, persistent checkpointer
+
+    Each checkpoint row holds the full channel snapshot, so pruning a thread
+    down to its latest checkpoints never loses state. Reads and writes refresh
+    the thread's last-used time, which drives idle expiry and LRU eviction.
+    """
+
+    def __init__(
+        self,
+        path: str = CONVERSATION_DB_PATH,
+        max_threads: int = CONVERSATION_MAX_THREADS,
+        max_checkpoints: int = CONVERSATION_MAX_CHECKPOINTS,
+        idle_ttl: float = CONVERSATION_IDLE_TTL_SECONDS
+    ):
+        super().__init__()
+        self.path = path
+        self.max_threads = max(1, max_threads)
+        self.max_checkpoints = max(1, max_checkpoints)
+        self.idle_ttl = idle_ttl
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS threads ("
+            "thread_id TEXT PRIMARY KEY, created_at REAL NOT NULL, last_used_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_threads_last_used ON threads(last_used_at);"
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL, parent_id TEXT, "
+            "type TEXT, checkpoint BLOB NOT NULL, metadata_type TEXT, metadata BLOB NOT NULL, "
+            "PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id));"
+            "CREATE TABLE IF NOT EXISTS writes ("
+            "thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL, "
+            "task_id TEXT NOT NULL, idx INTEGER NOT NULL, channel TEXT NOT NULL, type TEXT, value BLOB, task_path TEXT, "
+            "PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx));"
+        )
+        self._db.commit()
+        self._last_eviction = 0.0
+        self.evicted_threads = 0
+        self.pruned_checkpoints = 0
+        self.reused = {"documents": 0, "market_data": 0}  # Follow-up turns served from stored context or data
+
+    # ------------------------------------------------------------------ reads
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        with self._lock:
+            if checkpoint_id:
+                row = self._db.execute(
+                    "SELECT checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id)
+                ).fetchone()
+            else:
+                row = self._db.execute(
+                    "SELECT checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns)
+                ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE threads SET last_used_at = ? WHERE thread_id = ?", (time.time(), thread_id))
+            self._db.commit()
+            writes = self._pending_writes(thread_id, checkpoint_ns, row[0])
+        return self._to_tuple(thread_id, checkpoint_ns, row, writes)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None
+    ) -> Iterator[CheckpointTuple]:
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+            if get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(get_checkpoint_id(config))
+        if before and get_checkpoint_id(before):
+            clauses.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata "
+                f"FROM checkpoints {where} ORDER BY checkpoint_id DESC",
+                params
+            ).fetchall()
+        for thread_id, checkpoint_ns, *row in rows:
+            checkpoint_tuple = self._to_tuple(thread_id, checkpoint_ns, row, [])
+            if filter and not all(checkpoint_tuple.metadata.get(key) == value for key, value in filter.items()):
+                continue
+            if limit is not None:
+                if limit <= 0:
+                    break
+                limit -= 1
+            with self._lock:
+                writes = self._pending_writes(thread_id, checkpoint_ns, row[0])
+            yield checkpoint_tuple._replace(pending_writes=writes)
+
+    def _pending_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> List[Tuple[str, str, Any]]:
+        rows = self._db.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id)
+        ).fetchall()
+        return [(task_id, channel, self.serde.loads_typed((kind, value))) for task_id, channel, kind, value in rows]
+
+    def _to_tuple(self, thread_id: str, checkpoint_ns: str, row: Sequence[Any], writes: List[Tuple[str, str, Any]]) -> CheckpointTuple:
+        checkpoint_id, parent_id, kind, checkpoint, metadata_kind, metadata = row
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint=self.serde.loads_typed((kind, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_kind, metadata)),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}}
+                if parent_id else None
+            ),
+            pending_writes=writes,
+        )
+
+    # ----------------------------------------------------------------- writes
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        kind, blob = self.serde.dumps_typed(checkpoint)
+        metadata_kind, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO threads (thread_id, created_at, last_used_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET last_used_at = excluded.last_used_at",
+                (thread_id, now, now)
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 kind, blob, metadata_kind, metadata_blob)
+            )
+            self._prune(thread_id, checkpoint_ns)
+            if now - self._last_eviction >= EVICTION_INTERVAL_SECONDS:
+                self._last_eviction = now
+                self._evict(now)
+            self._db.commit()
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = ""
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            kind, blob = self.serde.dumps_typed(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+                         channel, kind, blob, task_path))
+        # Special writes (errors, interrupts) replace earlier ones; regular writes are only recorded once
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "INSERT OR IGNORE"
+        with self._lock:
+            self._db.executemany(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._delete_threads([thread_id])
+            self._db.commit()
+
+    def _prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        stale = [row[0] for row in self._db.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.max_checkpoints)
+        )]
+        if not stale:
+            return
+        marks = ",".join("?" * len(stale))
+        for table in ("checkpoints", "writes"):
+            self._db.execute(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id IN ({marks})",
+                (thread_id, checkpoint_ns, *stale)
+            )
+        self.pruned_checkpoints += len(stale)
+
+    def _evict(self, now: float) -> None:
+        """Drop idle threads, then the least recently used ones beyond the thread cap"""
+        expired = [row[0] for row in self._db.execute(
+            "SELECT thread_id FROM threads WHERE last_used_at < ?", (now - self.idle_ttl,)
+        )]
+        surplus = [row[0] for row in self._db.execute(
+            "SELECT thread_id FROM threads WHERE last_used_at >= ? ORDER BY last_used_at DESC LIMIT -1 OFFSET ?",
+            (now - self.idle_ttl, self.max_threads)
+        )]
+        if expired or surplus:
+            self._delete_threads(expired + surplus)
+            logger.info(f"Evicted {len(expired)} idle and {len(surplus)} least recently used conversation threads")
+
+    def _delete_threads(self, thread_ids: List[str]) -> None:
+        for start in range(0, len(thread_ids), 500):
+            batch = thread_ids[start:start + 500]
+            marks = ",".join("?" * len(batch))
+            for table in ("threads", "checkpoints", "writes"):
+                self._db.execute(f"DELETE FROM {table} WHERE thread_id IN ({marks})", batch)
+        self.evicted_threads += len(thread_ids)
+
+    # ------------------------------------------------------------------ async
+    # SQLite calls (and the pruning and eviction they trigger) run in a worker thread, off the event loop
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None
+    ) -> AsyncIterator[CheckpointTuple]:
+        checkpoint_tuples = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint_tuple in checkpoint_tuples:
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = ""
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def count_reuse(self, kind: str) -> None:
+        with self._lock:
+            self.reused[kind] = self.reused.get(kind, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            threads = self._db.execute("SELECT COUNT(*) FROM threads").fetchone()[0]
+            checkpoints = self._db.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+        return {
+            "threads": threads,
+            "checkpoints": checkpoints,
+            "max_threads": self.max_threads,
+            "max_checkpoints_per_thread": self.max_checkpoints,
+            "evicted_threads": self.evicted_threads,
+            "pruned_checkpoints": self.pruned_checkpoints,
+            "reused": dict(self.reused),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+_checkpoint_saver: Optional[SQLiteCheckpointSaver] = None
+
+
+def get_checkpoint_saver() -> SQLiteCheckpointSaver:
+    """Get the process-wide conversation checkpointer"""
+    global _checkpoint_saver
+    if _checkpoint_saver is None:
+        _checkpoint_saver = SQLiteCheckpointSaver()
+    return _checkpoint_saver
+
+
+def close_checkpoint_saver() -> None:
+    global _checkpoint_saver
+    if _checkpoint_saver is not None:
+        _checkpoint_saver.close()
+        _checkpoint_saver = None
@@ -0,0 +1,154 @@
+"""
+Persistent document catalog
+One SQLite row per uploaded document, written at upload time, so listing
+documents never has to scan the vector index
+"""
+
+import os
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_CATALOG_PATH = os.getenv("DOCUMENT_CATALOG_PATH", "data/documents.sqlite")
+
+COLUMNS = (
+    "document_id", "filename", "status", "chunk_count", "byte_size", "page_count",
+    "embedding_model", "content_hash", "created_at", "updated_at"
+)
+
+
+class DocumentCatalog:
+    """SQLite-backed manifest of uploaded documents"""
+
+    def __init__(self, path: str = DOCUMENT_CATALOG_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "document_id TEXT PRIMARY KEY, filename TEXT, status TEXT NOT NULL, "
+            "chunk_count INTEGER NOT NULL DEFAULT 0, byte_size INTEGER, page_count INTEGER, "
+            "embedding_model TEXT, content_hash TEXT, created_at TEXT NOT NULL, updated_at TEXT NOT NULL)"
+        )
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(documents)")}
+        if "content_hash" not in columns:  # Catalogs created before duplicate detection
+            self._db.execute("ALTER TABLE documents ADD COLUMN content_hash TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_documents_created ON documents(created_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents(content_hash)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS catalog_meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+
+    def register(self, document_id: str, **fields) -> Dict[str, Any]:
+        """Insert a document, or update the given fields if it is already catalogued"""
+        now = datetime.now().isoformat()
+        record = {key: value for key, value in fields.items() if key in COLUMNS}
+        record.setdefault("status", "ingesting")
+        with self._lock:
+            existing = self._db.execute(
+                "SELECT created_at FROM documents WHERE document_id = ?", (document_id,)
+            ).fetchone()
+            record["document_id"] = document_id
+            record["created_at"] = fields.get("created_at") or (existing["created_at"] if existing else now)
+            record["updated_at"] = now
+            columns = ", ".join(record)
+            placeholders = ", ".join("?" * len(record))
+            updates = ", ".join(f"{column} = excluded.{column}" for column in record if column != "document_id")
+            self._db.execute(
+                f"INSERT INTO documents ({columns}) VALUES ({placeholders}) "
+                f"ON CONFLICT(document_id) DO UPDATE SET {updates}",
+                list(record.values())
+            )
+            self._db.commit()
+        return self.get(document_id)
+
+    def update(self, document_id: str, **fields) -> None:
+        record = {key: value for key, value in fields.items() if key in COLUMNS and key != "document_id"}
+        record["updated_at"] = datetime.now().isoformat()
+        assignments = ", ".join(f"{column} = ?" for column in record)
+        with self._lock:
+            self._db.execute(
+                f"UPDATE documents SET {assignments} WHERE document_id = ?", [*record.values(), document_id]
+            )
+            self._db.commit()
+
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM documents WHERE document_id = ?", (document_id,)).fetchone()
+        return dict(row) if row else None
+
+    def find_by_hash(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Most recent queued, ingesting or ready document with this content hash"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM documents WHERE content_hash = ? AND status IN ('queued', 'ingesting', 'ready') "
+                "ORDER BY created_at DESC LIMIT 1",
+                (content_hash,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def list(
+        self,
+        limit: int = 100,
+        offset: int = 0,
+        query: Optional[str] = None,
+        status: Optional[str] = None,
+        embedding_model: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Page through documents, newest first
+
+        ``query`` matches a substring of the document ID or filename.
+        Returns the page and the total number of matching documents.
+        """
+        clauses, params = [], []
+        if query:
+            clauses.append("(document_id LIKE ? OR filename LIKE ?)")
+            params += [f"%{query}%", f"%{query}%"]
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if embedding_model:
+            clauses.append("embedding_model = ?")
+            params.append(embedding_model)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            total = self._db.execute(f"SELECT COUNT(*) FROM documents {where}", params).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT * FROM documents {where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                [*params, limit, offset]
+            ).fetchall()
+        return [dict(row) for row in rows], total
+
+    def delete(self, document_id: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM documents WHERE document_id = ?", (document_id,))
+            self._db.commit()
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM catalog_meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES (?, ?)", (key, value))
+            self._db.commit()
+
+
+_catalog: Optional[DocumentCatalog] = None
+
+
+def get_document_catalog() -> DocumentCatalog:
+    """Get the process-wide document catalog"""
+    global _catalog
+    if _catalog is None:
+        _catalog = DocumentCatalog()
+        logger.info(f"Document catalog at {DOCUMENT_CATALOG_PATH}")
+    return _catalog
@@ -0,0 +1,146 @@
+"""
+Content-addressed embedding cache
+In-memory LRU tier with an optional SQLite tier that survives restarts
+"""
+
+import os
+import hashlib
+import logging
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH")  # e.g. cache/embeddings.sqlite; unset keeps memory only
+EMBEDDING_CACHE_DISK_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_DISK_MAX_ENTRIES", "500000"))
+
+
+def normalize_text(text: str, task_type: str) -> str:
+    """Collapse whitespace; queries are also case-folded since casing rarely changes intent"""
+    normalized = " ".join(text.split())
+    if task_type == "retrieval_query":
+        normalized = normalized.casefold()
+    return normalized
+
+
+class EmbeddingCache:
+    """
+    Embedding cache keyed by (normalized text, embedding model, task_type)
+
+    Lookups hit the in-memory LRU first, then the SQLite tier if configured;
+    disk hits are promoted into memory. Methods block on SQLite, so async
+    callers run them with ``asyncio.to_thread``.
+    """
+
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE, path: Optional[str] = None,
+                 disk_max_entries: int = EMBEDDING_CACHE_DISK_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.disk_max_entries = disk_max_entries
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, embedding BLOB NOT NULL)")
+            self._db.commit()
+            logger.info(f"Embedding cache disk tier at {path}")
+
+    @staticmethod
+    def make_key(text: str, model: str, task_type: str) -> str:
+        payload = "\x1f".join((model, task_type, normalize_text(text, task_type)))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """Return cached embeddings for the keys that are present"""
+        keys = list(keys)
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                embedding = self._memory.get(key)
+                if embedding is None:
+                    missing.append(key)
+                    continue
+                self._memory.move_to_end(key)
+                found[key] = embedding
+            self.memory_hits += len(found)
+
+            if missing and self._db is not None:
+                placeholders = ",".join("?" * len(missing))
+                rows = self._db.execute(
+                    f"SELECT key, embedding FROM embeddings WHERE key IN ({placeholders})", missing
+                ).fetchall()
+                for key, blob in rows:
+                    embedding = array("f", blob).tolist()
+                    found[key] = embedding
+                    self._remember(key, embedding)
+                self.disk_hits += len(rows)
+
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put(self, key: str, embedding: List[float]) -> None:
+        self.put_many([(key, embedding)])
+
+    def put_many(self, items: Iterable[Tuple[str, List[float]]]) -> None:
+        items = list(items)
+        with self._lock:
+            for key, embedding in items:
+                self._remember(key, embedding)
+            if self._db is not None and items:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, embedding) VALUES (?, ?)",
+                    [(key, array("f", embedding).tobytes()) for key, embedding in items]
+                )
+                # Drop the oldest rows once the disk tier outgrows its cap
+                self._db.execute(
+                    "DELETE FROM embeddings WHERE rowid <= "
+                    "(SELECT MAX(rowid) FROM embeddings) - ?", (self.disk_max_entries,)
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, embedding: List[float]) -> None:
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "disk_enabled": self._db is not None,
+            }
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Get the process-wide embedding cache"""
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache(path=EMBEDDING_CACHE_PATH)
+    return _embedding_cache
@@ -0,0 +1,284 @@
+"""
+Background document ingestion
+Uploads are queued as jobs and processed by a small pool of workers, so the
+upload request returns at once and ingestion never crowds out queries (its
+embedding calls also run at background priority in the rate controller).
+Each job's checkpoint - the number of leading chunks already upserted - is
+persisted in SQLite, so jobs interrupted by a restart resume where they left off.
+A failed job keeps its upload until it is retried to success or abandoned.
+"""
+
+import os
+import asyncio
+import logging
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from jobs import get_job_store
+from document_catalog import get_document_catalog
+
+logger = logging.getLogger(__name__)
+
+INGEST_MAX_CONCURRENCY = int(os.getenv("INGEST_MAX_CONCURRENCY", "2"))
+INGEST_QUEUE_PATH = os.getenv("INGEST_QUEUE_PATH", "data/ingest_jobs.sqlite")
+
+
+def new_document_id(filename: str) -> str:
+    """Document ID for an upload: file stem, timestamp and a random suffix"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    base_name = os.path.basename(filename).replace('.pdf', '')
+    return f"{base_name}_{timestamp}_{str(uuid.uuid4())[:8]}"
+
+
+class IngestQueue:
+    """
+    Durable queue of document ingest jobs
+
+    ``get_agent`` is awaited by workers to obtain the DocumentAgent, so jobs
+    submitted while agents are still warming up simply wait for them.
+    """
+
+    def __init__(
+        self,
+        get_agent: Callable[[], Awaitable[Any]],
+        path: str = INGEST_QUEUE_PATH,
+        max_concurrency: int = INGEST_MAX_CONCURRENCY
+    ):
+        self.get_agent = get_agent
+        self.max_concurrency = max(1, max_concurrency)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS ingest_jobs ("
+            "job_id TEXT PRIMARY KEY, document_id TEXT NOT NULL, file_path TEXT NOT NULL, filename TEXT, "
+            "status TEXT NOT NULL, checkpoint INTEGER NOT NULL DEFAULT 0, error TEXT, "
+            "created_at TEXT NOT NULL, updated_at TEXT NOT NULL)"
+        )
+        self._db.commit()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._done: Dict[str, asyncio.Future] = {}
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+            self._db.commit()
+        return rows
+
+    def _set_row(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = datetime.now().isoformat()
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        self._execute(f"UPDATE ingest_jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+    async def start(self) -> None:
+        """Start the workers and requeue jobs left unfinished by a previous process"""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        for row in self._execute(
+            "SELECT * FROM ingest_jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+        ):
+            logger.info(f"Resuming ingest job {row['job_id']} from chunk {row['checkpoint']}")
+            self._track(dict(row))
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrency)]
+
+    def _track(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        job_store = get_job_store()
+        job = job_store.create(
+            "ingest_document",
+            job_id=row["job_id"],
+            document_id=row["document_id"],
+            filename=row["filename"]
+        )
+        job_store.set_progress(row["job_id"], checkpoint=row["checkpoint"])
+        self._done[row["job_id"]] = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(row)
+        return job
+
+    def submit(
+        self,
+        file_path: str,
+        document_id: str,
+        filename: Optional[str] = None,
+        content_hash: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Queue ``file_path`` for ingestion as ``document_id``; returns the job record
+
+        The document is catalogued as "queued" right away, so a second upload of
+        the same content is recognised as a duplicate while this one is pending.
+        """
+        if self._queue is None:
+            raise RuntimeError("Ingest queue is not running")
+        get_document_catalog().register(
+            document_id,
+            filename=filename or os.path.basename(file_path),
+            status="queued",
+            byte_size=os.path.getsize(file_path),
+            content_hash=content_hash
+        )
+        now = datetime.now().isoformat()
+        row = {
+            "job_id": str(uuid.uuid4()),
+            "document_id": document_id,
+            "file_path": file_path,
+            "filename": filename or os.path.basename(file_path),
+            "status": "queued",
+            "checkpoint": 0,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        self._execute(
+            f"INSERT OR REPLACE INTO ingest_jobs ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+            tuple(row.values())
+        )
+        return self._track(row)
+
+    async def wait(self, job_id: str) -> Dict[str, Any]:
+        """Wait for a job submitted by this process and return its final record"""
+        future = self._done.get(job_id)
+        if future is not None:
+            await asyncio.shield(future)
+        return get_job_store().get(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            row = await self._queue.get()
+            try:
+                await self._ingest(row)
+            except Exception as e:
+                logger.error(f"Ingest job {row['job_id']} crashed: {e}")
+                # Leave it retryable rather than "running", which every restart would re-run
+                error = f"Ingest crashed: {e}"
+                try:
+                    self._set_row(row["job_id"], status="failed", error=error)
+                except Exception as db_error:
+                    logger.error(f"Could not mark ingest job {row['job_id']} failed: {db_error}")
+                get_job_store().update(row["job_id"], status="failed", error=error)
+            finally:
+                future = self._done.pop(row["job_id"], None)
+                if future is not None and not future.done():
+                    future.set_result(None)
+
+    async def _ingest(self, row: Dict[str, Any]) -> None:
+        job_id = row["job_id"]
+        job_store = get_job_store()
+        if not os.path.exists(row["file_path"]):
+            error = "Uploaded file is no longer available"
+            self._set_row(job_id, status="failed", error=error)
+            job_store.update(job_id, status="failed", error=error)
+            return
+
+        self._set_row(job_id, status="running")
+        job_store.update(job_id, status="running")
+        checkpoint = row["checkpoint"]
+
+        def progress(**fields):
+            nonlocal checkpoint
+            job_store.set_progress(job_id, **fields)
+            if fields.get("checkpoint", checkpoint) > checkpoint:
+                checkpoint = fields["checkpoint"]
+                self._set_row(job_id, checkpoint=checkpoint)
+
+        try:
+            agent = await self.get_agent()
+            result = await agent.upload_document(
+                file_path=row["file_path"],
+                document_id=row["document_id"],
+                filename=row["filename"],
+                progress=progress,
+                start_chunk=row["checkpoint"]
+            )
+        except asyncio.CancelledError:
+            raise  # Shutting down: leave the row "running" so the next process resumes it
+        except Exception as e:
+            result = {"success": False, "error": str(e), "document_id": row["document_id"]}
+
+        error = result.get("error")
+        failed_chunks = (result.get("upload_results") or {}).get("failed_chunks", 0)
+        if result.get("success") and failed_chunks:
+            error = f"{failed_chunks} chunks failed to embed; retry the job to resume from chunk {checkpoint}"
+        status = "failed" if error else "succeeded"
+        self._set_row(job_id, status=status, error=error)
+        job_store.update(job_id, status=status, result=result, error=error)
+        if status == "succeeded":
+            Path(row["file_path"]).unlink(missing_ok=True)
+        logger.info(f"Ingest job {job_id} {status}")
+
+    def job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Job record for ``job_id`` from the durable queue
+
+        Serves jobs the in-memory job store no longer holds, such as failed
+        jobs from before a restart or jobs evicted since.
+        """
+        rows = self._execute("SELECT * FROM ingest_jobs WHERE job_id = ?", (job_id,))
+        if not rows:
+            return None
+        row = rows[0]
+        return {
+            "job_id": row["job_id"],
+            "kind": "ingest_document",
+            "status": row["status"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "progress": {"checkpoint": row["checkpoint"]},
+            "result": None,
+            "error": row["error"],
+            "document_id": row["document_id"],
+            "filename": row["filename"],
+        }
+
+    def _failed_row(self, job_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._execute("SELECT * FROM ingest_jobs WHERE job_id = ? AND status = 'failed'", (job_id,))
+        return dict(rows[0]) if rows else None
+
+    def retry(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Requeue a failed job from its checkpoint; None if there is no failed job with that ID"""
+        if self._queue is None:
+            raise RuntimeError("Ingest queue is not running")
+        row = self._failed_row(job_id)
+        if row is None:
+            return None
+        row.update(status="queued", error=None)
+        self._set_row(job_id, status="queued", error=None)
+        logger.info(f"Retrying ingest job {job_id} from chunk {row['checkpoint']}")
+        return self._track(row)
+
+    def abandon(self, job_id: str) -> bool:
+        """Give up on a failed job and delete its upload; False if there is no failed job with that ID"""
+        row = self._failed_row(job_id)
+        if row is None:
+            return False
+        self._set_row(job_id, status="abandoned")
+        get_job_store().update(job_id, status="abandoned")
+        Path(row["file_path"]).unlink(missing_ok=True)
+        logger.info(f"Ingest job {job_id} abandoned")
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {row["status"]: row["count"] for row in self._execute(
+            "SELECT status, COUNT(*) AS count FROM ingest_jobs GROUP BY status"
+        )}
+        return {
+            "max_concurrency": self.max_concurrency,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "jobs_by_status": counts,
+        }
+
+    async def close(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        with self._lock:
+            self._db.close()
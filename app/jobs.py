@@ -0,0 +1,95 @@
+"""
+Background job tracking for long-running operations
+Handlers start work with ``JobStore.run`` and return the job ID; clients poll
+``GET /jobs/{job_id}`` for status, progress and the final result
+"""
+
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_RETAINED_JOBS = 1000
+
+
+class JobStore:
+    """In-memory registry of recent jobs, oldest evicted first"""
+
+    def __init__(self, max_jobs: int = MAX_RETAINED_JOBS):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def create(self, kind: str, job_id: Optional[str] = None, **details) -> Dict[str, Any]:
+        now = datetime.now().isoformat()
+        job = {
+            "job_id": job_id or str(uuid.uuid4()),
+            "kind": kind,
+            "status": "queued",
+            "created_at": now,
+            "updated_at": now,
+            "progress": {},
+            "result": None,
+            "error": None,
+            **details
+        }
+        self._jobs[job["job_id"]] = job
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._jobs.get(job_id)
+
+    def update(self, job_id: str, **fields) -> None:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.update(fields, updated_at=datetime.now().isoformat())
+
+    def set_progress(self, job_id: str, **progress) -> None:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job["progress"].update(progress)
+            job["updated_at"] = datetime.now().isoformat()
+
+    def run(self, job_id: str, work: Awaitable[Dict[str, Any]]) -> asyncio.Task:
+        """
+        Run ``work`` in the background and record its outcome on the job
+
+        A result dict with ``success: False`` marks the job failed.
+        """
+        async def runner():
+            self.update(job_id, status="running")
+            try:
+                result = await work
+                failed = isinstance(result, dict) and result.get("success") is False
+                self.update(
+                    job_id,
+                    status="failed" if failed else "succeeded",
+                    result=result,
+                    error=result.get("error") if failed else None
+                )
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {e}")
+                self.update(job_id, status="failed", error=str(e))
+            finally:
+                self._tasks.pop(job_id, None)
+
+        # Hold a reference so the task isn't garbage-collected mid-run
+        task = self._tasks[job_id] = asyncio.create_task(runner())
+        return task
+
+
+_job_store: Optional[JobStore] = None
+
+
+def get_job_store() -> JobStore:
+    """Get the process-wide job store"""
+    global _job_store
+    if _job_store is None:
+        _job_store = JobStore()
+    return _job_store
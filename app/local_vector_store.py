@@ -0,0 +1,418 @@
+"""
+Local embedded vector index - drop-in for Pinecone on a single node
+Vectors live in a memory-mapped float32 matrix searched with exact cosine
+similarity via batched matrix multiplies; an optional IVF (inverted file)
+index narrows the search for large corpora. IVF centroids are trained in a
+background thread and saved next to the matrix; searches stay exact until
+they are ready. Ids and metadata are kept in a SQLite sidecar.
+"""
+
+import os
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from vector_store import VectorStore, Match, QueryResult, FetchResult
+
+logger = logging.getLogger(__name__)
+
+LOCAL_VECTOR_STORE_PATH = os.getenv("LOCAL_VECTOR_STORE_PATH", "data/vector_index")
+LOCAL_VECTOR_DIMENSION = int(os.getenv("LOCAL_VECTOR_DIMENSION", "768"))
+LOCAL_VECTOR_INDEX = os.getenv("LOCAL_VECTOR_INDEX", "flat").lower()  # "flat" or "ivf"
+LOCAL_IVF_MIN_VECTORS = int(os.getenv("LOCAL_IVF_MIN_VECTORS", "50000"))  # Below this, search stays exact
+LOCAL_IVF_NPROBE = int(os.getenv("LOCAL_IVF_NPROBE", "16"))
+
+INITIAL_CAPACITY = 1024
+SEARCH_BLOCK_ROWS = 65536
+IVF_TRAINING_SAMPLE = 50000
+IVF_TRAINING_ITERATIONS = 10
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class LocalVectorStore(VectorStore):
+    """
+    NumPy-backed vector index with Pinecone-compatible calls
+
+    Rows are L2-normalized on write, so a dot product is the cosine score and
+    returned ``values`` are the normalized vectors. Deleted rows are reused by
+    later upserts.
+    """
+
+    def __init__(self, path: str = LOCAL_VECTOR_STORE_PATH, dimension: int = LOCAL_VECTOR_DIMENSION,
+                 index_type: str = LOCAL_VECTOR_INDEX, nprobe: int = LOCAL_IVF_NPROBE,
+                 ivf_min_vectors: int = LOCAL_IVF_MIN_VECTORS):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.dimension = dimension
+        self.index_type = index_type
+        self.nprobe = nprobe
+        self.ivf_min_vectors = ivf_min_vectors
+        self._lock = threading.RLock()
+        self._matrix_path = self.path / "vectors.f32"
+        self._ivf_path = self.path / "ivf.npz"
+        self._ivf_thread: Optional[threading.Thread] = None
+        self._ivf_dirty: Optional[set] = None  # Rows written while IVF lists are being built
+
+        self._db = sqlite3.connect(self.path / "metadata.sqlite", check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            "row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, document_id TEXT, metadata TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_vectors_document ON vectors(document_id)")
+        self._db.commit()
+
+        self._load()
+        with self._lock:
+            self._maybe_build_ivf()
+
+    # ------------------------------------------------------------------ storage
+
+    def _load(self) -> None:
+        rows = self._db.execute("SELECT row, id, document_id FROM vectors").fetchall()
+        size = max((row for row, _, _ in rows), default=-1) + 1
+        existing = self._matrix_path.stat().st_size // (4 * self.dimension) if self._matrix_path.exists() else 0
+        self._open_matrix(max(INITIAL_CAPACITY, existing, size))
+
+        self._size = size
+        self._ids: List[Optional[str]] = [None] * size
+        self._row_of: Dict[str, int] = {}
+        self._alive = np.zeros(self._capacity, dtype=bool)
+        self._doc_codes = np.full(self._capacity, -1, dtype=np.int32)
+        self._doc_code_of: Dict[str, int] = {}
+        for row, vector_id, document_id in rows:
+            self._ids[row] = vector_id
+            self._row_of[vector_id] = row
+            self._alive[row] = True
+            self._doc_codes[row] = self._doc_code(document_id)
+        self._free_rows = [row for row in range(size) if not self._alive[row]]
+
+        self._centroids: Optional[np.ndarray] = None
+        self._list_of_row = np.full(self._capacity, -1, dtype=np.int32)
+        self._ivf_trained_count = 0
+        self._saved_centroids: Optional[np.ndarray] = None
+        if self.index_type == "ivf" and self._ivf_path.exists():
+            with np.load(self._ivf_path) as saved:
+                if saved["centroids"].shape[1] == self.dimension:
+                    self._saved_centroids = saved["centroids"]
+                    self._ivf_trained_count = int(saved["trained_count"])
+        logger.info(f"Local vector store at {self.path} loaded with {len(rows)} vectors")
+
+    def _open_matrix(self, capacity: int) -> None:
+        mode = "r+" if self._matrix_path.exists() else "w+"
+        if mode == "r+" and self._matrix_path.stat().st_size < capacity * 4 * self.dimension:
+            with open(self._matrix_path, "r+b") as f:
+                f.truncate(capacity * 4 * self.dimension)
+        self._matrix = np.memmap(self._matrix_path, dtype=np.float32, mode=mode, shape=(capacity, self.dimension))
+        self._capacity = capacity
+
+    def _grow(self, needed: int) -> None:
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        if capacity == self._capacity:
+            return
+        self._matrix.flush()
+        del self._matrix
+        old_capacity = self._capacity
+        self._open_matrix(capacity)
+        extra = capacity - old_capacity
+        self._alive = np.concatenate([self._alive, np.zeros(extra, dtype=bool)])
+        self._doc_codes = np.concatenate([self._doc_codes, np.full(extra, -1, dtype=np.int32)])
+        self._list_of_row = np.concatenate([self._list_of_row, np.full(extra, -1, dtype=np.int32)])
+
+    def _doc_code(self, document_id: Optional[str]) -> int:
+        if document_id is None:
+            return -1
+        code = self._doc_code_of.get(document_id)
+        if code is None:
+            code = self._doc_code_of[document_id] = len(self._doc_code_of)
+        return code
+
+    # ------------------------------------------------------------------ filters
+
+    def _filter_mask(self, filter: Optional[Dict[str, Any]]) -> np.ndarray:
+        mask = self._alive[:self._size].copy()
+        if not filter:
+            return mask
+        for key, condition in filter.items():
+            if key != "document_id":
+                raise ValueError(f"Local vector store only filters on document_id, got '{key}'")
+            if isinstance(condition, dict):
+                if "$in" in condition:
+                    values = condition["$in"]
+                elif "$eq" in condition:
+                    values = [condition["$eq"]]
+                else:
+                    raise ValueError(f"Unsupported filter operator: {list(condition)}")
+            else:
+                values = [condition]
+            codes = [self._doc_code_of[value] for value in values if value in self._doc_code_of]
+            mask &= np.isin(self._doc_codes[:self._size], codes)
+        return mask
+
+    # ------------------------------------------------------------------ search
+
+    def _search_masks(self, queries: np.ndarray, filter: Optional[Dict[str, Any]]) -> List[np.ndarray]:
+        """Row masks to search for each query: filter, plus the probed IVF lists when trained"""
+        mask = self._filter_mask(filter)
+        # A selective document filter leaves few enough rows to scan exactly
+        if self._centroids is None or (filter and mask.sum() < self.ivf_min_vectors):
+            return [mask] * len(queries)
+        return [mask & self._probe_mask(query) for query in queries]
+
+    @staticmethod
+    def _search_rows(matrix: np.ndarray, queries: np.ndarray, top_k: int,
+                     mask: np.ndarray) -> List[List[Tuple[int, float]]]:
+        """Top-k (row, score) per query over the rows selected by ``mask``, scanned in blocks"""
+        rows = np.flatnonzero(mask)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(rows), SEARCH_BLOCK_ROWS):
+            block_rows = rows[start:start + SEARCH_BLOCK_ROWS]
+            scores = queries @ matrix[block_rows].T
+            best_rows = np.concatenate([best_rows, np.broadcast_to(block_rows, scores.shape)], axis=1)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            if best_scores.shape[1] > top_k:
+                keep = np.argpartition(-best_scores, top_k - 1, axis=1)[:, :top_k]
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        return [list(zip(r.tolist(), s.tolist())) for r, s in zip(best_rows, best_scores)]
+
+    def _search(self, queries: np.ndarray, top_k: int,
+                filter: Optional[Dict[str, Any]]) -> List[List[Tuple[int, float]]]:
+        """
+        Top-k (row, score) for each query
+
+        Only mask construction holds the lock; the matrix multiplies run
+        outside it so concurrent queries overlap (NumPy releases the GIL).
+        """
+        queries = _normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        with self._lock:
+            masks = self._search_masks(queries, filter)
+            matrix = self._matrix
+        if all(mask is masks[0] for mask in masks):
+            return self._search_rows(matrix, queries, top_k, masks[0])
+        return [self._search_rows(matrix, query[None, :], top_k, mask)[0] for query, mask in zip(queries, masks)]
+
+    def _probe_mask(self, query: np.ndarray) -> np.ndarray:
+        probes = np.argsort(-(self._centroids @ query))[:self.nprobe]
+        lists = self._list_of_row[:self._size]
+        return np.isin(lists, probes) | (lists < 0)
+
+    def _maybe_build_ivf(self) -> None:
+        """
+        Start building IVF lists in the background, called with the lock held
+
+        Lists are built once the corpus is large enough, retrained when it has
+        doubled since training, and rebuilt on open from the saved centroids.
+        """
+        if self.index_type != "ivf" or (self._ivf_thread is not None and self._ivf_thread.is_alive()):
+            return
+        alive_count = int(self._alive.sum())
+        if alive_count < self.ivf_min_vectors:
+            return
+        grown = alive_count >= 2 * self._ivf_trained_count
+        if self._centroids is not None and not grown:
+            return
+        # Saved centroids are reused unless the corpus has outgrown them
+        centroids = self._saved_centroids if self._centroids is None and not grown else None
+        self._ivf_dirty = set()
+        self._ivf_thread = threading.Thread(
+            target=self._build_ivf, args=(self._matrix, self._size, self._alive[:self._size].copy(), centroids),
+            name="ivf-build", daemon=True
+        )
+        self._ivf_thread.start()
+
+    def _build_ivf(self, matrix: np.ndarray, size: int, alive: np.ndarray, centroids: Optional[np.ndarray]) -> None:
+        """Train centroids (unless given) and assign rows to lists without holding the lock"""
+        try:
+            alive_count = int(alive.sum())
+            trained = centroids is None
+            if trained:
+                rng = np.random.default_rng(0)
+                rows = np.flatnonzero(alive)
+                sample_rows = np.sort(rng.choice(rows, min(len(rows), IVF_TRAINING_SAMPLE), replace=False))
+                sample = np.asarray(matrix[sample_rows])
+                nlist = max(1, int(np.sqrt(alive_count)))
+                centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+                # Spherical k-means: assign by cosine, recentre on the normalized mean
+                for _ in range(IVF_TRAINING_ITERATIONS):
+                    assignment = np.argmax(sample @ centroids.T, axis=1)
+                    sums = np.zeros_like(centroids)
+                    np.add.at(sums, assignment, sample)
+                    populated = np.bincount(assignment, minlength=nlist) > 0
+                    centroids[populated] = _normalize(sums[populated])
+            lists = np.empty(size, dtype=np.int32)
+            for start in range(0, size, SEARCH_BLOCK_ROWS):
+                block = np.asarray(matrix[start:min(start + SEARCH_BLOCK_ROWS, size)])
+                lists[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+
+            with self._lock:
+                # Rows upserted meanwhile (including rows past ``size``) are assigned with the new centroids
+                list_of_row = np.full(self._capacity, -1, dtype=np.int32)
+                list_of_row[:size] = lists
+                dirty = np.fromiter(self._ivf_dirty, dtype=np.int64, count=len(self._ivf_dirty))
+                if len(dirty):
+                    list_of_row[dirty] = np.argmax(np.asarray(self._matrix[dirty]) @ centroids.T, axis=1)
+                self._centroids, self._list_of_row, self._ivf_dirty = centroids, list_of_row, None
+                if trained:
+                    self._ivf_trained_count = alive_count
+                    self._saved_centroids = centroids
+            if trained:
+                with open(self._ivf_path.with_suffix(".tmp"), "wb") as f:
+                    np.savez(f, centroids=centroids, trained_count=alive_count)
+                os.replace(self._ivf_path.with_suffix(".tmp"), self._ivf_path)
+            logger.info(
+                f"{'Trained' if trained else 'Loaded'} IVF index with {len(centroids)} lists over {alive_count} vectors"
+            )
+        except Exception as e:
+            logger.warning(f"Building the IVF index failed, search stays exact: {e}")
+            with self._lock:
+                self._ivf_dirty = None
+
+    # ------------------------------------------------------------------ Pinecone-compatible API
+
+    def query(self, vector: List[float], top_k: int = 10, include_metadata: bool = True,
+              include_values: bool = False, filter: Optional[Dict[str, Any]] = None) -> QueryResult:
+        hits = self._search(np.asarray(vector, dtype=np.float32), top_k, filter)[0]
+        with self._lock:
+            return QueryResult(matches=self._matches(hits, include_metadata, include_values))
+
+    def query_many(self, vectors: List[List[float]], top_k: int = 10, include_metadata: bool = True,
+                   include_values: bool = False, filter: Optional[Dict[str, Any]] = None) -> List[QueryResult]:
+        """Several queries sharing one filter, scored together as a single matrix product"""
+        if not len(vectors):
+            return []
+        hits_per_query = self._search(np.asarray(vectors, dtype=np.float32), top_k, filter)
+        with self._lock:
+            return [QueryResult(matches=self._matches(hits, include_metadata, include_values)) for hits in hits_per_query]
+
+    def _matches(self, hits: List[Tuple[int, float]], include_metadata: bool, include_values: bool) -> List[Match]:
+        # Rows deleted while the search ran outside the lock are dropped
+        hits = [(row, score) for row, score in hits if self._ids[row] is not None]
+        metadata_by_row = {}
+        if include_metadata and hits:
+            placeholders = ",".join("?" * len(hits))
+            metadata_by_row = {
+                row: json.loads(metadata) for row, metadata in self._db.execute(
+                    f"SELECT row, metadata FROM vectors WHERE row IN ({placeholders})", [row for row, _ in hits]
+                )
+            }
+        return [
+            Match(
+                id=self._ids[row],
+                score=float(score),
+                metadata=metadata_by_row.get(row, {}),
+                values=self._matrix[row].tolist() if include_values else []
+            )
+            for row, score in hits
+        ]
+
+    def upsert(self, vectors: List[Dict[str, Any]]) -> Dict[str, int]:
+        if not vectors:
+            return {"upserted_count": 0}
+        values = _normalize(np.asarray([vector["values"] for vector in vectors], dtype=np.float32))
+        if values.shape[1] != self.dimension:
+            raise ValueError(f"Vector dimension {values.shape[1]} does not match index dimension {self.dimension}")
+
+        with self._lock:
+            records = []
+            for vector, row_values in zip(vectors, values):
+                vector_id = vector["id"]
+                metadata = vector.get("metadata") or {}
+                row = self._row_of.get(vector_id)
+                if row is None:
+                    if self._free_rows:
+                        row = self._free_rows.pop()
+                    else:
+                        row = self._size
+                        self._grow(row + 1)
+                        self._size += 1
+                        self._ids.append(None)
+                    self._row_of[vector_id] = row
+                    self._ids[row] = vector_id
+                self._matrix[row] = row_values
+                self._alive[row] = True
+                self._doc_codes[row] = self._doc_code(metadata.get("document_id"))
+                if self._centroids is not None:
+                    self._list_of_row[row] = int(np.argmax(self._centroids @ row_values))
+                if self._ivf_dirty is not None:
+                    self._ivf_dirty.add(row)
+                records.append((row, vector_id, metadata.get("document_id"), json.dumps(metadata)))
+
+            self._matrix.flush()
+            self._db.executemany(
+                "INSERT OR REPLACE INTO vectors (row, id, document_id, metadata) VALUES (?, ?, ?, ?)", records
+            )
+            self._db.commit()
+            self._maybe_build_ivf()
+        return {"upserted_count": len(vectors)}
+
+    def delete(self, ids: Optional[List[str]] = None, delete_all: bool = False,
+               filter: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        with self._lock:
+            if delete_all:
+                rows = np.flatnonzero(self._alive[:self._size]).tolist()
+            elif filter:
+                rows = np.flatnonzero(self._filter_mask(filter)).tolist()
+            else:
+                rows = [self._row_of[vector_id] for vector_id in ids or [] if vector_id in self._row_of]
+
+            for row in rows:
+                del self._row_of[self._ids[row]]
+                self._ids[row] = None
+                self._alive[row] = False
+                self._doc_codes[row] = -1
+                self._free_rows.append(row)
+            self._db.executemany("DELETE FROM vectors WHERE row = ?", [(row,) for row in rows])
+            self._db.commit()
+        return {}
+
+    def fetch(self, ids: List[str]) -> FetchResult:
+        with self._lock:
+            hits = [(self._row_of[vector_id], 1.0) for vector_id in ids if vector_id in self._row_of]
+            return FetchResult(vectors={match.id: match for match in self._matches(hits, True, True)})
+
+    def list(self, prefix: str = "", limit: int = 100) -> Iterator[List[str]]:
+        with self._lock:
+            ids = sorted(vector_id for vector_id in self._row_of if vector_id.startswith(prefix))
+        for start in range(0, len(ids), limit):
+            yield ids[start:start + limit]
+
+    def describe_index_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "dimension": self.dimension,
+                "total_vector_count": int(self._alive[:self._size].sum()),
+                "index_fullness": 0.0,
+                "namespaces": {},
+                "index_type": "ivf" if self._centroids is not None else "flat",
+                "ivf_building": self._ivf_thread is not None and self._ivf_thread.is_alive(),
+            }
+
+
+_local_store: Optional[LocalVectorStore] = None
+_local_store_lock = threading.Lock()
+
+
+def get_local_vector_store() -> LocalVectorStore:
+    """Get the process-wide local vector store"""
+    global _local_store
+    with _local_store_lock:
+        if _local_store is None:
+            _local_store = LocalVectorStore()
+    return _local_store
@@ -3,9 +3,12 @@ Simplified FastAPI application for Financial RAG System
 Single endpoint with document upload functionality
 """
 
+import os
+import json
+import asyncio
 import logging
-import shutil
-from typing import Dict, Any, List, Optional
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Literal, Optional
 from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
@@ -21,30 +24,56 @@ except EnvironmentError as e:
     logging.error(f"Configuration error: {e}")
     # Allow app to start but log the error
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Form, Request, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
-from pydantic import BaseModel
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
 import uvicorn
 
-# Remove this heavy import from startup
-# from orchestrator import process_financial_query
+# Heavy agent modules are imported by the registry at startup, off the event loop
+from registry import AgentRegistry
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Deletes of documents with more chunks than this run as background jobs by default
+DELETE_ASYNC_THRESHOLD = int(os.getenv("DELETE_ASYNC_THRESHOLD", "5000"))
+
+# Batch queries larger than this run as background jobs by default
+BATCH_QUERY_ASYNC_THRESHOLD = int(os.getenv("BATCH_QUERY_ASYNC_THRESHOLD", "100"))
+BATCH_QUERY_MAX_SIZE = int(os.getenv("BATCH_QUERY_MAX_SIZE", "5000"))
+
 # Create uploads directory
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build agents once per worker and release their resources on shutdown"""
+    registry = AgentRegistry()
+    app.state.registry = registry
+    await registry.start()
+    yield
+    await registry.close()
+
 # FastAPI app instance
 app = FastAPI(
     title="Financial RAG System",
     description="Simple system that routes between Financial and Document agents",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
+async def get_registry(request: Request) -> AgentRegistry:
+    """Dependency returning the worker's agent registry"""
+    registry = getattr(request.app.state, "registry", None)
+    if registry is None:
+        # Lifespan events don't run under every serverless adapter
+        registry = request.app.state.registry = AgentRegistry()
+        await registry.start()
+    return registry
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -58,12 +87,22 @@ app.add_middleware(
 class QueryRequest(BaseModel):
     question: str
     symbol: str = "AAPL"
+    symbols: Optional[List[str]] = None  # Several symbols → one portfolio comparison answer
     document_ids: Optional[List[str]] = None
+    top_k: int = Field(5, ge=1, le=20)  # Passages passed to generation on the RAG route
+    rerank: Optional[Literal["none", "lexical", "mmr"]] = None  # Over-fetch and rerank; defaults to RERANK_MODE
+    thread_id: Optional[str] = None  # Continue a conversation; follow-ups reuse its context and market data
+    start_thread: bool = False  # Open a conversation (returned as thread_id) when no thread_id is given
+
+class BatchQueryRequest(BaseModel):
+    queries: List[QueryRequest]
+    concurrency: Optional[int] = None  # Defaults to BATCH_QUERY_MAX_CONCURRENCY
 
 class QueryResponse(BaseModel):
     answer: str
     route_taken: str
     success: bool
+    thread_id: Optional[str] = None
 
 @app.get("/")
 async def root():
@@ -72,14 +111,21 @@ async def root():
         "message": "Financial RAG System",
         "endpoints": {
             "query": "POST /query",
+            "query_stream": "POST /query/stream",
+            "query_batch": "POST /query/batch",
             "upload": "POST /upload", 
             "documents": "GET /documents",
+            "delete_document": "DELETE /documents/{document_id}",
+            "jobs": "GET /jobs/{job_id}",
+            "conversation": "GET /conversations/{thread_id}",
+            "delete_conversation": "DELETE /conversations/{thread_id}",
+            "stats": "GET /stats",
             "health": "GET /health"
         }
     }
 
 @app.get("/health")
-async def health_check():
+async def health_check(registry: AgentRegistry = Depends(get_registry)):
     """Health check with environment validation"""
     try:
         from config import Config
@@ -87,7 +133,8 @@ async def health_check():
         return {
             "status": "healthy", 
             "timestamp": datetime.now().isoformat(),
-            "environment": "configured"
+            "environment": "configured",
+            "agents": registry.status()
         }
     except Exception as e:
         return {
@@ -104,32 +151,61 @@ async def config_check():
     return {
         "pinecone_api_key": "✓ Set" if os.getenv("PINECONE_API_KEY") else "✗ Missing",
         "gemini_api_key": "✓ Set" if os.getenv("GEMINI_API_KEY") else "✗ Missing",
+        "vector_store_backend": os.getenv("VECTOR_STORE_BACKEND", "pinecone"),
         "pinecone_index": os.getenv("PINECONE_INDEX_NAME", "Not set"),
         "gemini_model": os.getenv("GEMINI_MODEL_NAME", "Not set"),
     }
 
+@app.get("/stats")
+async def stats(registry: AgentRegistry = Depends(get_registry)):
+    """Runtime cache and throughput counters"""
+    from embedding_cache import get_embedding_cache
+    from rate_limiter import get_rate_controller
+    from market_data_cache import get_market_data_cache
+    from answer_cache import get_answer_cache
+    from sparse_index import get_sparse_index
+    from context_assembly import get_context_assembler
+    from rerank import get_reranker
+    from conversation_store import get_checkpoint_saver
+    return {
+        "answer_cache": get_answer_cache().stats(),
+        "context_assembly": get_context_assembler().stats(),
+        "conversations": get_checkpoint_saver().stats(),
+        "embedding_cache": get_embedding_cache().stats(),
+        "ingest_queue": registry.ingest_queue.stats(),
+        "market_data_cache": get_market_data_cache().stats(),
+        "rate_controller": get_rate_controller().stats(),
+        "rerank": get_reranker().stats(),
+        "sparse_index": get_sparse_index().stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
 @app.post("/query", response_model=QueryResponse)
-async def query(request: QueryRequest):
+async def query(request: QueryRequest, registry: AgentRegistry = Depends(get_registry)):
     """
     Main query endpoint - routes between Financial and Document agents
     """
     try:
         logger.info(f"Query: {request.question[:50]}... | Symbol: {request.symbol} | Documents: {request.document_ids}")
         
-        # Lazy import - only import when needed
-        from orchestrator import process_financial_query
-        
         # Route through orchestrator
-        result = await process_financial_query(
+        orchestrator = await registry.get_orchestrator()
+        result = await orchestrator.process_query(
             question=request.question,
             symbol=request.symbol,
-            document_ids=request.document_ids
+            document_ids=request.document_ids,
+            symbols=request.symbols,
+            top_k=request.top_k,
+            rerank=request.rerank,
+            thread_id=request.thread_id,
+            start_thread=request.start_thread
         )
         
         return QueryResponse(
             answer=result["answer"],
             route_taken=result["route_taken"],
-            success=result["success"]
+            success=result["success"],
+            thread_id=result["thread_id"]
         )
         
     except Exception as e:
@@ -140,56 +216,288 @@ async def query(request: QueryRequest):
             success=False
         )
 
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest, registry: AgentRegistry = Depends(get_registry)):
+    """
+    Streaming query endpoint (Server-Sent Events)
+
+    Emits a ``metadata`` event with the route first, ``token`` events as the
+    answer is generated, and a final ``done`` event with timings.
+    """
+    logger.info(f"Streaming query: {request.question[:50]}... | Symbol: {request.symbol} | Documents: {request.document_ids}")
+    orchestrator = await registry.get_orchestrator()
+
+    async def events():
+        try:
+            async for event in orchestrator.answer_stream(
+                question=request.question,
+                symbol=request.symbol,
+                document_ids=request.document_ids,
+                symbols=request.symbols,
+                top_k=request.top_k,
+                rerank=request.rerank,
+                thread_id=request.thread_id,
+                start_thread=request.start_thread
+            ):
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        except Exception as e:
+            logger.error(f"Streaming query error: {e}")
+            yield f"event: error\ndata: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/query/batch")
+async def query_batch(
+    request: BatchQueryRequest,
+    wait: Optional[bool] = None,
+    registry: AgentRegistry = Depends(get_registry)
+):
+    """
+    Answer many queries in one request
+    
+    Results stream back as NDJSON, one line per query in completion order,
+    each with the query's ``index``. Large batches (or wait=false) run as a
+    background job and the response is 202 with a job ID to poll at
+    GET /jobs/{job_id}; the job result lists the answers in query order.
+    """
+    from jobs import get_job_store
+    from orchestrator import BATCH_QUERY_MAX_CONCURRENCY
+    
+    total = len(request.queries)
+    if total == 0:
+        raise HTTPException(400, "No queries provided")
+    if total > BATCH_QUERY_MAX_SIZE:
+        raise HTTPException(413, f"At most {BATCH_QUERY_MAX_SIZE} queries per batch")
+    
+    orchestrator = await registry.get_orchestrator()
+    queries = [
+        {
+            "question": q.question, "symbol": q.symbol, "document_ids": q.document_ids, "symbols": q.symbols,
+            "top_k": q.top_k, "rerank": q.rerank
+        }
+        for q in request.queries
+    ]
+    concurrency = request.concurrency or BATCH_QUERY_MAX_CONCURRENCY
+    logger.info(f"Batch query: {total} queries, concurrency {concurrency}")
+    
+    if wait is False or (wait is None and total > BATCH_QUERY_ASYNC_THRESHOLD):
+        job_store = get_job_store()
+        job = job_store.create("query_batch", total_queries=total)
+        job_store.set_progress(job["job_id"], completed=0, succeeded=0, total=total)
+        
+        async def run_batch() -> Dict[str, Any]:
+            results = [None] * total
+            completed = succeeded = 0
+            async for result in orchestrator.answer_batch(queries, concurrency=concurrency):
+                results[result["index"]] = result
+                completed += 1
+                succeeded += result["success"]
+                job_store.set_progress(job["job_id"], completed=completed, succeeded=succeeded)
+            return {"success": True, "total": total, "succeeded": succeeded, "results": results}
+        
+        job_store.run(job["job_id"], run_batch())
+        return JSONResponse(status_code=202, content={
+            "success": True,
+            "total_queries": total,
+            "job_id": job["job_id"],
+            "status_url": f"/jobs/{job['job_id']}"
+        })
+    
+    async def lines():
+        async for result in orchestrator.answer_batch(queries, concurrency=concurrency):
+            yield json.dumps(result) + "\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 @app.post("/upload")
 async def upload_document(
-    file: UploadFile = File(...)
+    request: Request,
+    wait: bool = Query(False, description="Block until ingestion finishes instead of returning a job"),
+    document_id: Optional[str] = Query(None, description="Re-ingest a revised version of this document"),
+    registry: AgentRegistry = Depends(get_registry)
 ):
-    """Upload PDF document"""
+    """
+    Upload a PDF (multipart field ``file``); ingestion runs as a background job polled via GET /jobs/{job_id}
+
+    The body is streamed to disk and hashed as it arrives; a file whose content
+    is already catalogued returns the existing document without re-ingesting it.
+    With ``document_id`` the upload replaces that document, re-embedding only
+    the chunks whose text changed.
+    """
+    from ingest_queue import new_document_id
+    from document_catalog import get_document_catalog
+    from upload_stream import UploadError, receive_pdf
     try:
-        if not file.filename.endswith('.pdf'):
-            raise HTTPException(400, "Only PDF files supported")
+        catalog = get_document_catalog()
+        if document_id and await asyncio.to_thread(catalog.get, document_id) is None:
+            raise HTTPException(404, f"No document found with ID: {document_id}")
         
-        # Save file temporarily
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        file_path = UPLOAD_DIR / f"{timestamp}_{file.filename}"
+        # Stream the file for the ingest worker, which removes it once the job succeeds or is abandoned
+        upload = await receive_pdf(request, UPLOAD_DIR)
         
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        existing = await asyncio.to_thread(catalog.find_by_hash, upload.content_hash)
+        if existing is not None and document_id in (None, existing["document_id"]):
+            upload.path.unlink(missing_ok=True)
+            logger.info(f"Duplicate upload of {upload.filename}; already catalogued as {existing['document_id']}")
+            return {
+                "success": True,
+                "duplicate": True,
+                "document_id": existing["document_id"],
+                "status": existing["status"],
+                "message": f"Document already uploaded as {existing['document_id']}"
+            }
         
-        # Lazy import - only import when needed
-        from agents.document_agent import DocumentAgent
-        agent = DocumentAgent()
-        result = await agent.upload_document(
-            file_path=str(file_path)
+        document_id = document_id or new_document_id(upload.filename)
+        job = registry.ingest_queue.submit(
+            str(upload.path), document_id, filename=upload.filename, content_hash=upload.content_hash
         )
         
-        # Clean up
-        file_path.unlink()
+        if wait:
+            job = await registry.ingest_queue.wait(job["job_id"])
+            result = job["result"] or {}
+            return {
+                "success": job["status"] == "succeeded",
+                "document_id": document_id,
+                "job_id": job["job_id"],
+                "message": "Document uploaded successfully" if job["status"] == "succeeded" else job["error"],
+                "chunks_uploaded": result.get("chunks_uploaded", 0)
+            }
         
-        return {
-            "success": result["success"],
-            "document_id": result["document_id"],
-            "message": "Document uploaded successfully"
-        }
+        return JSONResponse(status_code=202, content={
+            "success": True,
+            "document_id": document_id,
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "status_url": f"/jobs/{job['job_id']}",
+            "message": "Document queued for ingestion"
+        })
         
+    except HTTPException:
+        raise
+    except UploadError as e:
+        raise HTTPException(e.status_code, str(e))
     except Exception as e:
         logger.error(f"Upload error: {e}")
         raise HTTPException(500, f"Upload failed: {e}")
 
 @app.get("/documents")
-async def list_documents():
-    """List all uploaded documents"""
+async def list_documents(
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    q: Optional[str] = None,
+    status: Optional[str] = None,
+    embedding_model: Optional[str] = None,
+    registry: AgentRegistry = Depends(get_registry)
+):
+    """List uploaded documents with pagination and filtering (q matches ID or filename)"""
     try:
-        # Lazy import - only import when needed
-        from agents.document_agent import DocumentAgent
-        agent = DocumentAgent()
-        result = await agent.list_documents()
+        agent = await registry.get_document_agent()
+        result = await agent.list_documents(
+            limit=limit,
+            offset=offset,
+            query=q,
+            status=status,
+            embedding_model=embedding_model
+        )
         return result
     except Exception as e:
         logger.error(f"List documents error: {e}")
         return {"success": False, "error": str(e), "documents": []}
 
 
+@app.delete("/documents/{document_id}")
+async def delete_document(
+    document_id: str,
+    wait: Optional[bool] = None,
+    registry: AgentRegistry = Depends(get_registry)
+):
+    """
+    Delete a document and all its vectors
+    
+    Large documents (or wait=false) are deleted in a background job and the
+    response is 202 with a job ID to poll at GET /jobs/{job_id}.
+    """
+    from document_catalog import get_document_catalog
+    from jobs import get_job_store
+    
+    try:
+        agent = await registry.get_document_agent()
+        record = get_document_catalog().get(document_id)
+        chunk_count = record["chunk_count"] if record else 0
+        
+        if wait is False or (wait is None and chunk_count > DELETE_ASYNC_THRESHOLD):
+            job_store = get_job_store()
+            job = job_store.create("delete_document", document_id=document_id)
+            job_store.set_progress(job["job_id"], deleted_vectors=0, total_vectors=chunk_count)
+            job_store.run(job["job_id"], agent.delete_document(
+                document_id,
+                progress=lambda **progress: job_store.set_progress(job["job_id"], **progress)
+            ))
+            return JSONResponse(status_code=202, content={
+                "success": True,
+                "document_id": document_id,
+                "job_id": job["job_id"],
+                "status_url": f"/jobs/{job['job_id']}"
+            })
+        
+        result = await agent.delete_document(document_id)
+    except Exception as e:
+        logger.error(f"Delete document error: {e}")
+        raise HTTPException(500, f"Delete failed: {e}")
+    
+    if not result["success"]:
+        status_code = 404 if result["error"].startswith("No document found") else 500
+        raise HTTPException(status_code, result["error"])
+    return result
+
+@app.get("/conversations/{thread_id}")
+async def get_conversation(thread_id: str, registry: AgentRegistry = Depends(get_registry)):
+    """Questions and answers recorded in a conversation thread"""
+    orchestrator = await registry.get_orchestrator()
+    messages = await orchestrator.conversation_history(thread_id)
+    if not messages:
+        raise HTTPException(404, f"No conversation found with ID: {thread_id}")
+    return {"thread_id": thread_id, "messages": messages, "summary": await orchestrator.conversation_summary(thread_id)}
+
+@app.delete("/conversations/{thread_id}")
+async def delete_conversation(thread_id: str, registry: AgentRegistry = Depends(get_registry)):
+    """Forget a conversation thread and everything it gathered"""
+    orchestrator = await registry.get_orchestrator()
+    await orchestrator.delete_conversation(thread_id)
+    return {"success": True, "thread_id": thread_id}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, registry: AgentRegistry = Depends(get_registry)):
+    """Status, progress and result of a background job"""
+    from jobs import get_job_store
+    job = get_job_store().get(job_id)
+    if job is None:
+        # Ingest jobs outlive the in-memory store (restarts, eviction) in the durable queue
+        job = await asyncio.to_thread(registry.ingest_queue.job, job_id)
+    if job is None:
+        raise HTTPException(404, f"No job found with ID: {job_id}")
+    return job
+
+@app.post("/jobs/{job_id}/retry")
+async def retry_job(job_id: str, registry: AgentRegistry = Depends(get_registry)):
+    """Resume a failed ingest job from its checkpoint, re-embedding the chunks that failed"""
+    job = registry.ingest_queue.retry(job_id)
+    if job is None:
+        raise HTTPException(404, f"No failed ingest job found with ID: {job_id}")
+    return JSONResponse(status_code=202, content={"success": True, "job_id": job_id, "status": job["status"]})
+
+@app.delete("/jobs/{job_id}")
+async def abandon_job(job_id: str, registry: AgentRegistry = Depends(get_registry)):
+    """Abandon a failed ingest job and delete its retained upload"""
+    if not await asyncio.to_thread(registry.ingest_queue.abandon, job_id):
+        raise HTTPException(404, f"No failed ingest job found with ID: {job_id}")
+    return {"success": True, "job_id": job_id, "status": "abandoned"}
+
 # Vercel serverless handler
 def handler(event, context):
     return app
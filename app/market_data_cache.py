@@ -0,0 +1,195 @@
+"""
+TTL cache for yfinance data
+Per-symbol, per-dataset entries with separate TTLs for company info and
+financial statements, an in-memory LRU tier, an optional on-disk pickle tier
+and single-flight deduplication of concurrent downloads
+"""
+
+import os
+import re
+import time
+import pickle
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MARKET_INFO_TTL_SECONDS = float(os.getenv("MARKET_INFO_TTL_SECONDS", "3600"))
+MARKET_STATEMENT_TTL_SECONDS = float(os.getenv("MARKET_STATEMENT_TTL_SECONDS", "86400"))  # Fundamentals change quarterly
+MARKET_CACHE_SIZE = int(os.getenv("MARKET_CACHE_SIZE", "512"))
+MARKET_CACHE_DIR = os.getenv("MARKET_CACHE_DIR")  # e.g. cache/market_data; unset keeps memory only
+
+STATEMENT_DATASETS = ("income", "balance", "cashflow")
+
+
+class MarketDataCache:
+    """
+    Cache of yfinance datasets keyed by (symbol, dataset)
+
+    ``get_or_fetch`` returns a fresh cached value or runs ``fetch`` exactly once
+    per key no matter how many threads ask at the same time; the others wait
+    for the leader's result. Failed fetches are not cached.
+    """
+
+    def __init__(
+        self,
+        info_ttl: float = MARKET_INFO_TTL_SECONDS,
+        statement_ttl: float = MARKET_STATEMENT_TTL_SECONDS,
+        max_entries: int = MARKET_CACHE_SIZE,
+        cache_dir: Optional[str] = MARKET_CACHE_DIR
+    ):
+        self.info_ttl = info_ttl
+        self.statement_ttl = statement_ttl
+        self.max_entries = max_entries
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._memory: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def ttl_for(self, dataset: str) -> float:
+        return self.statement_ttl if dataset in STATEMENT_DATASETS else self.info_ttl
+
+    def _disk_path(self, key: Tuple[str, str]) -> Path:
+        symbol, dataset = key
+        return self.cache_dir / f"{re.sub(r'[^A-Za-z0-9._-]', '_', symbol)}__{dataset}.pkl"
+
+    def _lookup(self, key: Tuple[str, str]) -> Tuple[bool, Any]:
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            del self._memory[key]
+
+        if self.cache_dir is not None:
+            path = self._disk_path(key)
+            try:
+                with open(path, "rb") as f:
+                    expires_at, value = pickle.load(f)
+                if expires_at > now:
+                    self._remember(key, expires_at, value)
+                    self.disk_hits += 1
+                    return True, value
+                path.unlink(missing_ok=True)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable market data cache file {path}: {e}")
+        return False, None
+
+    def _remember(self, key: Tuple[str, str], expires_at: float, value: Any) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_or_fetch(self, symbol: str, dataset: str, fetch: Callable[[], Any]) -> Any:
+        key = (symbol.upper(), dataset)
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                return value
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = fetch()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        expires_at = time.time() + self.ttl_for(dataset)
+        with self._lock:
+            self._remember(key, expires_at, value)
+            del self._in_flight[key]
+        future.set_result(value)
+        self._write_disk(key, expires_at, value)
+        return value
+
+    def get_many(self, symbols: Iterable[str], dataset: str) -> Dict[str, Any]:
+        """Return the fresh cached values among ``symbols``; missing symbols are counted as misses"""
+        found_values = {}
+        with self._lock:
+            for symbol in symbols:
+                found, value = self._lookup((symbol.upper(), dataset))
+                if found:
+                    found_values[symbol.upper()] = value
+                else:
+                    self.misses += 1
+        return found_values
+
+    def put(self, symbol: str, dataset: str, value: Any) -> None:
+        """Store a value fetched outside ``get_or_fetch``, e.g. by a bulk download"""
+        key = (symbol.upper(), dataset)
+        expires_at = time.time() + self.ttl_for(dataset)
+        with self._lock:
+            self._remember(key, expires_at, value)
+        self._write_disk(key, expires_at, value)
+
+    def _write_disk(self, key: Tuple[str, str], expires_at: float, value: Any) -> None:
+        if self.cache_dir is not None:
+            try:
+                with open(self._disk_path(key), "wb") as f:
+                    pickle.dump((expires_at, value), f)
+            except Exception as e:
+                logger.warning(f"Could not write market data cache for {key}: {e}")
+
+    def invalidate(self, symbol: str, dataset: Optional[str] = None) -> None:
+        symbol = symbol.upper()
+        with self._lock:
+            for key in [key for key in self._memory if key[0] == symbol and dataset in (None, key[1])]:
+                del self._memory[key]
+        if self.cache_dir is not None:
+            pattern = f"{re.sub(r'[^A-Za-z0-9._-]', '_', symbol)}__{dataset or '*'}.pkl"
+            for path in self.cache_dir.glob(pattern):
+                path.unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses + self.coalesced
+            served = self.hits + self.disk_hits + self.coalesced
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced_requests": self.coalesced,
+                "hit_rate": round(served / lookups, 4) if lookups else 0.0,
+                "entries": len(self._memory),
+                "in_flight": len(self._in_flight),
+                "info_ttl_seconds": self.info_ttl,
+                "statement_ttl_seconds": self.statement_ttl,
+                "disk_enabled": self.cache_dir is not None,
+            }
+
+
+_market_data_cache: Optional[MarketDataCache] = None
+
+
+def get_market_data_cache() -> MarketDataCache:
+    """Get the process-wide market data cache"""
+    global _market_data_cache
+    if _market_data_cache is None:
+        _market_data_cache = MarketDataCache()
+    return _market_data_cache
@@ -1,14 +1,17 @@
 """
 LangGraph Orchestrator - Central router for Financial RAG System
 Routes queries between FinancialAgent (yfinance) and DocumentAgent (RAG) 
-based on presence of document_ids
+based on presence of document_ids, or fans out to both when the question
+also concerns a stock symbol
 """
 
 import asyncio
 import logging
 import os
+import re
+import time
 import uuid
-from typing import Dict, Any, List, Optional, Literal, TypedDict, Annotated, Sequence
+from typing import Dict, Any, List, Optional, Literal, TypedDict, Annotated, Sequence, AsyncIterator
 from dataclasses import dataclass
 from datetime import datetime
 import operator
@@ -21,33 +24,19 @@ from langchain_core.output_parsers import JsonOutputParser
 from langchain.agents import AgentExecutor, create_tool_calling_agent
 from langchain.tools import tool
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.graph import StateGraph, END
-
-# Try to import MemorySaver, fallback to simple dict-based memory
-try:
-    from langgraph.checkpoint.memory import MemorySaver
-    MEMORY_AVAILABLE = True
-except ImportError:
-    try:
-        from langgraph.checkpoint import MemorySaver
-        MEMORY_AVAILABLE = True
-    except ImportError:
-        # Simple fallback memory implementation
-        class MemorySaver:
-            def __init__(self):
-                self.memory = {}
-            
-            def get_state(self, config):
-                return None
-                
-            def put_state(self, config, state):
-                pass
-        
-        MEMORY_AVAILABLE = False
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph import StateGraph, START, END
+from langgraph.types import StreamWriter
+from google.api_core.exceptions import ResourceExhausted
 
 # Import agents from agents folder
-from agents.financial_agent import FinancialAgent
-from agents.document_agent import DocumentAgent
+from agents.financial_agent import FinancialAgent, PORTFOLIO_MAX_SYMBOLS
+from agents.document_agent import DocumentAgent, QUOTA_EXCEEDED_MESSAGE
+from answer_cache import ANSWER_CACHE_ENABLED, ANSWER_CACHE_FINANCIAL, document_scope, get_answer_cache, symbol_scope
+from conversation_store import get_checkpoint_saver
+from market_data_cache import MARKET_INFO_TTL_SECONDS
+from rerank import resolve_mode
+from sparse_index import tokenize
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -74,10 +63,88 @@ llm = ChatGoogleGenerativeAI(
     google_api_key=GEMINI_API_KEY
 )
 
+BATCH_QUERY_MAX_CONCURRENCY = int(os.getenv("BATCH_QUERY_MAX_CONCURRENCY", "8"))
+
+# Fan-out route: documents and market data gathered concurrently for one answer
+FAN_OUT_ENABLED = os.getenv("FAN_OUT_ENABLED", "true").lower() == "true"
+FAN_OUT_DOCUMENT_TIMEOUT_SECONDS = float(os.getenv("FAN_OUT_DOCUMENT_TIMEOUT_SECONDS", "15"))
+FAN_OUT_FINANCIAL_TIMEOUT_SECONDS = float(os.getenv("FAN_OUT_FINANCIAL_TIMEOUT_SECONDS", "15"))
+
+# Agent replies that signal a failure, or a raw-data fallback rather than an answer
+ERROR_ANSWER_PREFIXES = ("Error", "An error occurred", "Orchestrator error", "You have exceeded", "Too many symbols")
+UNCACHEABLE_ANSWER_PREFIXES = ERROR_ANSWER_PREFIXES + (
+    "LLM not available", "Data for ", "Comparison table:", "Based on the available transcripts:",
+    "No relevant information",
+)
+
+# Conversation memory: turns of a thread are checkpointed, follow-ups reuse the context and data gathered earlier
+CONVERSATION_MAX_TURNS = int(os.getenv("CONVERSATION_MAX_TURNS", "20"))  # Question/answer pairs kept per thread
+CONVERSATION_PROMPT_TURNS = int(os.getenv("CONVERSATION_PROMPT_TURNS", "3"))  # Earlier turns quoted in the prompt
+CONVERSATION_REUSE_COVERAGE = float(os.getenv("CONVERSATION_REUSE_COVERAGE", "0.6"))  # Share of question terms the stored context must contain
+
+HISTORY_ANSWER_CHARS = 600  # Earlier answers are truncated when quoted in the prompt
+
+# Route → node gathering its context or data
+GATHER_NODES = {
+    "document_agent_rag": "retrieve_documents",
+    "fan_out_rag_financial": "fan_out",
+    "financial_agent_portfolio": "fetch_financials",
+    "financial_agent_yfinance": "fetch_financials",
+}
+
+def _merge_branches(left: Dict[str, str], right: Dict[str, str]) -> Dict[str, str]:
+    return {**left, **right}
+
+
+def _append_turns(left: List[Dict[str, Any]], right: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return (left + right)[-2 * CONVERSATION_MAX_TURNS:]
+
+
+class ConversationState(TypedDict, total=False):
+    """
+    State of a conversation thread, checkpointed after every turn
+    
+    The query fields are overwritten by each question; ``messages``, ``documents``
+    and ``market_data`` carry over so follow-ups can reuse what earlier turns gathered.
+    """
+    question: str
+    symbol: Optional[str]
+    symbols: Optional[List[str]]
+    document_ids: Optional[List[str]]
+    report_type: Optional[str]
+    top_k: int
+    rerank: Optional[str]
+    route_taken: Optional[str]
+    answer: Optional[str]
+    cached: bool
+    messages: Annotated[List[Dict[str, Any]], _append_turns]
+    documents: Optional[Dict[str, Any]]  # Last retrieval: {"key", "context"}
+    market_data: Optional[Dict[str, Any]]  # Last fetch: {"symbols", "datasets", "data", "fetched_at"}
+
+
+class FanOutState(TypedDict, total=False):
+    """State of the fan-out graph; each branch writes its own keys and its status under ``branches``"""
+    question: str
+    document_ids: List[str]
+    symbols: List[str]
+    report_type: Optional[str]
+    top_k: int
+    rerank: Optional[str]
+    history: Optional[str]
+    document_context: Optional[str]
+    financial_data: Optional[str]
+    branches: Annotated[Dict[str, str], _merge_branches]
+    prompt: Optional[str]
+
+
 class LangGraphOrchestrator:
     """
     Central router that decides whether to query yfinance or use RAG based on presence of document_ids
-    Uses LangGraph for sophisticated routing and memory management
+    
+    Each query runs through a compiled LangGraph: route → answer-cache lookup →
+    gather (documents, financials or fan-out) → generate → record. With a
+    thread_id the graph is checkpointed in SQLite, so a follow-up question sees
+    the conversation so far and reuses its retrieved context and market data.
     """
     
     def __init__(self, llm=None):
@@ -90,6 +157,10 @@ class LangGraphOrchestrator:
         self.llm = llm or globals()['llm']  # Use provided LLM or global default
         self.rag_agent = DocumentAgent()  # RAG agent for document queries
         self.financial_agent = FinancialAgent()  # Financial agent for yfinance queries
+        self.fan_out_graph = self._build_fan_out_graph()
+        conversation = self._build_conversation_graph()
+        self.graph = conversation.compile(checkpointer=get_checkpoint_saver())
+        self.stateless_graph = conversation.compile()  # One-off queries without a thread
         
         logger.info("LangGraph Orchestrator initialized with agents")
     
@@ -102,7 +173,9 @@ class LangGraphOrchestrator:
         symbol_filter: Optional[str] = None,
         top_k: int = 5,
         thread_id: Optional[str] = None,
-        user_id: Optional[str] = None
+        user_id: Optional[str] = None,
+        symbols: Optional[List[str]] = None,
+        rerank: Optional[str] = None
     ) -> tuple[str, str]:
         """
         Central routing method that decides which agent to use
@@ -116,6 +189,8 @@ class LangGraphOrchestrator:
             top_k: Number of top results for RAG
             thread_id: Thread ID for conversation memory
             user_id: User ID for user-specific memory
+            symbols: Several stock symbols for a portfolio comparison query
+            rerank: RAG rerank mode ("none", "lexical", "mmr"); defaults to RERANK_MODE
             
         Returns:
             tuple[str, str]: The response from the appropriate agent and the route taken
@@ -123,60 +198,730 @@ class LangGraphOrchestrator:
         start_time = datetime.now()
         
         try:
-            # Simple routing logic based on original requirement:
-            # - If document_ids provided → Use DocumentAgent (RAG)
-            # - If no document_ids → Use FinancialAgent (yfinance)
-            
-            # Check if document_ids are provided and valid
-            has_valid_document_ids = document_ids and len(document_ids) > 0 and any(doc_id and doc_id.strip() and doc_id != "string" for doc_id in document_ids)
-            
-            if has_valid_document_ids:
-                logger.info(f"Routing to DocumentAgent (RAG) - document_ids provided: {document_ids}")
-                
-                # Use DocumentAgent for RAG queries with explicit document IDs
-                result = await self.rag_agent.answer(
-                    question=question,
-                    document_ids=document_ids,
-                    top_k=top_k
-                )
-                
-                route_taken = "document_agent_rag"
-                
-            else:
-                logger.info(f"Routing to FinancialAgent (yfinance) - no valid document_ids provided")
-                
-                # Require symbol for financial queries
-                if not symbol:
-                    return "Error: 'symbol' is required for financial queries.", "error"
-                
-                # Use FinancialAgent for yfinance queries
-                result = await self.financial_agent.answer(
-                    question=question,
-                    symbol=symbol,
-                    report_type=report_type
-                )
-                
-                route_taken = "financial_agent_yfinance"
+            turn = {"stream": False, "started": time.perf_counter()}
+            state = await self._graph_for(thread_id).ainvoke(
+                self._turn_input(question, symbol, symbols, document_ids, report_type, top_k, rerank),
+                self._turn_config(thread_id, turn)
+            )
+            route_taken = state["route_taken"]
             
             # Calculate processing time
             end_time = datetime.now()
             processing_time = (end_time - start_time).total_seconds() * 1000
             
             logger.info(f"Query completed via {route_taken} in {processing_time:.2f}ms")
-            
-            return result, route_taken
+            return state["answer"], route_taken
             
         except Exception as e:
             logger.error(f"Error in orchestrator routing: {e}")
             return f"Orchestrator error: {str(e)}", "error"
     
+    @staticmethod
+    def _select_route(
+        document_ids: Optional[List[str]],
+        symbols: Optional[List[str]],
+        question: str = "",
+        symbol: Optional[str] = None
+    ) -> str:
+        """
+        Simple routing logic based on original requirement:
+        - If document_ids provided and symbols given, or the symbol named in the question → fan out to both agents
+        - If document_ids provided → Use DocumentAgent (RAG)
+        - If several symbols → FinancialAgent portfolio comparison
+        - Otherwise → Use FinancialAgent (yfinance)
+        """
+        # Check if document_ids are provided and valid
+        has_valid_document_ids = document_ids and len(document_ids) > 0 and any(doc_id and doc_id.strip() and doc_id != "string" for doc_id in document_ids)
+        if has_valid_document_ids:
+            if FAN_OUT_ENABLED and (
+                any(s and s.strip() for s in symbols or []) or LangGraphOrchestrator._mentions_symbol(question, symbol)
+            ):
+                return "fan_out_rag_financial"
+            return "document_agent_rag"
+        if symbols and len({s.strip().upper() for s in symbols if s and s.strip()}) > 1:
+            return "financial_agent_portfolio"
+        return "financial_agent_yfinance"
+
+    @staticmethod
+    def _mentions_symbol(question: str, symbol: Optional[str]) -> bool:
+        # Short tickers ("A", "ON", "IT") are ordinary words unless written in capitals
+        symbol = (symbol or "").strip().upper()
+        if not symbol or not question:
+            return False
+        flags = re.IGNORECASE if len(symbol) >= 3 else 0
+        return re.search(rf"(?<![\w$]){re.escape(symbol)}(?!\w)", question, flags) is not None
+
+    @staticmethod
+    def _fan_out_symbols(symbol: Optional[str], symbols: Optional[List[str]]) -> List[str]:
+        explicit = [s.strip().upper() for s in symbols or [] if s and s.strip()]
+        return list(dict.fromkeys(explicit)) or [symbol.strip().upper()]
+
+    # -------------------------------------------------------------------------
+    # Conversation graph
+    # -------------------------------------------------------------------------
+
+    def _build_conversation_graph(self) -> StateGraph:
+        graph = StateGraph(ConversationState)
+        graph.add_node("route", self._route_node)
+        graph.add_node("lookup", self._lookup_node)
+        graph.add_node("retrieve_documents", self._documents_node)
+        graph.add_node("fetch_financials", self._financials_node)
+        graph.add_node("fan_out", self._fan_out_node)
+        graph.add_node("generate", self._generate_node)
+        graph.add_node("record", self._record_node)
+        graph.add_edge(START, "route")
+        graph.add_edge("route", "lookup")
+        graph.add_conditional_edges(
+            "lookup",
+            lambda state: "generate" if state.get("answer") is not None else GATHER_NODES[state["route_taken"]],
+            ["retrieve_documents", "fetch_financials", "fan_out", "generate"]
+        )
+        for node in ("retrieve_documents", "fetch_financials", "fan_out"):
+            graph.add_edge(node, "generate")
+        graph.add_edge("generate", "record")
+        graph.add_edge("record", END)
+        return graph
+
+    def _graph_for(self, thread_id: Optional[str]):
+        return self.graph if thread_id else self.stateless_graph
+
+    @staticmethod
+    def _turn_config(thread_id: Optional[str], turn: Dict[str, Any]) -> RunnableConfig:
+        # ``turn`` carries per-request scratch (answer-cache scope, fan-out outcome) that isn't checkpointed
+        configurable = {"turn": turn}
+        if thread_id:
+            configurable["thread_id"] = thread_id
+        return {"configurable": configurable}
+
+    @staticmethod
+    def _turn_input(
+        question: str,
+        symbol: Optional[str],
+        symbols: Optional[List[str]],
+        document_ids: Optional[List[str]],
+        report_type: Optional[str],
+        top_k: int,
+        rerank: Optional[str]
+    ) -> ConversationState:
+        return {
+            "question": question,
+            "symbol": symbol,
+            "symbols": symbols,
+            "document_ids": document_ids,
+            "report_type": report_type,
+            "top_k": top_k,
+            "rerank": rerank,
+            "route_taken": None,
+            "answer": None,
+            "cached": False,
+        }
+
+    async def _route_node(self, state: ConversationState, config: RunnableConfig, writer: StreamWriter) -> Dict[str, Any]:
+        turn = config["configurable"]["turn"]
+        route_taken = self._select_route(state["document_ids"], state["symbols"], state["question"], state["symbol"])
+        symbol = self._single_symbol(state["symbol"], state["symbols"])
+        update: Dict[str, Any] = {"route_taken": route_taken}
+        if route_taken == "financial_agent_yfinance":
+            update["symbol"] = symbol
+            if not symbol:
+                route_taken = "error"
+                update = {"route_taken": route_taken, "answer": "Error: 'symbol' is required for financial queries."}
+        turn["route"] = route_taken
+        writer({
+            "type": "metadata",
+            "route_taken": route_taken,
+            "agent_used": self._agent_used(route_taken),
+            "document_ids_used": state["document_ids"],
+            "symbol": self._display_symbol(route_taken, symbol, state["symbols"]),
+            "thread_id": config["configurable"].get("thread_id"),
+        })
+        return update
+
+    async def _lookup_node(self, state: ConversationState, config: RunnableConfig) -> Dict[str, Any]:
+        # Follow-ups depend on the conversation so far, so only a thread's first question uses the answer cache
+        if state.get("answer") is not None or state.get("messages"):
+            return {}
+        turn = config["configurable"]["turn"]
+        symbol = self._single_symbol(state["symbol"], state["symbols"])
+        scope = self._answer_scope(
+            state["route_taken"], state["document_ids"], symbol, state["symbols"], state["report_type"],
+            state["top_k"], state["rerank"]
+        )
+        cached, turn["question_embedding"] = await self._lookup_answer(state["question"], scope)
+        turn["scope"] = scope
+        if cached is None:
+            return {}
+        logger.info(f"Answer cache hit for {scope} (similarity {cached['similarity']:.3f})")
+        turn["cached"] = True
+        return {"answer": cached["answer"], "cached": True}
+
+    async def _documents_node(self, state: ConversationState, config: RunnableConfig) -> Dict[str, Any]:
+        logger.info(f"Routing to DocumentAgent (RAG) - document_ids provided: {state['document_ids']}")
+        document_ids = self._selected_documents(state["document_ids"])
+        key = self._documents_key(document_ids, state["top_k"], state["rerank"])
+        if self._reusable_context(state.get("documents"), key, state["question"]):
+            self._count_reuse("documents")
+            return {}
+        try:
+            context = await self.rag_agent.retrieve_context(
+                state["question"], document_ids, None, state["top_k"], state["rerank"]
+            )
+        except ResourceExhausted as e:
+            logger.error(f"Gemini API quota exceeded: {e}")
+            return {"answer": QUOTA_EXCEEDED_MESSAGE}
+        except Exception as e:
+            logger.exception(f"Error retrieving context: {e}")
+            return {"answer": f"An error occurred while processing your request: {str(e)}"}
+        return {"documents": {"key": key, "context": context}}
+
+    async def _financials_node(self, state: ConversationState, config: RunnableConfig) -> Dict[str, Any]:
+        if state["route_taken"] == "financial_agent_portfolio":
+            logger.info(f"Routing to FinancialAgent (portfolio) - symbols: {state['symbols']}")
+            symbols = self._fan_out_symbols(None, state["symbols"])
+            if len(symbols) > PORTFOLIO_MAX_SYMBOLS:
+                return {"answer": f"Too many symbols: at most {PORTFOLIO_MAX_SYMBOLS} can be compared in one query."}
+        else:
+            logger.info(f"Routing to FinancialAgent (yfinance) - no valid document_ids provided")
+            symbols = [state["symbol"].strip().upper()]
+        datasets = self._datasets(state["question"], symbols, state["report_type"])
+        if self._reusable_data(state.get("market_data"), symbols, datasets):
+            self._count_reuse("market_data")
+            return {}
+        try:
+            data = await self.financial_agent.fetch_data(state["question"], symbols, state["report_type"])
+        except Exception as e:
+            logger.exception(f"Error fetching market data: {e}")
+            return {"answer": f"An error occurred while processing your request: {str(e)}"}
+        return {"market_data": self._market_data(symbols, datasets, data)}
+
+    async def _fan_out_node(self, state: ConversationState, config: RunnableConfig) -> Dict[str, Any]:
+        logger.info(
+            f"Fanning out to DocumentAgent and FinancialAgent - documents: {state['document_ids']}, "
+            f"symbols: {state['symbols'] or state['symbol']}"
+        )
+        turn = config["configurable"]["turn"]
+        document_ids = self._selected_documents(state["document_ids"])
+        symbols = self._fan_out_symbols(state["symbol"], state["symbols"])
+        key = self._documents_key(document_ids, state["top_k"], state["rerank"])
+        datasets = self._datasets(state["question"], symbols, state["report_type"])
+
+        # Parts gathered earlier in the conversation skip their branch
+        reused: Dict[str, Any] = {"branches": {}}
+        if self._reusable_context(state.get("documents"), key, state["question"]):
+            reused["document_context"] = state["documents"]["context"]
+            reused["branches"]["documents"] = "reused"
+            self._count_reuse("documents")
+        if self._reusable_data(state.get("market_data"), symbols, datasets):
+            reused["financial_data"] = state["market_data"]["data"]
+            reused["branches"]["financials"] = "reused"
+            self._count_reuse("market_data")
+
+        fan_out = await self._prepare_fan_out(
+            state["question"], document_ids, symbols, state["report_type"], state["top_k"], state["rerank"],
+            self._history_text(state.get("messages")), reused
+        )
+        turn["degraded"] = self._fan_out_degraded(fan_out)
+        turn["fan_out"] = fan_out
+        update: Dict[str, Any] = {}
+        if fan_out["prompt"] is None:
+            update["answer"] = self._fan_out_failure(fan_out)
+        if fan_out["branches"].get("documents") == "ok":
+            update["documents"] = {"key": key, "context": fan_out["document_context"]}
+        if fan_out["branches"].get("financials") == "ok":
+            update["market_data"] = self._market_data(symbols, datasets, fan_out["financial_data"])
+        return update
+
+    async def _generate_node(self, state: ConversationState, config: RunnableConfig, writer: StreamWriter) -> Dict[str, Any]:
+        turn = config["configurable"]["turn"]
+        if state.get("answer") is not None:
+            # Cached answers and errors decided upstream
+            writer({"type": "token", "text": state["answer"]})
+            return {}
+        history = self._history_text(state.get("messages"))
+        if not turn["stream"]:
+            try:
+                return {"answer": await self._generation(state, turn, history, stream=False)}
+            except Exception as e:
+                logger.exception(f"Error generating answer: {e}")
+                return {"answer": f"An error occurred while processing your request: {str(e)}"}
+
+        parts = []
+        try:
+            async for text in self._generation(state, turn, history, stream=True):
+                parts.append(text)
+                writer({"type": "token", "text": text})
+        except Exception as e:
+            logger.error(f"Error in orchestrator stream: {e}")
+            turn["failed"] = True
+            writer({"type": "error", "error": str(e)})
+        return {"answer": "".join(parts)}
+
+    def _generation(self, state: ConversationState, turn: Dict[str, Any], history: Optional[str], stream: bool):
+        """The route's generation call: an async iterator of text when streaming, otherwise a coroutine"""
+        question = state["question"]
+        route_taken = state["route_taken"]
+        if route_taken == "document_agent_rag":
+            generate = self.rag_agent.stream_from_context if stream else self.rag_agent.answer_from_context
+            return generate(question, state["documents"]["context"], history)
+        if route_taken == "fan_out_rag_financial":
+            # Documents and market data gathered concurrently, merged into one generation call
+            fan_out = turn["fan_out"]
+            generate = self.financial_agent.stream_from_prompt if stream else self.financial_agent.answer_from_prompt
+            return generate(fan_out["prompt"], self._fan_out_fallback(fan_out))
+        market_data = state["market_data"]
+        generate = self.financial_agent.stream_from_data if stream else self.financial_agent.answer_from_data
+        return generate(question, market_data["symbols"], market_data["data"], history)
+
+    async def _record_node(self, state: ConversationState, config: RunnableConfig) -> Dict[str, Any]:
+        turn = config["configurable"]["turn"]
+        route_taken = state["route_taken"]
+        if route_taken == "error":
+            return {}
+        answer = state.get("answer") or ""
+        # Answers missing a fan-out branch, or cut short by a stream error, aren't cached
+        if not state.get("cached") and not turn.get("degraded") and not turn.get("failed"):
+            self._remember_answer(
+                turn.get("scope"), turn.get("question_embedding"), answer, route_taken,
+                (time.perf_counter() - turn["started"]) * 1000, state["document_ids"]
+            )
+        timestamp = datetime.now().isoformat()
+        return {"messages": [
+            {"role": "user", "content": state["question"], "timestamp": timestamp},
+            {"role": "assistant", "content": answer, "route_taken": route_taken, "cached": state.get("cached", False), "timestamp": timestamp},
+        ]}
+
+    @staticmethod
+    def _history_text(messages: Optional[List[Dict[str, Any]]]) -> Optional[str]:
+        """The last CONVERSATION_PROMPT_TURNS question/answer pairs, for follow-up prompts"""
+        recent = (messages or [])[-2 * CONVERSATION_PROMPT_TURNS:] if CONVERSATION_PROMPT_TURNS > 0 else []
+        if not recent:
+            return None
+        lines = []
+        for message in recent:
+            content = message["content"]
+            if message["role"] == "assistant" and len(content) > HISTORY_ANSWER_CHARS:
+                content = content[:HISTORY_ANSWER_CHARS] + " ..."
+            lines.append(f"{'User' if message['role'] == 'user' else 'Assistant'}: {content}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _selected_documents(document_ids: List[str]) -> List[str]:
+        return [doc_id for doc_id in document_ids if doc_id and doc_id.strip()]
+
+    @staticmethod
+    def _documents_key(document_ids: List[str], top_k: int, rerank: Optional[str]) -> str:
+        return document_scope(document_ids, top_k, resolve_mode(rerank))
+
+    @staticmethod
+    def _reusable_context(documents: Optional[Dict[str, Any]], key: str, question: str) -> bool:
+        """Same documents and retrieval settings, and the stored context covers most of the question's terms"""
+        if not documents or documents["key"] != key or not documents["context"]:
+            return False
+        terms = set(tokenize(question))
+        if not terms:
+            return True
+        covered = terms & set(tokenize(documents["context"]))
+        return len(covered) / len(terms) >= CONVERSATION_REUSE_COVERAGE
+
+    def _datasets(self, question: str, symbols: List[str], report_type: Optional[str]) -> List[str]:
+        if len(symbols) > 1:
+            return ["comparison table"]
+        return self.financial_agent.plan_datasets(question, report_type)
+
+    @staticmethod
+    def _market_data(symbols: List[str], datasets: List[str], data: str) -> Dict[str, Any]:
+        return {
+            "symbols": symbols,
+            "datasets": datasets or ["fetch_company_info"],  # Questions naming no dataset get company info
+            "data": data,
+            "fetched_at": time.time(),
+        }
+
+    @staticmethod
+    def _reusable_data(market_data: Optional[Dict[str, Any]], symbols: List[str], datasets: List[str]) -> bool:
+        """Same symbols, still fresh, and every dataset the question asks for was fetched"""
+        return (
+            market_data is not None
+            and sorted(market_data["symbols"]) == sorted(symbols)
+            and time.time() - market_data["fetched_at"] < MARKET_INFO_TTL_SECONDS
+            and set(datasets) <= set(market_data["datasets"])
+        )
+
+    def _count_reuse(self, kind: str) -> None:
+        logger.info(f"Reusing {kind.replace('_', ' ')} from earlier in the conversation")
+        self.graph.checkpointer.count_reuse(kind)
+
+    # -------------------------------------------------------------------------
+    # Fan-out graph
+    # -------------------------------------------------------------------------
+
+    def _build_fan_out_graph(self):
+        """Document retrieval and market-data fetches as parallel branches joined by a merge node"""
+        graph = StateGraph(FanOutState)
+        graph.add_node("retrieve_documents", self._retrieve_documents_node)
+        graph.add_node("fetch_financials", self._fetch_financials_node)
+        graph.add_node("merge", self._merge_node)
+        graph.add_edge(START, "retrieve_documents")
+        graph.add_edge(START, "fetch_financials")
+        graph.add_edge(["retrieve_documents", "fetch_financials"], "merge")
+        graph.add_edge("merge", END)
+        return graph.compile()
+
+    @staticmethod
+    async def _run_branch(name: str, work, timeout: float) -> tuple[str, Optional[str]]:
+        """Await a branch within its deadline; a slow or failing branch yields no data instead of an error"""
+        try:
+            result = await asyncio.wait_for(work, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Fan-out branch {name} timed out after {timeout:g}s")
+            return "timeout", None
+        except Exception as e:
+            logger.warning(f"Fan-out branch {name} failed: {e}")
+            return "error", None
+        return ("ok", result) if result else ("empty", None)
+
+    async def _retrieve_documents_node(self, state: FanOutState) -> Dict[str, Any]:
+        if "documents" in state["branches"]:
+            return {}
+        status, context = await self._run_branch(
+            "documents",
+            self.rag_agent.retrieve_context(state["question"], state["document_ids"], None, state["top_k"], state["rerank"]),
+            FAN_OUT_DOCUMENT_TIMEOUT_SECONDS
+        )
+        return {"document_context": context, "branches": {"documents": status}}
+
+    async def _fetch_financials_node(self, state: FanOutState) -> Dict[str, Any]:
+        if "financials" in state["branches"]:
+            return {}
+        status, data = await self._run_branch(
+            "financials",
+            self.financial_agent.fetch_data(state["question"], state["symbols"], state["report_type"]),
+            FAN_OUT_FINANCIAL_TIMEOUT_SECONDS
+        )
+        return {"financial_data": data, "branches": {"financials": status}}
+
+    async def _merge_node(self, state: FanOutState) -> Dict[str, Any]:
+        context, data = state.get("document_context"), state.get("financial_data")
+        if context is None and data is None:
+            return {"prompt": None}
+        branches = state["branches"]
+        symbols = ", ".join(state["symbols"])
+        question = state["question"].strip()
+        conversation = f"\nEarlier in this conversation:\n{state['history']}\n" if state.get("history") else ""
+        prompt = f"""
+Answer the user's question using both the document excerpts and the market data below: "{question}"
+{conversation}
+Document excerpts (from the selected documents):
+{context or f"Not available (document retrieval: {branches.get('documents')})."}
+
+Market data for {symbols} (latest reported figures and company info):
+{data or f"Not available (market data: {branches.get('financials')})."}
+
+Compare the two sources where the question calls for it, say which source each figure comes from,
+and mention briefly if one of the sources was not available.
+"""
+        return {"prompt": prompt}
+
+    async def _prepare_fan_out(
+        self,
+        question: str,
+        document_ids: List[str],
+        symbols: List[str],
+        report_type: Optional[str],
+        top_k: int,
+        rerank: Optional[str],
+        history: Optional[str] = None,
+        reused: Optional[Dict[str, Any]] = None
+    ) -> FanOutState:
+        """Run the fan-out graph; ``reused`` pre-fills branches (with status "reused") that needn't run"""
+        started = time.perf_counter()
+        state = await self.fan_out_graph.ainvoke({
+            "question": question,
+            "document_ids": document_ids,
+            "symbols": symbols,
+            "report_type": report_type,
+            "top_k": top_k,
+            "rerank": rerank,
+            "history": history,
+            "branches": {},
+            **(reused or {}),
+        })
+        logger.info(f"Fan-out gathered in {(time.perf_counter() - started) * 1000:.2f}ms: {state['branches']}")
+        return state
+
+    @staticmethod
+    def _fan_out_degraded(state: FanOutState) -> bool:
+        return any(status not in ("ok", "reused") for status in state["branches"].values())
+
+    @staticmethod
+    def _fan_out_failure(state: FanOutState) -> str:
+        branches = state["branches"]
+        return (
+            "An error occurred while gathering data: "
+            f"document retrieval {branches.get('documents')}, market data {branches.get('financials')}."
+        )
+
+    @staticmethod
+    def _fan_out_fallback(state: FanOutState) -> str:
+        parts = []
+        if state.get("financial_data"):
+            parts.append(f"Data for {', '.join(state['symbols'])}:\n{state['financial_data']}")
+        if state.get("document_context"):
+            parts.append(f"Based on the available transcripts:\n\n{state['document_context']}")
+        return "\n\n".join(parts)
+
+    @staticmethod
+    def _agent_used(route_taken: str) -> str:
+        if route_taken == "document_agent_rag":
+            return "DocumentAgent"
+        if route_taken == "fan_out_rag_financial":
+            return "DocumentAgent+FinancialAgent"
+        if route_taken in ("financial_agent_yfinance", "financial_agent_portfolio"):
+            return "FinancialAgent"
+        return "none"
+
+    @staticmethod
+    def _display_symbol(route_taken: str, symbol: Optional[str], symbols: Optional[List[str]]) -> str:
+        if route_taken == "financial_agent_portfolio":
+            return ", ".join(symbols).upper()
+        if route_taken == "fan_out_rag_financial":
+            return ", ".join(LangGraphOrchestrator._fan_out_symbols(symbol, symbols))
+        return (symbol or "").upper()
+
+    @staticmethod
+    def _single_symbol(symbol: Optional[str], symbols: Optional[List[str]]) -> Optional[str]:
+        # A single-element symbols list is an ordinary single-symbol query
+        return next((s for s in symbols or [] if s and s.strip()), None) or symbol
+
+    @staticmethod
+    def _answer_scope(
+        route_taken: str,
+        document_ids: Optional[List[str]],
+        symbol: Optional[str],
+        symbols: Optional[List[str]],
+        report_type: Optional[str],
+        top_k: int = 5,
+        rerank: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Normalized answer-cache scope for a query, None if it shouldn't be cached
+
+        Routes that retrieve documents embed the question anyway, so caching
+        them is free; market-data routes are only cached with ANSWER_CACHE_FINANCIAL.
+        """
+        if route_taken == "document_agent_rag":
+            return LangGraphOrchestrator._documents_key(LangGraphOrchestrator._selected_documents(document_ids), top_k, rerank)
+        if route_taken == "fan_out_rag_financial":
+            documents = LangGraphOrchestrator._documents_key(LangGraphOrchestrator._selected_documents(document_ids), top_k, rerank)
+            return f"{documents}|{symbol_scope(LangGraphOrchestrator._fan_out_symbols(symbol, symbols), report_type)}"
+        if not ANSWER_CACHE_FINANCIAL:
+            return None
+        if route_taken == "financial_agent_portfolio":
+            return symbol_scope(s for s in symbols if s and s.strip())
+        if route_taken == "financial_agent_yfinance" and symbol:
+            return symbol_scope([symbol], report_type)
+        return None
+
+    async def _lookup_answer(self, question: str, scope: Optional[str]) -> tuple[Optional[Dict[str, Any]], Optional[List[float]]]:
+        """
+        Look the question up in the answer cache; also returns its embedding for storing the answer later
+        (retrieval's own query embedding is then served from the embedding cache)
+        """
+        if not ANSWER_CACHE_ENABLED or scope is None:
+            return None, None
+        try:
+            embedding = await self.rag_agent.get_query_embedding(question.strip())
+        except Exception as e:
+            logger.warning(f"Answer cache bypassed, question embedding failed: {e}")
+            return None, None
+        return get_answer_cache().get(scope, embedding), embedding
+
+    def _remember_answer(
+        self,
+        scope: Optional[str],
+        question_embedding: Optional[List[float]],
+        answer: str,
+        route_taken: str,
+        latency_ms: float,
+        document_ids: Optional[List[str]]
+    ) -> None:
+        # Errors and raw-data fallbacks are transient; only real answers are cached
+        if question_embedding is None or not answer or answer.startswith(UNCACHEABLE_ANSWER_PREFIXES):
+            return
+        # Market-data answers go stale with the underlying company info
+        ttl = None if route_taken == "document_agent_rag" else min(get_answer_cache().ttl, MARKET_INFO_TTL_SECONDS)
+        uses_documents = route_taken in ("document_agent_rag", "fan_out_rag_financial")
+        get_answer_cache().put(
+            scope, question_embedding, answer, route_taken, latency_ms,
+            document_ids=document_ids if uses_documents else None, ttl=ttl
+        )
+
+    async def answer_stream(
+        self,
+        question: str,
+        symbol: Optional[str] = None,
+        report_type: Optional[str] = None,
+        document_ids: Optional[List[str]] = None,
+        top_k: int = 5,
+        thread_id: Optional[str] = None,
+        symbols: Optional[List[str]] = None,
+        rerank: Optional[str] = None,
+        start_thread: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming counterpart of ``answer``
+        
+        Yields a ``metadata`` event with the route as soon as it is known, then
+        ``token`` events as the agent generates text, then a ``done`` event
+        with timings (including time to first token). The turn is recorded in
+        the conversation ``thread_id``; ``start_thread`` opens a new one
+        (returned in the metadata event). Otherwise nothing is stored.
+        """
+        start_time = time.perf_counter()
+        if thread_id is None and start_thread:
+            thread_id = str(uuid.uuid4())
+        turn = {"stream": True, "started": start_time}
+        first_token_ms = None
+        success = True
+        try:
+            async for event in self._graph_for(thread_id).astream(
+                self._turn_input(question, symbol, symbols, document_ids, report_type, top_k, rerank),
+                self._turn_config(thread_id, turn),
+                stream_mode="custom"
+            ):
+                if event["type"] == "token" and first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - start_time) * 1000
+                yield event
+        except Exception as e:
+            logger.error(f"Error in orchestrator stream: {e}")
+            success = False
+            yield {"type": "error", "error": str(e)}
+
+        route_taken = turn.get("route", "error")
+        processing_time = (time.perf_counter() - start_time) * 1000
+        logger.info(f"Streamed query via {route_taken} in {processing_time:.2f}ms (first token {first_token_ms or 0:.2f}ms)")
+        yield {
+            "type": "done",
+            "success": success and route_taken != "error" and not turn.get("failed"),
+            "cached": turn.get("cached", False),
+            "processing_time_ms": processing_time,
+            "time_to_first_token_ms": first_token_ms,
+        }
+
+    async def answer_batch(
+        self,
+        queries: List[Dict[str, Any]],
+        concurrency: int = BATCH_QUERY_MAX_CONCURRENCY
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Answer many queries, yielding each result as soon as it is ready
+        
+        RAG questions are grouped by their documents: each group embeds all its
+        questions in one request and retrieves for all of them in one batched
+        vector query. Generation and financial queries run with at most
+        ``concurrency`` in flight. Results carry the query's ``index``.
+        """
+        results: asyncio.Queue = asyncio.Queue()
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        emitted = set()
+
+        async def emit(i: int, answer: str, route_taken: str, started: float, cached: bool = False):
+            emitted.add(i)
+            await results.put({
+                "index": i,
+                "question": queries[i]["question"],
+                "answer": answer,
+                "route_taken": route_taken,
+                "success": route_taken != "error" and not answer.startswith(ERROR_ANSWER_PREFIXES),
+                "cached": cached,
+                "processing_time_ms": (time.perf_counter() - started) * 1000,
+            })
+
+        async def run_single(i: int):
+            started = time.perf_counter()
+            try:
+                async with semaphore:
+                    answer, route_taken = await self.answer(**queries[i])
+            except Exception as e:
+                answer, route_taken = f"Orchestrator error: {str(e)}", "error"
+            await emit(i, answer, route_taken, started)
+
+        async def run_rag_group(indices: List[int], document_ids: List[str], top_k: int, rerank: Optional[str]):
+            started = time.perf_counter()
+            scope = self._documents_key(document_ids, top_k, rerank)
+            try:
+                questions = [queries[i]["question"] for i in indices]
+                embeddings = await self.rag_agent.get_query_embeddings([q.strip() for q in questions])
+
+                pending = []
+                for i, embedding in zip(indices, embeddings):
+                    cached = get_answer_cache().get(scope, embedding) if ANSWER_CACHE_ENABLED else None
+                    if cached is not None:
+                        await emit(i, cached["answer"], "document_agent_rag", started, cached=True)
+                    else:
+                        pending.append((i, embedding))
+                if not pending:
+                    return
+                contexts = await self.rag_agent.retrieve_contexts(
+                    [embedding for _, embedding in pending], document_ids, None, top_k,
+                    questions=[queries[i]["question"] for i, _ in pending], rerank=rerank
+                )
+                logger.info(f"Batch: retrieved context for {len(pending)} questions over {scope}")
+
+                async def generate(i: int, embedding: List[float], context: Optional[str]):
+                    generation_started = time.perf_counter()
+                    try:
+                        async with semaphore:
+                            answer = await self.rag_agent.answer_from_context(queries[i]["question"], context)
+                    except Exception as e:
+                        answer = f"An error occurred while processing your request: {str(e)}"
+                    self._remember_answer(
+                        scope, embedding, answer, "document_agent_rag",
+                        (time.perf_counter() - generation_started) * 1000, document_ids
+                    )
+                    await emit(i, answer, "document_agent_rag", started)
+
+                await asyncio.gather(*(generate(i, embedding, context) for (i, embedding), context in zip(pending, contexts)))
+            except Exception as e:
+                logger.error(f"Batch RAG group over {scope} failed: {e}")
+                for i in indices:
+                    if i not in emitted:
+                        await emit(i, f"An error occurred while processing your request: {str(e)}", "document_agent_rag", started)
+
+        groups: Dict[tuple, List[int]] = {}
+        singles = []
+        for i, query in enumerate(queries):
+            route = self._select_route(query.get("document_ids"), query.get("symbols"), query["question"], query.get("symbol"))
+            if route == "document_agent_rag":
+                document_ids = sorted({doc_id for doc_id in query["document_ids"] if doc_id and doc_id.strip()})
+                key = (tuple(document_ids), query.get("top_k", 5), query.get("rerank"))
+                groups.setdefault(key, []).append(i)
+            else:
+                singles.append(i)
+
+        tasks = [asyncio.create_task(run_single(i)) for i in singles]
+        tasks += [
+            asyncio.create_task(run_rag_group(indices, list(document_ids), top_k, rerank))
+            for (document_ids, top_k, rerank), indices in groups.items()
+        ]
+        try:
+            for _ in range(len(queries)):
+                yield await results.get()
+        finally:
+            for task in tasks:
+                task.cancel()
+
     async def process_query(
         self,
         question: str,
         symbol: str,
         document_ids: Optional[List[str]] = None,
         thread_id: Optional[str] = None,
-        user_id: Optional[str] = None
+        user_id: Optional[str] = None,
+        symbols: Optional[List[str]] = None,
+        top_k: int = 5,
+        rerank: Optional[str] = None,
+        start_thread: bool = False
     ) -> Dict[str, Any]:
         """
         Process a query and return structured response with metadata
@@ -187,13 +932,17 @@ class LangGraphOrchestrator:
             document_ids: Optional document IDs for RAG
             thread_id: Optional thread ID for memory
             user_id: Optional user ID
+            symbols: Optional list of symbols for a portfolio comparison
+            top_k: Passages passed to generation for RAG
+            rerank: Optional RAG rerank mode
+            start_thread: Open a new conversation thread when no thread_id is given
             
         Returns:
             Dict containing answer, metadata, and routing information
         """
         try:
-            # Generate thread_id if not provided
-            if thread_id is None:
+            # Without a thread the query is answered statelessly
+            if thread_id is None and start_thread:
                 thread_id = str(uuid.uuid4())
             
             start_time = datetime.now()
@@ -204,16 +953,15 @@ class LangGraphOrchestrator:
                 symbol=symbol,
                 document_ids=document_ids,
                 thread_id=thread_id,
-                user_id=user_id
+                user_id=user_id,
+                symbols=symbols,
+                top_k=top_k,
+                rerank=rerank
             )
             
             # Determine agent used based on actual route taken
-            if route_taken == "document_agent_rag":
-                agent_used = "DocumentAgent"
-            elif route_taken == "financial_agent_yfinance":
-                agent_used = "FinancialAgent"
-            else:
-                agent_used = "none"
+            agent_used = self._agent_used(route_taken)
+            conversation_history = await self.conversation_history(thread_id) if thread_id else []
             
             # Calculate processing time
             end_time = datetime.now()
@@ -222,7 +970,7 @@ class LangGraphOrchestrator:
             # Return structured response
             return {
                 "answer": answer,
-                "symbol": symbol.upper(),
+                "symbol": self._display_symbol(route_taken, symbol, symbols),
                 "question": question,
                 "route_taken": route_taken,
                 "agent_used": agent_used,
@@ -238,7 +986,7 @@ class LangGraphOrchestrator:
                 "processing_time_ms": processing_time,
                 "thread_id": thread_id,
                 "user_id": user_id,
-                "conversation_history": []
+                "conversation_history": conversation_history
             }
             
         except Exception as e:
@@ -262,6 +1010,30 @@ class LangGraphOrchestrator:
                 "conversation_history": []
             }
 
+    async def conversation_history(self, thread_id: str) -> List[Dict[str, Any]]:
+        """Questions and answers recorded in a thread, oldest first"""
+        snapshot = await self.graph.aget_state({"configurable": {"thread_id": thread_id}})
+        return list(snapshot.values.get("messages", []))
+
+    async def conversation_summary(self, thread_id: str) -> Dict[str, Any]:
+        """What a thread holds: turn count, last route, and the context and data follow-ups can reuse"""
+        values = (await self.graph.aget_state({"configurable": {"thread_id": thread_id}})).values
+        messages = values.get("messages", [])
+        market_data = values.get("market_data")
+        return {
+            "thread_id": thread_id,
+            "turns": len(messages) // 2,
+            "last_question": messages[-2]["content"] if len(messages) >= 2 else None,
+            "last_route": values.get("route_taken"),
+            "documents": values.get("document_ids") if values.get("documents") else None,
+            "symbols": market_data["symbols"] if market_data else None,
+            "market_data_fetched_at": datetime.fromtimestamp(market_data["fetched_at"]).isoformat() if market_data else None,
+            "generated_at": datetime.now().isoformat()
+        }
+
+    async def delete_conversation(self, thread_id: str) -> None:
+        await self.graph.checkpointer.adelete_thread(thread_id)
+
 # =============================================================================
 # GLOBAL ORCHESTRATOR INSTANCE
 # =============================================================================
@@ -285,7 +1057,8 @@ async def process_financial_query(
     symbol: str,
     document_ids: Optional[List[str]] = None,
     thread_id: Optional[str] = None,
-    user_id: Optional[str] = None
+    user_id: Optional[str] = None,
+    symbols: Optional[List[str]] = None
 ) -> Dict[str, Any]:
     """
     Convenience function to process queries through the orchestrator
@@ -296,29 +1069,26 @@ async def process_financial_query(
         document_ids: Optional document IDs (triggers RAG if provided)
         thread_id: Optional thread ID for memory
         user_id: Optional user ID
+        symbols: Optional list of symbols for a portfolio comparison
         
     Returns:
         Dict containing the response and metadata
     """
     orch = await get_orchestrator()
-    return await orch.process_query(question, symbol, document_ids, thread_id, user_id)
+    return await orch.process_query(question, symbol, document_ids, thread_id, user_id, symbols)
 
 async def get_conversation_history(thread_id: str) -> List[Dict[str, Any]]:
     """
     Convenience function to get conversation history
     """
-    # Placeholder for conversation history retrieval
-    return []
+    orch = await get_orchestrator()
+    return await orch.conversation_history(thread_id)
 
 async def get_conversation_summary(thread_id: str) -> Dict[str, Any]:
     """
     Convenience function to get conversation summary
     """
-    # Placeholder for conversation summary
-    return {
-        "summary": "Conversation summary not implemented in simple orchestrator.",
-        "thread_id": thread_id,
-        "generated_at": datetime.now().isoformat()
-    }
+    orch = await get_orchestrator()
+    return await orch.conversation_summary(thread_id)
 
 logger.info("LangGraph Orchestrator module loaded successfully")
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""
+Prompt compaction for financial data
+Turns full yfinance statements into dense CSV tables: rows relevant to the
+question first, values scaled to millions and rounded to significant figures,
+all within a token budget
+"""
+
+import os
+import re
+import math
+from typing import Iterable, List, Optional
+
+import pandas as pd
+
+STATEMENT_TOKEN_BUDGET = int(os.getenv("STATEMENT_TOKEN_BUDGET", "400"))
+STATEMENT_SIG_FIGS = int(os.getenv("STATEMENT_SIG_FIGS", "4"))
+STATEMENT_MAX_PERIODS = int(os.getenv("STATEMENT_MAX_PERIODS", "4"))
+
+# Headline line items, most important first; always preferred over the long tail
+HEADLINE_ROWS = [
+    "Total Revenue", "Net Income", "Diluted EPS", "Operating Income", "Gross Profit", "EBITDA",
+    "Cost Of Revenue", "Operating Expense", "Research And Development", "Basic EPS",
+    "Total Assets", "Total Liabilities Net Minority Interest", "Stockholders Equity", "Total Debt",
+    "Net Debt", "Cash And Cash Equivalents", "Current Assets", "Current Liabilities", "Working Capital",
+    "Operating Cash Flow", "Free Cash Flow", "Capital Expenditure", "Repurchase Of Capital Stock",
+    "Cash Dividends Paid",
+]
+_HEADLINE_RANK = {name.lower(): rank for rank, name in enumerate(HEADLINE_ROWS)}
+
+# Everyday words mapped to the vocabulary yfinance uses for line items
+_SYNONYMS = {
+    "sales": ["revenue"], "revenues": ["revenue"], "turnover": ["revenue"],
+    "profit": ["income", "profit"], "profits": ["income", "profit"], "earnings": ["income", "eps"],
+    "margin": ["gross", "profit", "revenue"], "margins": ["gross", "profit", "revenue"],
+    "expenses": ["expense"], "costs": ["cost", "expense"], "r&d": ["research", "development"],
+    "borrowings": ["debt"], "leverage": ["debt", "equity"], "liquidity": ["cash", "current"],
+    "capex": ["capital", "expenditure"], "buybacks": ["repurchase"], "payout": ["dividends"],
+}
+_STOPWORDS = {"the", "and", "for", "what", "was", "were", "how", "did", "does", "its", "their", "this", "that", "with", "from"}
+
+# Per-share figures and ratios are reported as-is, everything else in millions
+_UNSCALED = re.compile(r"\beps\b|per share|\brate\b|\bratio\b", re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting (about four characters per token)"""
+    return max(1, math.ceil(len(text) / 4))
+
+
+def _question_terms(question: Optional[str]) -> set:
+    terms = set()
+    for word in re.findall(r"[a-z&]+", (question or "").lower()):
+        if len(word) > 2 and word not in _STOPWORDS:
+            terms.update(term.rstrip("s") for term in [word, *_SYNONYMS.get(word, [])])
+    return terms
+
+
+def _round_sig(value: float, sig_figs: int) -> str:
+    if value is None or pd.isna(value):
+        return ""
+    if value == 0:
+        return "0"
+    decimals = sig_figs - int(math.floor(math.log10(abs(value)))) - 1
+    text = f"{round(value, decimals):.{max(decimals, 0)}f}"
+    return text.rstrip("0").rstrip(".") if "." in text else text
+
+
+def _period_labels(columns: Iterable) -> List[str]:
+    columns = list(columns)
+    if all(isinstance(column, pd.Timestamp) for column in columns):
+        years = [column.year for column in columns]
+        if len(set(years)) == len(years):
+            return [str(year) for year in years]
+        return [column.strftime("%Y-%m") for column in columns]
+    return [str(column) for column in columns]
+
+
+def compact_statement(
+    df: pd.DataFrame,
+    question: Optional[str] = None,
+    token_budget: int = STATEMENT_TOKEN_BUDGET,
+    sig_figs: int = STATEMENT_SIG_FIGS,
+    max_periods: int = STATEMENT_MAX_PERIODS
+) -> str:
+    """
+    Serialize a statement (line items x periods) as CSV within ``token_budget``
+
+    Rows are ranked by overlap with the question, then by headline importance,
+    then by their position in the statement; the kept rows are emitted in
+    statement order with a note on how many were left out.
+    """
+    df = df[~df.index.duplicated()].dropna(how="all").dropna(axis=1, how="all")
+    df = df.iloc[:, :max_periods]
+    if df.empty:
+        return ""
+
+    terms = _question_terms(question)
+    names = [str(name) for name in df.index]
+    words = [set(word.rstrip("s") for word in re.findall(r"[a-z&]+", name.lower())) for name in names]
+    order = sorted(
+        range(len(names)),
+        key=lambda i: (-len(terms & words[i]), _HEADLINE_RANK.get(names[i].lower(), len(HEADLINE_ROWS)), i)
+    )
+
+    values = df.to_numpy(dtype=float)
+    scale = [1.0 if _UNSCALED.search(name) else 1e6 for name in names]
+    lines = {}
+    header = "Item," + ",".join(_period_labels(df.columns))
+    remaining = token_budget - estimate_tokens(header) - 24  # Reserve room for the units note
+    for i in order:
+        line = names[i] + "," + ",".join(_round_sig(value / scale[i], sig_figs) for value in values[i])
+        cost = estimate_tokens(line)
+        if cost > remaining:
+            continue
+        lines[i] = line
+        remaining -= cost
+
+    kept = [lines[i] for i in sorted(lines)]
+    note = f"(USD millions; per-share and rate rows unscaled; {len(kept)} of {len(names)} line items)"
+    return "\n".join([note, header, *kept])
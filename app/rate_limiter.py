@@ -0,0 +1,224 @@
+"""
+Rate limiting primitives for outbound Gemini calls
+Token bucket plus a process-wide adaptive controller (AIMD on quota errors)
+that every Gemini call goes through
+"""
+
+import os
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from google.api_core.exceptions import ResourceExhausted
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MAX_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_MAX_REQUESTS_PER_MINUTE", "600"))
+GEMINI_MIN_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_MIN_REQUESTS_PER_MINUTE", "6"))
+GEMINI_BURST = float(os.getenv("GEMINI_BURST", "10"))
+GEMINI_BACKGROUND_RESERVE = float(os.getenv("GEMINI_BACKGROUND_RESERVE", "2"))  # Tokens background work leaves for interactive calls
+BACKGROUND_POLL_SECONDS = 0.05
+
+
+class TokenBucket:
+    """
+    Async token bucket
+
+    Tokens refill continuously at ``rate`` per second up to ``capacity``.
+    Callers await ``acquire`` and only sleep when the bucket is empty, so
+    bursts under quota go out immediately.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def set_rate(self, rate: float) -> None:
+        self._refill()
+        self.rate = rate
+
+    def drain(self) -> None:
+        """Empty the bucket so the next caller waits a full refill interval"""
+        self._refill()
+        self._tokens = 0.0
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        """Wait until ``tokens`` are available and take them"""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+def is_quota_error(error: BaseException) -> bool:
+    """True for provider push-back (HTTP 429 / ResourceExhausted), however it was wrapped"""
+    if isinstance(error, ResourceExhausted):
+        return True
+    message = str(error)
+    return "429" in message or "ResourceExhausted" in message or "quota" in message.lower()
+
+
+class AdaptiveRateController:
+    """
+    Token bucket with additive-increase / multiplicative-decrease rate control
+
+    Calls run immediately while the bucket has tokens. A quota error halves the
+    rate and drains the bucket; each success then adds back a small step until
+    the configured maximum is reached again.
+    """
+
+    def __init__(
+        self,
+        max_rate_per_minute: float = GEMINI_MAX_REQUESTS_PER_MINUTE,
+        min_rate_per_minute: float = GEMINI_MIN_REQUESTS_PER_MINUTE,
+        burst: float = GEMINI_BURST,
+        decrease_factor: float = 0.5,
+        increase_steps: int = 20
+    ):
+        self.max_rate = max_rate_per_minute / 60.0
+        self.min_rate = min_rate_per_minute / 60.0
+        self.decrease_factor = decrease_factor
+        self.increase_step = self.max_rate / increase_steps
+        self._bucket = TokenBucket(rate=self.max_rate, capacity=burst)
+        self.background_reserve = min(GEMINI_BACKGROUND_RESERVE, max(burst - 1, 0))
+        self._waiting = 0
+        self._waiting_background = 0
+        self._in_flight = 0
+        self._last_decrease_at = 0.0
+        self.total_calls = 0
+        self.throttle_events = 0
+        self.delayed_calls = 0
+        self.total_wait_seconds = 0.0
+        self.last_throttle_at: Optional[str] = None
+
+    @property
+    def rate(self) -> float:
+        return self._bucket.rate
+
+    async def acquire(self, background: bool = False) -> None:
+        """
+        Wait for a token; ``background`` callers yield to interactive ones
+
+        Background work waits while any interactive call is queued and leaves
+        ``background_reserve`` tokens in the bucket, so a query arriving during
+        a large ingest doesn't queue behind it.
+        """
+        self._waiting += 1
+        self._waiting_background += background
+        started = time.monotonic()
+        try:
+            if background:
+                while (self._waiting > self._waiting_background
+                       or self._bucket.available < 1 + self.background_reserve):
+                    await asyncio.sleep(BACKGROUND_POLL_SECONDS)
+            await self._bucket.acquire()
+        finally:
+            self._waiting -= 1
+            self._waiting_background -= background
+        waited = time.monotonic() - started
+        if waited > 0.001:
+            self.delayed_calls += 1
+            self.total_wait_seconds += waited
+
+    def record_success(self) -> None:
+        if self.rate < self.max_rate:
+            self._bucket.set_rate(min(self.max_rate, self.rate + self.increase_step))
+
+    def record_throttle(self) -> None:
+        now = time.monotonic()
+        self.throttle_events += 1
+        self.last_throttle_at = datetime.now().isoformat()
+        # Concurrent calls tend to fail together; back off once per refill interval
+        if now - self._last_decrease_at < 1.0 / self.rate:
+            return
+        self._last_decrease_at = now
+        new_rate = max(self.min_rate, self.rate * self.decrease_factor)
+        logger.warning(f"Gemini quota pushback, lowering rate to {new_rate * 60:.1f} requests/min")
+        self._bucket.set_rate(new_rate)
+        self._bucket.drain()
+
+    async def run(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Await ``func(*args, **kwargs)`` once a token is available, adapting to the outcome"""
+        return await self._run(func, False, *args, **kwargs)
+
+    async def run_background(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """``run`` at background priority, for bulk work such as document ingestion"""
+        return await self._run(func, True, *args, **kwargs)
+
+    async def _run(self, func: Callable[..., Awaitable[Any]], background: bool, *args, **kwargs) -> Any:
+        await self.acquire(background)
+        self.total_calls += 1
+        self._in_flight += 1
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            if is_quota_error(e):
+                self.record_throttle()
+            raise
+        finally:
+            self._in_flight -= 1
+        self.record_success()
+        return result
+
+    async def stream(self, func: Callable[..., AsyncIterator[Any]], *args, **kwargs) -> AsyncIterator[Any]:
+        """Like ``run`` for streaming calls: yields from ``func(*args, **kwargs)``, one token per stream"""
+        await self.acquire()
+        self.total_calls += 1
+        self._in_flight += 1
+        try:
+            async for item in func(*args, **kwargs):
+                yield item
+        except Exception as e:
+            if is_quota_error(e):
+                self.record_throttle()
+            raise
+        finally:
+            self._in_flight -= 1
+        self.record_success()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "current_rate_per_minute": round(self.rate * 60, 2),
+            "max_rate_per_minute": round(self.max_rate * 60, 2),
+            "min_rate_per_minute": round(self.min_rate * 60, 2),
+            "available_tokens": round(self._bucket.available, 2),
+            "queue_depth": self._waiting,
+            "background_queue_depth": self._waiting_background,
+            "in_flight": self._in_flight,
+            "total_calls": self.total_calls,
+            "delayed_calls": self.delayed_calls,
+            "total_wait_seconds": round(self.total_wait_seconds, 3),
+            "throttle_events": self.throttle_events,
+            "last_throttle_at": self.last_throttle_at,
+        }
+
+
+_rate_controller: Optional[AdaptiveRateController] = None
+
+
+def get_rate_controller() -> AdaptiveRateController:
+    """Get the process-wide Gemini rate controller"""
+    global _rate_controller
+    if _rate_controller is None:
+        _rate_controller = AdaptiveRateController()
+    return _rate_controller
@@ -0,0 +1,115 @@
+"""
+Agent registry - builds the orchestrator, agents, vector index handle and
+LLM clients once per worker and hands them to request handlers
+"""
+
+import os
+import asyncio
+import importlib
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from ingest_queue import IngestQueue
+
+logger = logging.getLogger(__name__)
+
+WARMUP_IN_BACKGROUND = os.getenv("WARMUP_IN_BACKGROUND", "true").lower() == "true"
+
+
+class AgentRegistry:
+    """
+    Per-worker container for long-lived agents
+
+    ``start`` kicks off the build at application startup, optionally in the
+    background so the server accepts connections immediately; handlers await
+    the accessors, which wait for (or retry) the build.
+    """
+
+    def __init__(self):
+        self._orchestrator = None
+        self._build_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.error: Optional[str] = None
+        self.warmup_seconds: Optional[float] = None
+        self.ingest_queue = IngestQueue(self.get_document_agent)
+
+    async def start(self, background: bool = WARMUP_IN_BACKGROUND) -> None:
+        await self._schedule_build()
+        await self.ingest_queue.start()
+        if not background:
+            try:
+                await self.ensure_ready()
+            except Exception:
+                pass  # Logged by _build; handlers retry and surface the error
+
+    async def _schedule_build(self) -> asyncio.Task:
+        async with self._lock:
+            failed = self._build_task is not None and self._build_task.done() and self.error
+            if self._build_task is None or failed:
+                self._build_task = asyncio.create_task(self._build())
+                # Failures are reported via status()/ensure_ready(); don't warn about unretrieved exceptions
+                self._build_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+            return self._build_task
+
+    async def _build(self) -> None:
+        start_time = time.perf_counter()
+        try:
+            # Heavy module imports (LangChain, Gemini, Pinecone) run off the event loop
+            orchestrator_module = await asyncio.to_thread(importlib.import_module, "orchestrator")
+            orchestrator = await orchestrator_module.get_orchestrator()
+
+            # The vector index is only needed by the RAG route, so a failure here doesn't block financial queries
+            from agents.document_agent import get_async_vector_index
+            try:
+                await get_async_vector_index()
+            except Exception as e:
+                logger.warning(f"Vector index warm-up failed, will retry on first use: {e}")
+
+            self._orchestrator = orchestrator
+            self.error = None
+            self.warmup_seconds = round(time.perf_counter() - start_time, 3)
+            logger.info(f"Agent registry ready in {self.warmup_seconds}s")
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"Agent registry warm-up failed: {e}")
+            raise
+
+    async def ensure_ready(self) -> None:
+        """Wait for the build, retrying it if a previous attempt failed"""
+        if self._orchestrator is not None:
+            return
+        task = await self._schedule_build()
+        await asyncio.shield(task)
+
+    async def get_orchestrator(self):
+        await self.ensure_ready()
+        return self._orchestrator
+
+    async def get_document_agent(self):
+        return (await self.get_orchestrator()).rag_agent
+
+    async def get_financial_agent(self):
+        return (await self.get_orchestrator()).financial_agent
+
+    def status(self) -> Dict[str, Any]:
+        if self._orchestrator is not None:
+            state = "ready"
+        elif self.error:
+            state = "failed"
+        else:
+            state = "warming_up"
+        return {"state": state, "warmup_seconds": self.warmup_seconds, "error": self.error}
+
+    async def close(self) -> None:
+        if self._build_task is not None and not self._build_task.done():
+            self._build_task.cancel()
+        await self.ingest_queue.close()
+        import pdf_extraction
+        from vector_store import close_async_index
+        from agents.financial_agent import shutdown_tool_pool
+        from conversation_store import close_checkpoint_saver
+        pdf_extraction.shutdown_process_pool()
+        close_async_index()
+        shutdown_tool_pool()
+        close_checkpoint_saver()
@@ -0,0 +1,166 @@
+"""
+Second-stage reranking for RAG retrieval
+Retrieval over-fetches candidates (RERANK_CANDIDATES) and this module picks
+the passages sent to generation: "lexical" blends the dense similarity with
+IDF-weighted coverage of the question's terms and phrases, "mmr" additionally
+applies maximal marginal relevance over the candidate vectors so the chosen
+passages don't repeat each other. Scoring is vectorized NumPy over a few dozen
+candidates and costs a few milliseconds of CPU per question, mostly tokenizing.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from sparse_index import tokenize, RRF_K
+
+logger = logging.getLogger(__name__)
+
+RERANK_MODES = ("none", "lexical", "mmr")
+RERANK_MODE = os.getenv("RERANK_MODE", "none")  # Default when a request doesn't choose
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "50"))
+RERANK_LEXICAL_WEIGHT = float(os.getenv("RERANK_LEXICAL_WEIGHT", "0.5"))  # Share of the lexical score in relevance
+RERANK_MMR_LAMBDA = float(os.getenv("RERANK_MMR_LAMBDA", "0.7"))  # 1.0 = pure relevance, lower = more diversity
+
+PHRASE_WEIGHT = 0.3  # Share of adjacent query-term pairs within the lexical score
+
+
+def resolve_mode(mode: Optional[str]) -> str:
+    mode = (mode or RERANK_MODE).lower()
+    if mode not in RERANK_MODES:
+        raise ValueError(f"Unknown rerank mode '{mode}', expected one of {', '.join(RERANK_MODES)}")
+    return mode
+
+
+def lexical_scores(question: str, texts: List[str]) -> np.ndarray:
+    """IDF-weighted share of the question's terms (and adjacent term pairs) found in each text, in [0, 1]"""
+    terms = list(dict.fromkeys(tokenize(question)))
+    if not terms or not texts:
+        return np.zeros(len(texts), dtype=np.float32)
+    query_tokens = tokenize(question)
+    phrases = list(dict.fromkeys(zip(query_tokens, query_tokens[1:])))
+
+    token_lists = [tokenize(text) for text in texts]
+    token_sets = [set(tokens) for tokens in token_lists]
+    present = np.array([[term in tokens for term in terms] for tokens in token_sets], dtype=np.float32)
+    document_frequency = present.sum(axis=0)
+    idf = np.log((len(texts) + 1) / (document_frequency + 0.5))
+    coverage = present @ idf / idf.sum() if idf.sum() > 0 else present.mean(axis=1)
+    if not phrases:
+        return coverage
+
+    pair_sets = [set(zip(tokens, tokens[1:])) for tokens in token_lists]
+    phrase_present = np.array([[phrase in pairs for phrase in phrases] for pairs in pair_sets], dtype=np.float32)
+    return (1 - PHRASE_WEIGHT) * coverage + PHRASE_WEIGHT * phrase_present.mean(axis=1)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _min_max(values: np.ndarray) -> np.ndarray:
+    spread = values.max() - values.min() if len(values) else 0.0
+    return (values - values.min()) / spread if spread > 0 else np.ones_like(values)
+
+
+def mmr_order(relevance: np.ndarray, vectors: np.ndarray, top_k: int, mmr_lambda: float = RERANK_MMR_LAMBDA) -> List[int]:
+    """Greedy maximal marginal relevance over unit-normalized ``vectors``; returns candidate positions"""
+    similarity = vectors @ vectors.T
+    chosen: List[int] = []
+    available = np.ones(len(relevance), dtype=bool)
+    redundancy = np.zeros(len(relevance), dtype=np.float32)  # Max similarity to anything chosen so far
+    for _ in range(min(top_k, len(relevance))):
+        scores = np.where(available, mmr_lambda * relevance - (1 - mmr_lambda) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        chosen.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return chosen
+
+
+class Reranker:
+    """Reorders over-fetched matches and keeps the best ``top_k``; counts work done for /stats"""
+
+    def __init__(self, lexical_weight: float = RERANK_LEXICAL_WEIGHT, mmr_lambda: float = RERANK_MMR_LAMBDA):
+        self.lexical_weight = lexical_weight
+        self.mmr_lambda = mmr_lambda
+        self._lock = threading.Lock()
+        self.reranks = 0
+        self.candidates_in = 0
+        self.promoted = 0  # Kept passages that were outside the first-stage top_k
+        self.total_ms = 0.0
+
+    def rerank(
+        self,
+        question: str,
+        query_vector: Optional[List[float]],
+        matches: List[Any],
+        top_k: int,
+        mode: str
+    ) -> List[Any]:
+        """``matches`` in first-stage order (with ``values`` for vector scoring); returns the ``top_k`` kept"""
+        if mode == "none" or len(matches) <= 1:
+            return matches[:top_k]
+        started = time.perf_counter()
+
+        dimension = len(query_vector) if query_vector is not None else 0
+        vectors = np.zeros((len(matches), dimension), dtype=np.float32)
+        has_vector = np.zeros(len(matches), dtype=bool)
+        for row, match in enumerate(matches):
+            values = getattr(match, "values", None)
+            if dimension and values is not None and len(values) == dimension:
+                vectors[row] = values
+                has_vector[row] = True
+        vectors = _normalize_rows(vectors)
+
+        # First-stage order carries the BM25 side of hybrid retrieval, so it stays part of relevance
+        prior = _min_max(1.0 / (RRF_K + 1 + np.arange(len(matches), dtype=np.float32)))
+        if has_vector.any():
+            query = np.asarray(query_vector, dtype=np.float32)
+            dense = vectors @ (query / (np.linalg.norm(query) or 1.0))
+            dense[~has_vector] = dense[has_vector].min()
+            first_stage = (_min_max(dense) + prior) / 2
+        else:
+            first_stage = prior
+        lexical = lexical_scores(question, [(match.metadata or {}).get("text", "") for match in matches])
+        relevance = (1 - self.lexical_weight) * first_stage + self.lexical_weight * lexical
+
+        if mode == "mmr":
+            order = mmr_order(relevance, vectors, top_k, self.mmr_lambda)
+        else:
+            order = [int(i) for i in np.argsort(-relevance, kind="stable")[:top_k]]
+
+        with self._lock:
+            self.reranks += 1
+            self.candidates_in += len(matches)
+            self.promoted += sum(1 for position in order if position >= top_k)
+            self.total_ms += (time.perf_counter() - started) * 1000
+        return [matches[position] for position in order]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "default_mode": RERANK_MODE,
+                "candidates": RERANK_CANDIDATES,
+                "reranks": self.reranks,
+                "candidates_in": self.candidates_in,
+                "promoted": self.promoted,
+                "avg_ms": round(self.total_ms / self.reranks, 3) if self.reranks else 0.0,
+            }
+
+
+_reranker: Optional[Reranker] = None
+
+
+def get_reranker() -> Reranker:
+    """Get the process-wide reranker"""
+    global _reranker
+    if _reranker is None:
+        _reranker = Reranker()
+    return _reranker
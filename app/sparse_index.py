@@ -0,0 +1,486 @@
+"""
+BM25 sparse retrieval over document chunks
+Complements dense vector search with exact-token matching ("EBITDA", "FY2024",
+tickers, figures). Postings live in flat NumPy arrays in CSR layout (term
+offsets into row and term-frequency arrays) plus a small append buffer that is
+merged in bulk, so ingest stays incremental and memory stays compact at
+millions of chunks. On disk a merged base (loaded memory-mapped) is followed by
+append-only segments holding what was added or retired since, and a manifest
+naming the live base and segments is swapped in atomically on every save.
+"""
+
+import os
+import re
+import json
+import math
+import shutil
+import logging
+import threading
+from itertools import islice
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", "data/bm25_index")
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+BM25_MERGE_THRESHOLD = int(os.getenv("BM25_MERGE_THRESHOLD", "500000"))  # Buffered postings before a merge
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+INITIAL_ROWS = 1024
+
+# Words, tickers and codes ("fy2024", "q3") or figures ("1,234.5" -> "1234.5")
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is", "it", "its",
+    "of", "on", "or", "that", "the", "this", "to", "was", "were", "what", "which", "with", "how", "did", "does",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token[0].isdigit():
+            token = token.replace(",", "")
+        elif len(token) < 2 or token in _STOPWORDS:
+            continue
+        tokens.append(token)
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = RRF_K, top_k: Optional[int] = None) -> List[str]:
+    """Merge ranked ID lists by summing 1 / (k + rank); IDs ranked well by several lists rise to the top"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank + 1)
+    fused = sorted(scores, key=scores.get, reverse=True)
+    return fused[:top_k] if top_k is not None else fused
+
+
+class BM25Index:
+    """
+    Okapi BM25 index keyed by vector ID
+
+    Rows are append-only: re-adding an ID retires its old row, and merges
+    drop retired rows and renumber the rest. ``search`` scores only the
+    postings of the query terms, so latency tracks their document frequency
+    rather than the corpus size.
+    """
+
+    def __init__(self, path: Optional[str] = BM25_INDEX_PATH, k1: float = BM25_K1, b: float = BM25_B,
+                 merge_threshold: int = BM25_MERGE_THRESHOLD):
+        self.path = Path(path) if path else None
+        self.k1 = k1
+        self.b = b
+        self.merge_threshold = merge_threshold
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()  # Serializes saves without blocking reads and writes
+
+        self._vocab: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._row_of: Dict[str, int] = {}
+        self._doc_code_of: Dict[str, int] = {}
+        self._doc_counts: Counter = Counter()  # Live rows per document code
+        self._doc_len = np.zeros(INITIAL_ROWS, dtype=np.int32)
+        self._doc_codes = np.full(INITIAL_ROWS, -1, dtype=np.int32)
+        self._alive = np.zeros(INITIAL_ROWS, dtype=bool)
+        self._total_len = 0
+        self._live_rows = 0
+
+        # Merged postings: rows and term frequencies of term t are [offsets[t], offsets[t + 1])
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._post_rows = np.zeros(0, dtype=np.int32)
+        self._post_tfs = np.zeros(0, dtype=np.uint16)
+        # Postings added since the last merge, as (terms, rows, tfs) array triples
+        self._pending: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        self._pending_count = 0
+        self._pending_sorted: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+        # Persistence: each merge starts a generation whose base holds the merged state; saves append
+        # a segment with everything past the saved watermark (pending arrays, rows, terms, documents)
+        self._generation = 0
+        self._saved_generation: Optional[int] = None
+        self._base = {"rows": 0, "terms": 0, "documents": 0}
+        self._saved = {"pending": 0, "rows": 0, "terms": 0, "documents": 0}
+        self._retired_rows: List[int] = []  # Rows retired since the last save
+        self._segments: List[str] = []
+
+        if self.path is not None and (self.path / "manifest.json").exists():
+            self._load()
+
+    # ------------------------------------------------------------------ writes
+
+    def _doc_code(self, document_id: Optional[str]) -> int:
+        if document_id is None:
+            return -1
+        code = self._doc_code_of.get(document_id)
+        if code is None:
+            code = self._doc_code_of[document_id] = len(self._doc_code_of)
+        return code
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self._doc_len)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        extra = capacity - len(self._doc_len)
+        self._doc_len = np.concatenate([self._doc_len, np.zeros(extra, dtype=np.int32)])
+        self._doc_codes = np.concatenate([self._doc_codes, np.full(extra, -1, dtype=np.int32)])
+        self._alive = np.concatenate([self._alive, np.zeros(extra, dtype=bool)])
+
+    def _retire(self, row: int) -> None:
+        del self._row_of[self._ids[row]]
+        self._ids[row] = None
+        self._alive[row] = False
+        self._total_len -= int(self._doc_len[row])
+        self._live_rows -= 1
+        self._doc_counts[int(self._doc_codes[row])] -= 1
+        self._retired_rows.append(row)
+
+    def add(self, chunks: Iterable[Tuple[str, str, Optional[str]]]) -> int:
+        """Index ``(vector_id, text, document_id)`` chunks, replacing IDs already present"""
+        terms, rows, tfs = [], [], []
+        added = 0
+        with self._lock:
+            for vector_id, text, document_id in chunks:
+                if vector_id in self._row_of:
+                    self._retire(self._row_of[vector_id])
+                row = len(self._ids)
+                self._grow(row + 1)
+                self._ids.append(vector_id)
+                self._row_of[vector_id] = row
+
+                counts = Counter(tokenize(text))
+                for term, tf in counts.items():
+                    term_id = self._vocab.get(term)
+                    if term_id is None:
+                        term_id = self._vocab[term] = len(self._vocab)
+                    terms.append(term_id)
+                    rows.append(row)
+                    tfs.append(min(tf, 65535))
+                length = sum(counts.values())
+                code = self._doc_code(document_id)
+                self._doc_len[row] = length
+                self._doc_codes[row] = code
+                self._alive[row] = True
+                self._total_len += length
+                self._live_rows += 1
+                self._doc_counts[code] += 1
+                added += 1
+
+            if terms:
+                self._pending.append((
+                    np.asarray(terms, dtype=np.int32),
+                    np.asarray(rows, dtype=np.int32),
+                    np.asarray(tfs, dtype=np.uint16),
+                ))
+                self._pending_count += len(terms)
+                self._pending_sorted = None
+            if self._pending_count >= self.merge_threshold:
+                self.merge()
+        return added
+
+    def remove(self, vector_ids: Iterable[str]) -> int:
+        removed = 0
+        with self._lock:
+            for vector_id in vector_ids:
+                row = self._row_of.get(vector_id)
+                if row is not None:
+                    self._retire(row)
+                    removed += 1
+        return removed
+
+    def merge(self) -> None:
+        """Fold the append buffer into the CSR postings, dropping retired rows and renumbering live ones"""
+        with self._lock:
+            n_rows = len(self._ids)
+            n_terms = len(self._vocab)
+            main_terms = np.repeat(np.arange(len(self._offsets) - 1, dtype=np.int32), np.diff(self._offsets))
+            terms = np.concatenate([main_terms, *(p[0] for p in self._pending)])
+            rows = np.concatenate([np.asarray(self._post_rows), *(p[1] for p in self._pending)])
+            tfs = np.concatenate([np.asarray(self._post_tfs), *(p[2] for p in self._pending)])
+
+            alive = self._alive[:n_rows]
+            keep = alive[rows]
+            terms, rows, tfs = terms[keep], rows[keep], tfs[keep]
+            new_row = np.cumsum(alive, dtype=np.int64) - 1
+            rows = new_row[rows].astype(np.int32)
+
+            order = np.lexsort((rows, terms))
+            self._post_rows = rows[order]
+            self._post_tfs = tfs[order]
+            self._offsets = np.zeros(n_terms + 1, dtype=np.int64)
+            np.cumsum(np.bincount(terms, minlength=n_terms), out=self._offsets[1:])
+
+            live = np.flatnonzero(alive)
+            self._ids = [self._ids[row] for row in live]
+            self._row_of = {vector_id: row for row, vector_id in enumerate(self._ids)}
+            size = max(INITIAL_ROWS, len(live))
+            self._doc_len = np.concatenate([self._doc_len[live], np.zeros(size - len(live), dtype=np.int32)])
+            self._doc_codes = np.concatenate([self._doc_codes[live], np.full(size - len(live), -1, dtype=np.int32)])
+            self._alive = np.zeros(size, dtype=bool)
+            self._alive[:len(live)] = True
+            self._pending, self._pending_count, self._pending_sorted = [], 0, None
+
+            self._generation += 1
+            self._base = {"rows": len(self._ids), "terms": n_terms, "documents": len(self._doc_code_of)}
+            self._saved = {**self._base, "pending": 0}
+            self._retired_rows, self._segments = [], []
+
+    # ------------------------------------------------------------------ reads
+
+    def _pending_postings(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if self._pending_sorted is None:
+            if self._pending:
+                terms = np.concatenate([p[0] for p in self._pending])
+                rows = np.concatenate([p[1] for p in self._pending])
+                tfs = np.concatenate([p[2] for p in self._pending])
+                order = np.argsort(terms, kind="stable")
+                self._pending_sorted = (terms[order], rows[order], tfs[order])
+            else:
+                empty = np.zeros(0, dtype=np.int32)
+                self._pending_sorted = (empty, empty, np.zeros(0, dtype=np.uint16))
+        return self._pending_sorted
+
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        rows, tfs = [], []
+        if term_id < len(self._offsets) - 1:
+            start, end = self._offsets[term_id], self._offsets[term_id + 1]
+            rows.append(self._post_rows[start:end])
+            tfs.append(self._post_tfs[start:end])
+        pending_terms, pending_rows, pending_tfs = self._pending_postings()
+        start, end = np.searchsorted(pending_terms, [term_id, term_id + 1])
+        rows.append(pending_rows[start:end])
+        tfs.append(pending_tfs[start:end])
+        rows, tfs = np.concatenate(rows), np.concatenate(tfs)
+        live = self._alive[rows]
+        return rows[live], tfs[live].astype(np.float32)
+
+    def search(self, query: str, top_k: int = 10,
+               document_ids: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """Top ``top_k`` ``(vector_id, score)`` pairs, optionally restricted to ``document_ids``"""
+        with self._lock:
+            if not self._live_rows:
+                return []
+            codes = None
+            if document_ids is not None:
+                codes = np.asarray([self._doc_code_of[d] for d in document_ids if d in self._doc_code_of], dtype=np.int32)
+                if not len(codes):
+                    return []
+
+            avg_len = self._total_len / self._live_rows or 1.0
+            all_rows, all_scores = [], []
+            for term in set(tokenize(query)):
+                term_id = self._vocab.get(term)
+                if term_id is None:
+                    continue
+                rows, tfs = self._postings(term_id)
+                if not len(rows):
+                    continue
+                df = len(rows)
+                idf = math.log(1 + (self._live_rows - df + 0.5) / (df + 0.5))
+                if codes is not None:
+                    in_scope = np.isin(self._doc_codes[rows], codes)
+                    rows, tfs = rows[in_scope], tfs[in_scope]
+                norm = self.k1 * (1 - self.b + self.b * self._doc_len[rows] / avg_len)
+                all_rows.append(rows)
+                all_scores.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+
+            if not all_rows:
+                return []
+            rows, inverse = np.unique(np.concatenate(all_rows), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+            if len(rows) > top_k:
+                best = np.argpartition(-scores, top_k - 1)[:top_k]
+            else:
+                best = np.arange(len(rows))
+            best = best[np.argsort(-scores[best], kind="stable")]
+            return [(self._ids[rows[i]], float(scores[i])) for i in best]
+
+    def search_many(self, queries: List[str], top_k: int = 10,
+                    document_ids: Optional[Iterable[str]] = None) -> List[List[Tuple[str, float]]]:
+        document_ids = list(document_ids) if document_ids is not None else None
+        return [self.search(query, top_k, document_ids) for query in queries]
+
+    def has_document(self, document_id: str) -> bool:
+        with self._lock:
+            code = self._doc_code_of.get(document_id)
+            return code is not None and self._doc_counts[code] > 0
+
+    def missing(self, vector_ids: Iterable[str]) -> List[str]:
+        """The given IDs that have no live row in the index"""
+        with self._lock:
+            return [vector_id for vector_id in vector_ids if vector_id not in self._row_of]
+
+    # ------------------------------------------------------------------ persistence
+
+    def save(self) -> None:
+        """
+        Persist changes since the last save; no-op for in-memory indexes
+
+        Writes the merged base once per merge and otherwise only an
+        append-only segment, then swaps the manifest. The index lock is held
+        just long enough to snapshot, so searches and adds carry on meanwhile.
+        """
+        if self.path is None:
+            return
+        with self._save_lock:
+            with self._lock:
+                generation = self._generation
+                base = None
+                if self._saved_generation != generation:
+                    rows = self._base["rows"]
+                    base = {
+                        "arrays": {
+                            "offsets": self._offsets,
+                            "post_rows": self._post_rows,
+                            "post_tfs": self._post_tfs,
+                            "doc_len": self._doc_len[:rows].copy(),
+                            "doc_codes": self._doc_codes[:rows].copy(),
+                        },
+                        "meta": {
+                            "ids": self._ids[:rows],
+                            "terms": list(islice(self._vocab, self._base["terms"])),
+                            "documents": list(islice(self._doc_code_of, self._base["documents"])),
+                        },
+                    }
+                saved = self._saved
+                watermark = {
+                    "pending": len(self._pending),
+                    "rows": len(self._ids),
+                    "terms": len(self._vocab),
+                    "documents": len(self._doc_code_of),
+                }
+                pending = self._pending[saved["pending"]:]
+                retired = list(self._retired_rows)
+                segment = {
+                    "arrays": {
+                        "doc_len": self._doc_len[saved["rows"]:watermark["rows"]].copy(),
+                        "doc_codes": self._doc_codes[saved["rows"]:watermark["rows"]].copy(),
+                    },
+                    "meta": {
+                        "ids": self._ids[saved["rows"]:],
+                        "terms": list(islice(self._vocab, saved["terms"], None)),
+                        "documents": list(islice(self._doc_code_of, saved["documents"], None)),
+                        "retired": retired,
+                    },
+                }
+                segments = list(self._segments)
+            changed = bool(pending or retired) or any(watermark[key] != saved[key] for key in ("rows", "terms", "documents"))
+            if base is None and not changed:
+                return
+
+            if base is not None:
+                self._write_part(f"base-{generation}", base["arrays"], base["meta"])
+            if changed:
+                terms = [p[0] for p in pending] or [np.zeros(0, dtype=np.int32)]
+                rows = [p[1] for p in pending] or [np.zeros(0, dtype=np.int32)]
+                tfs = [p[2] for p in pending] or [np.zeros(0, dtype=np.uint16)]
+                segment["arrays"].update(terms=np.concatenate(terms), rows=np.concatenate(rows), tfs=np.concatenate(tfs))
+                segments.append(f"segment-{generation}-{len(segments)}")
+                self._write_part(segments[-1], segment["arrays"], segment["meta"])
+            with open(self.path / "manifest.tmp.json", "w") as f:
+                json.dump({"base": f"base-{generation}", "segments": segments}, f)
+            os.replace(self.path / "manifest.tmp.json", self.path / "manifest.json")
+
+            with self._lock:
+                if self._generation == generation:
+                    self._saved_generation = generation
+                    self._saved = watermark
+                    del self._retired_rows[:len(retired)]
+                    self._segments = segments
+            live = {f"base-{generation}", *segments}
+            for part in self.path.iterdir():
+                if part.is_dir() and part.name not in live:
+                    shutil.rmtree(part, ignore_errors=True)
+
+    def _write_part(self, name: str, arrays: Dict[str, np.ndarray], meta: Dict) -> None:
+        directory = self.path / name
+        directory.mkdir(parents=True, exist_ok=True)
+        for array_name, array in arrays.items():
+            np.save(directory / f"{array_name}.npy", np.asarray(array))
+        with open(directory / "meta.json", "w") as f:
+            json.dump(meta, f)
+
+    def _read_part(self, name: str, mmap_mode: Optional[str] = None) -> Tuple[Dict[str, np.ndarray], Dict]:
+        directory = self.path / name
+        with open(directory / "meta.json") as f:
+            meta = json.load(f)
+        arrays = {part.stem: np.load(part, mmap_mode=mmap_mode) for part in directory.glob("*.npy")}
+        return arrays, meta
+
+    def _extend(self, arrays: Dict[str, np.ndarray], meta: Dict) -> None:
+        start = len(self._ids)
+        self._ids.extend(meta["ids"])
+        self._grow(len(self._ids))
+        self._doc_len[start:len(self._ids)] = arrays["doc_len"]
+        self._doc_codes[start:len(self._ids)] = arrays["doc_codes"]
+        for term in meta["terms"]:
+            self._vocab[term] = len(self._vocab)
+        for document_id in meta["documents"]:
+            self._doc_code_of[document_id] = len(self._doc_code_of)
+
+    def _load(self) -> None:
+        with open(self.path / "manifest.json") as f:
+            manifest = json.load(f)
+        arrays, meta = self._read_part(manifest["base"], mmap_mode="r")
+        self._offsets = np.asarray(arrays["offsets"])
+        self._post_rows = arrays["post_rows"]
+        self._post_tfs = arrays["post_tfs"]
+        self._extend(arrays, meta)
+        self._base = {"rows": len(self._ids), "terms": len(self._vocab), "documents": len(self._doc_code_of)}
+
+        for name in manifest["segments"]:
+            arrays, meta = self._read_part(name)
+            self._extend(arrays, meta)
+            for row in meta["retired"]:
+                self._ids[row] = None
+            if len(arrays["terms"]):
+                self._pending.append((arrays["terms"], arrays["rows"], arrays["tfs"]))
+                self._pending_count += len(arrays["terms"])
+
+        n_rows = len(self._ids)
+        self._alive[:n_rows] = [vector_id is not None for vector_id in self._ids]
+        self._row_of = {vector_id: row for row, vector_id in enumerate(self._ids) if vector_id is not None}
+        alive = self._alive[:n_rows]
+        self._total_len = int(self._doc_len[:n_rows][alive].sum())
+        self._live_rows = int(alive.sum())
+        self._doc_counts = Counter(self._doc_codes[:n_rows][alive].tolist())
+
+        self._generation = self._saved_generation = int(manifest["base"].split("-")[1])
+        self._saved = {"pending": len(self._pending), "rows": n_rows, "terms": len(self._vocab),
+                       "documents": len(self._doc_code_of)}
+        self._segments = manifest["segments"]
+        logger.info(
+            f"BM25 index at {self.path} loaded with {self._live_rows} chunks, {len(self._vocab)} terms "
+            f"and {len(self._segments)} segments"
+        )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "chunks": self._live_rows,
+                "terms": len(self._vocab),
+                "postings": len(self._post_rows) + self._pending_count,
+                "pending_postings": self._pending_count,
+                "segments": len(self._segments),
+            }
+
+
+_sparse_index: Optional[BM25Index] = None
+_sparse_index_lock = threading.Lock()
+
+
+def get_sparse_index() -> BM25Index:
+    """Get the process-wide BM25 index"""
+    global _sparse_index
+    with _sparse_index_lock:
+        if _sparse_index is None:
+            _sparse_index = BM25Index()
+    return _sparse_index
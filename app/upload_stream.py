@@ -0,0 +1,129 @@
+"""
+Streaming PDF uploads
+Parses the multipart request body as it arrives and writes the file part in
+chunks straight to its destination, hashing it on the way. The upload is never
+buffered whole in memory nor spooled to a second temporary file, and an
+over-size upload is rejected as soon as it crosses the limit.
+"""
+
+import os
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.requests import Request
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(250 * 1024 * 1024)))
+
+
+class UploadError(Exception):
+    """Rejected upload; ``status_code`` is the HTTP status to answer with"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class StreamedUpload:
+    path: Path
+    filename: str
+    byte_size: int
+    content_hash: str  # SHA-256 of the file bytes
+
+
+async def receive_pdf(
+    request: Request,
+    dest_dir: Path,
+    max_bytes: int = UPLOAD_MAX_BYTES,
+    field_name: str = "file"
+) -> StreamedUpload:
+    """Stream the ``field_name`` part of a multipart upload into ``dest_dir``"""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + 64 * 1024:
+        raise UploadError(413, f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadError(400, "Expected a multipart/form-data upload")
+
+    digest = hashlib.sha256()
+    pending: List[bytes] = []
+    state = {"header_field": b"", "headers": {}, "in_file": False, "filename": None, "size": 0, "found": False}
+
+    def on_part_begin():
+        state["headers"] = {}
+
+    def on_header_field(data, start, end):
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        field = state["header_field"].lower()
+        state["headers"][field] = state["headers"].get(field, b"") + data[start:end]
+
+    def on_header_end():
+        state["header_field"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        state["in_file"] = options.get(b"name") == field_name.encode() and b"filename" in options and not state["found"]
+        if state["in_file"]:
+            state["found"] = True
+            state["filename"] = os.path.basename(options[b"filename"].decode("utf-8", "replace"))
+
+    def on_part_data(data, start, end):
+        if state["in_file"]:
+            chunk = data[start:end]
+            state["size"] += len(chunk)
+            digest.update(chunk)
+            pending.append(chunk)
+
+    def on_part_end():
+        state["in_file"] = False
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    token = os.urandom(8).hex()
+    path = dest_dir / f".upload_{token}.part"
+    out = open(path, "wb")
+    try:
+        async for body_chunk in request.stream():
+            parser.write(body_chunk)
+            if state["filename"] and not state["filename"].lower().endswith(".pdf"):
+                raise UploadError(400, "Only PDF files supported")
+            if state["size"] > max_bytes:
+                raise UploadError(413, f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+            if pending:
+                data, pending[:] = b"".join(pending), []
+                await asyncio.to_thread(out.write, data)
+        parser.finalize()
+        out.close()
+
+        filename = state["filename"]
+        if not filename:
+            raise UploadError(400, f"No file part named '{field_name}' in the upload")
+        final_path = dest_dir / f"{token}_{filename}"
+        os.replace(path, final_path)
+    except BaseException:
+        out.close()
+        path.unlink(missing_ok=True)
+        raise
+
+    logger.info(f"Received upload {filename}: {state['size']} bytes")
+    return StreamedUpload(path=final_path, filename=filename, byte_size=state["size"], content_hash=digest.hexdigest())
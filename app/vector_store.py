@@ -0,0 +1,151 @@
+"""
+Vector store interface and async access layer
+Backends follow the Pinecone ``Index`` call shapes so agents can swap a hosted
+index for the local one; blocking calls run on a bounded, dedicated executor
+so a slow vector search never stalls the event loop
+"""
+
+import os
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower()  # "pinecone" or "local"
+VECTOR_STORE_MAX_WORKERS = int(os.getenv("VECTOR_STORE_MAX_WORKERS", "16"))
+
+
+@dataclass
+class Match:
+    id: str
+    score: float
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    values: List[float] = field(default_factory=list)
+
+
+@dataclass
+class QueryResult:
+    matches: List[Match] = field(default_factory=list)
+
+
+@dataclass
+class FetchResult:
+    vectors: Dict[str, Match] = field(default_factory=dict)
+
+
+class VectorStore:
+    """
+    Interface implemented by non-Pinecone backends
+
+    Method names and keyword arguments mirror ``pinecone.Index`` so either can
+    be wrapped by ``AsyncVectorIndex``. Filters support the ``document_id``
+    forms produced by ``DocumentAgent._build_filter``: a bare value,
+    ``{"$eq": value}`` or ``{"$in": [values]}``.
+    """
+
+    def query(self, vector: List[float], top_k: int = 10, include_metadata: bool = True,
+              include_values: bool = False, filter: Optional[Dict[str, Any]] = None) -> QueryResult:
+        raise NotImplementedError
+
+    def query_many(self, vectors: List[List[float]], top_k: int = 10, include_metadata: bool = True,
+                   include_values: bool = False, filter: Optional[Dict[str, Any]] = None) -> List[QueryResult]:
+        """Batch of queries with a shared filter; backends override this to score them together"""
+        return [self.query(vector=vector, top_k=top_k, include_metadata=include_metadata,
+                           include_values=include_values, filter=filter) for vector in vectors]
+
+    def upsert(self, vectors: List[Dict[str, Any]]) -> Dict[str, int]:
+        raise NotImplementedError
+
+    def delete(self, ids: Optional[List[str]] = None, delete_all: bool = False,
+               filter: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def fetch(self, ids: List[str]) -> FetchResult:
+        raise NotImplementedError
+
+    def list(self, prefix: str = "", limit: int = 100) -> Iterator[List[str]]:
+        """Yield pages of vector IDs starting with ``prefix``"""
+        raise NotImplementedError
+
+    def describe_index_stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class AsyncVectorIndex:
+    """
+    Async facade over a synchronous index handle (Pinecone ``Index`` or compatible)
+
+    The wrapped handle, and with it the HTTP connection pool, is shared by all
+    calls; concurrency is capped by the executor size.
+    """
+
+    def __init__(self, index: Any, max_workers: int = VECTOR_STORE_MAX_WORKERS):
+        self.index = index
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vector-io")
+
+    async def _call(self, func: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def query(self, **kwargs) -> Any:
+        return await self._call(self.index.query, **kwargs)
+
+    async def query_many(self, vectors: List[List[float]], **kwargs) -> List[Any]:
+        """
+        Run several queries with the same options
+        Backends with a native batch query get one call; Pinecone gets concurrent single queries.
+        """
+        if hasattr(self.index, "query_many"):
+            return await self._call(self.index.query_many, vectors=vectors, **kwargs)
+        return list(await asyncio.gather(*(self.query(vector=vector, **kwargs) for vector in vectors)))
+
+    async def upsert(self, vectors: List[Dict[str, Any]], **kwargs) -> Any:
+        return await self._call(self.index.upsert, vectors=vectors, **kwargs)
+
+    async def delete(self, **kwargs) -> Any:
+        return await self._call(self.index.delete, **kwargs)
+
+    async def fetch(self, ids: List[str], **kwargs) -> Any:
+        return await self._call(self.index.fetch, ids=ids, **kwargs)
+
+    async def describe_index_stats(self, **kwargs) -> Any:
+        return await self._call(self.index.describe_index_stats, **kwargs)
+
+    async def list_ids(self, prefix: str) -> List[str]:
+        """All vector IDs with the given prefix (Pinecone serverless indexes and the local backend)"""
+        def collect():
+            return [vector_id for page in self.index.list(prefix=prefix) for vector_id in page]
+        return await self._call(collect)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_async_index: Optional[AsyncVectorIndex] = None
+
+
+async def get_async_index(factory: Callable[[], Any]) -> AsyncVectorIndex:
+    """
+    Get the shared async index, creating the underlying handle off-loop
+
+    ``factory`` builds the synchronous handle on first use (it may do network I/O).
+    """
+    global _async_index
+    if _async_index is None:
+        index = await asyncio.to_thread(factory)
+        if _async_index is None:
+            _async_index = AsyncVectorIndex(index)
+            logger.info(f"Async vector index ready with {_async_index.max_workers} workers")
+    return _async_index
+
+
+def close_async_index() -> None:
+    global _async_index
+    if _async_index is not None:
+        _async_index.close()
+        _async_index = None